@@ -1,59 +1,126 @@
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from fastapi.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
-from datetime import date, timedelta
-from typing import List
+from datetime import date, datetime, time, timedelta, timezone
+from typing import List, Optional
 from app.services import adherence
+from app.services.participants import MAX_PAGE_SIZE, parse_fields, filter_participants, filtered_keyset_page
 from app.models.participant import Participant
 from app.schemas.participant import ParticipantOut
+from app.core.admission import admitted
+from app.core.http_cache import conditional_response
+from app.db.catalog import freshness_snapshot
+from app.db.session import get_db_session
 
 router = APIRouter(prefix="/adherence", tags=["Adherence"])
 
-def get_db_session():
-    from sqlalchemy import create_engine
-    from sqlalchemy.orm import sessionmaker
-    import os
-    DATABASE_URL = f"postgresql://{os.environ.get('DB_USER', 'postgres')}:{os.environ.get('DB_PASS', 'password')}@{os.environ.get('DB_HOST', 'timescaledb')}:{os.environ.get('DB_PORT', '5432')}/{os.environ.get('DB_NAME', 'fitbit_data')}"
-    engine = create_engine(DATABASE_URL)
-    SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
+OVERVIEW_FIELDS = ["id", "name", "email", "wear_time", "sleep_compliance", "recent_upload", "overall_adherence", "has_token"]
+
+def adherence_version(participant_id: Optional[int] = None) -> Optional[datetime]:
+    """
+    When anything an adherence response depends on last changed, from the freshness snapshot:
+    ingestion for the participant (or anyone), their settings, the start of today (the look-back
+    window moves) and recent_upload windows that have since run out. None for a participant
+    the snapshot does not know yet.
+    """
+    participants = freshness_snapshot.participants()
+    last_seen = freshness_snapshot.last_seen()
+    if participant_id is not None:
+        if participant_id not in participants:
+            return None
+        # One participant's entries only, by key
+        participants = {participant_id: participants[participant_id]}
+        last_seen = {participant_id: last_seen[participant_id]} if participant_id in last_seen else {}
+    changes = [datetime.combine(date.today(), time.min).astimezone()]
+    changes += [updated_at for updated_at in participants.values() if updated_at is not None]
+    ingested_at = freshness_snapshot.ingested_at(participant_id)
+    if ingested_at is not None:
+        changes.append(ingested_at)
+    now = datetime.now(timezone.utc)
+    for last_seen_at in last_seen.values():
+        expires = last_seen_at + timedelta(hours=adherence.RECENT_UPLOAD_HOURS)
+        if expires <= now:
+            changes.append(expires)
+    return max(changes)
 
 @router.get("/overview")
-def adherence_overview(
+async def adherence_overview(
+    request: Request,
+    response: Response,
     db: Session = Depends(get_db_session),
-    days: int = Query(30, description="Number of days to look back for adherence calculation")
+    days: int = Query(30, description="Number of days to look back for adherence calculation"),
+    cursor: Optional[int] = Query(None, description="X-Next-Cursor value from the previous page"),
+    limit: int = Query(100, ge=1, le=MAX_PAGE_SIZE),
+    fields: Optional[List[str]] = Query(None, description="Keys to return; adherence figures that are not requested are not computed"),
+    active: Optional[bool] = Query(None, description="Only participants whose study is (not) running today"),
+    adherence_below: Optional[float] = Query(None, description="Only participants whose overall adherence is below this"),
+    stale_hours: Optional[int] = Query(None, description="Only participants without an upload in this many hours"),
 ):
+    try:
+        fields = parse_fields(fields, OVERVIEW_FIELDS)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if adherence_below is not None and "overall_adherence" not in fields:
+        fields.append("overall_adherence")
+    # stale_hours compares against the current time, so that page can change at any moment
+    if stale_hours is None:
+        # The participant ids cover deletions, which leave no updated_at behind
+        ids = ",".join(map(str, sorted(freshness_snapshot.participants())))
+        not_modified = conditional_response(request, response, adherence_version(), ids)
+        if not_modified:
+            return not_modified
+    # Only the computation waits for an adherence slot, so 304s never do
+    async with admitted(request, "adherence"):
+        return await run_in_threadpool(
+            overview_page, db, response, days, cursor, limit, fields, active, adherence_below, stale_hours
+        )
+
+def overview_page(db: Session, response: Response, days: int, cursor: Optional[int], limit: int, fields: List[str],
+                  active: Optional[bool], adherence_below: Optional[float], stale_hours: Optional[int]) -> List[dict]:
     today = date.today()
     start_date = today - timedelta(days=days-1)
     end_date = today
-    participants = db.query(Participant).all()
-    overview = []
-    for p in participants:
-        wear = adherence.calculate_wear_time(db, p.id, start_date, end_date)
-        sleep = adherence.calculate_sleep_compliance(db, p.id, start_date, end_date, threshold=p.sleep_threshold or 7)
-        recent = adherence.has_recent_upload(db, p.id)
-        overall = adherence.calculate_overall_adherence(db, p.id, start_date, end_date, wear_threshold=p.overall_threshold or 70, sleep_threshold=p.sleep_threshold or 7)
-        overview.append({
-            "id": p.id,
-            "name": p.name,
-            "email": p.email,
-            "wear_time": wear,
-            "sleep_compliance": sleep,
-            "recent_upload": recent,
-            "overall_adherence": overall,
-            "has_token": p.fitbit_token is not None
-        })
+    query = db.query(
+        Participant.id, Participant.name, Participant.email, Participant.sleep_threshold,
+        Participant.overall_threshold, Participant.fitbit_token.isnot(None).label("has_token")
+    ).execution_options(query_name='adherence_overview')
+    recent_uploaders = adherence.get_recent_uploaders(db) if "recent_upload" in fields else set()
+
+    def entry_for(p) -> Optional[dict]:
+        entry = {"id": p.id, "name": p.name, "email": p.email, "has_token": p.has_token}
+        if "wear_time" in fields:
+            entry["wear_time"] = adherence.calculate_wear_time(db, p.id, start_date, end_date)
+        if "sleep_compliance" in fields:
+            entry["sleep_compliance"] = adherence.calculate_sleep_compliance(db, p.id, start_date, end_date, threshold=p.sleep_threshold or 7)
+        if "recent_upload" in fields:
+            entry["recent_upload"] = p.id in recent_uploaders
+        if "overall_adherence" in fields:
+            entry["overall_adherence"] = adherence.calculate_overall_adherence(db, p.id, start_date, end_date, wear_threshold=p.overall_threshold or 70, sleep_threshold=p.sleep_threshold or 7)
+        # Overall adherence is only known once computed, so the filter is applied while paging
+        if adherence_below is not None and entry["overall_adherence"] >= adherence_below:
+            return None
+        return {name: entry[name] for name in fields}
+
+    overview, next_cursor = filtered_keyset_page(filter_participants(query, active, stale_hours), cursor, limit, entry_for)
+    if next_cursor is not None:
+        response.headers["X-Next-Cursor"] = str(next_cursor)
     return overview
 
 @router.get("/{participant_id}")
-def participant_adherence(
+async def participant_adherence(
     participant_id: int,
+    request: Request,
+    response: Response,
     db: Session = Depends(get_db_session),
-    days: int = Query(30, description="Number of days to look back for adherence calculation")
+    days: int = Query(30, description="Number of days to look back for adherence calculation"),
 ):
+    not_modified = conditional_response(request, response, adherence_version(participant_id))
+    if not_modified:
+        return not_modified
+    async with admitted(request, "adherence"):
+        return await run_in_threadpool(participant_summary, db, participant_id, days)
+
+def participant_summary(db: Session, participant_id: int, days: int) -> dict:
     today = date.today()
     start_date = today - timedelta(days=days-1)
     end_date = today
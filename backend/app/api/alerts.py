@@ -0,0 +1,82 @@
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import select, update, bindparam, case, func
+from sqlalchemy.orm import Session
+from typing import Dict, List, Optional
+from app.core.mail import send_bulk_email
+from app.models.communication_log import CommunicationLog
+from app.db.session import get_db_session
+
+router = APIRouter(prefix="/alerts", tags=["Alerts"])
+
+ALERT_SUBJECT = "Study adherence reminder"
+
+@router.get("/")
+def list_alerts(
+    db: Session = Depends(get_db_session),
+    status: Optional[str] = Query("queued", description="queued, sending, sent, failed or all"),
+    participant_id: Optional[int] = Query(None),
+    limit: int = Query(100, ge=1, le=1000),
+) -> List[Dict]:
+    """Adherence alerts queued by ingestion, newest first"""
+    query = db.query(CommunicationLog).execution_options(query_name='list_alerts').filter(
+        CommunicationLog.email_type == 'alert'
+    )
+    if status != 'all':
+        query = query.filter(CommunicationLog.email_status == status)
+    if participant_id is not None:
+        query = query.filter(CommunicationLog.participant_id == participant_id)
+    return [log.to_dict() for log in query.order_by(CommunicationLog.id.desc()).limit(limit).all()]
+
+def claim_alerts(db: Session, limit: int) -> list:
+    """
+    Move up to `limit` queued alerts to 'sending' in one statement and return them. SKIP LOCKED
+    passes over rows another dispatch is claiming, so overlapping dispatches never share an alert.
+    """
+    table = CommunicationLog.__table__
+    queued = select(table.c.id).where(
+        table.c.email_type == 'alert', table.c.email_status == 'queued'
+    ).order_by(table.c.id).limit(limit).with_for_update(skip_locked=True)
+    claimed = db.execute(
+        update(table).where(table.c.id.in_(queued)).values(email_status='sending')
+        .returning(table.c.id, table.c.recipient_email, table.c.message_content),
+        execution_options={"query_name": "claim_alerts"}
+    ).all()
+    db.commit()
+    return sorted(claimed, key=lambda alert: alert.id)
+
+def mark_alerts(db: Session, results: List[dict]):
+    """Set the status of dispatched alerts in one executemany; sent_at only moves for ones that were sent"""
+    if results:
+        table = CommunicationLog.__table__
+        sent_at = case((bindparam('status') == 'sent', func.now()), else_=table.c.sent_at)
+        db.execute(
+            update(table).where(table.c.id == bindparam('log_id')).values(email_status=bindparam('status'), sent_at=sent_at),
+            results, execution_options={"query_name": "mark_alerts"}
+        )
+        db.commit()
+
+@router.post("/dispatch")
+async def dispatch_alerts(
+    db: Session = Depends(get_db_session),
+    limit: int = Query(500, ge=1, le=10000, description="Queued alerts to send in this call"),
+) -> Dict:
+    """Claim queued alerts, send them through the pooled, rate-limited outreach path and record the outcome"""
+    alerts = await run_in_threadpool(claim_alerts, db, limit)
+    messages = [
+        {"subject": ALERT_SUBJECT, "recipients": [alert.recipient_email], "body": alert.message_content}
+        for alert in alerts
+    ]
+    try:
+        results = await send_bulk_email(messages)
+    except ConnectionError as e:
+        # Mail is not configured, so nothing was sent; hand the claimed alerts back to the queue
+        await run_in_threadpool(mark_alerts, db, [{"log_id": alert.id, "status": "queued"} for alert in alerts])
+        raise HTTPException(status_code=503, detail=str(e))
+    await run_in_threadpool(mark_alerts, db, [
+        {"log_id": alert.id, "status": result["status"]} for alert, result in zip(alerts, results)
+    ])
+    summary = {"sent": 0, "failed": 0}
+    for result in results:
+        summary[result["status"]] += 1
+    return summary
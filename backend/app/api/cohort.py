@@ -0,0 +1,42 @@
+from fastapi import APIRouter, HTTPException, Query
+from datetime import datetime
+from typing import Dict, List, Optional
+from app.core.admission import admit
+from app.db.database import db_manager
+from app.db.queries import get_cohort_metrics
+
+router = APIRouter(prefix="/cohort", tags=["Cohort"])
+
+@router.get("/metrics")
+def cohort_metrics(
+    metric: str = Query(..., description="Metric name"),
+    start_date: datetime = Query(..., description="Start date (ISO format)"),
+    end_date: datetime = Query(..., description="End date (ISO format)"),
+    granularity: str = Query("day", description="Bucket size: hour or day"),
+    user_ids: Optional[List[int]] = Query(None, description="Restrict the cohort to these participants"),
+    guard=admit("cohort"),
+) -> Dict:
+    """
+    Per-bucket distribution (participants, mean, stddev, min, p25, median, p75, max) of each
+    participant's mean for the bucket, across the cohort
+    """
+    if start_date >= end_date:
+        raise HTTPException(status_code=400, detail="Start date must be before end date")
+    if granularity not in ('hour', 'day'):
+        raise HTTPException(status_code=400, detail="granularity must be 'hour' or 'day'")
+    result = get_cohort_metrics(metric, start_date, end_date, granularity, user_ids)
+    return {
+        "metric": metric,
+        "granularity": granularity,
+        "source": result['source'],
+        "count": len(result['buckets']),
+        "buckets": result['buckets'],
+    }
+
+@router.post("/refresh")
+def refresh_cohort(
+    start_date: Optional[datetime] = Query(None, description="First bucket to recompute; all if omitted"),
+    end_date: Optional[datetime] = Query(None, description="Recompute buckets before this"),
+) -> Dict:
+    """Recompute cohort_1d from data_1d, e.g. after a backfill; ingestion keeps it current otherwise"""
+    return {"buckets_written": db_manager.refresh_cohort_rollup(start_date, end_date)}
@@ -0,0 +1,50 @@
+from fastapi import APIRouter, BackgroundTasks, HTTPException, status
+from fastapi.responses import FileResponse
+from pydantic import BaseModel, Field
+from datetime import datetime
+from typing import Dict, List, Optional
+from app.services.export import EXPORT_SOURCES, EXPORT_FORMATS, export_store, run_export
+
+router = APIRouter(prefix="/exports", tags=["Exports"])
+
+class ExportRequest(BaseModel):
+    metrics: List[str] = Field(..., min_items=1)
+    start_date: datetime
+    end_date: datetime
+    user_ids: Optional[List[int]] = Field(None, description="All participants if omitted")
+    granularity: str = Field("hour", description="raw, minute, hour or day")
+    format: str = Field("parquet", description="csv (gzip) or parquet (zstd)")
+
+@router.post("/", status_code=status.HTTP_202_ACCEPTED)
+def create_export(request: ExportRequest, background_tasks: BackgroundTasks) -> Dict:
+    """Start a background export; poll GET /exports/{id} and download its files when finished"""
+    if request.start_date >= request.end_date:
+        raise HTTPException(status_code=400, detail="Start date must be before end date")
+    if request.granularity not in EXPORT_SOURCES:
+        raise HTTPException(status_code=400, detail=f"granularity must be one of {', '.join(EXPORT_SOURCES)}")
+    if request.format not in EXPORT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"format must be one of {', '.join(EXPORT_FORMATS)}")
+    job = export_store.create(request.dict())
+    # Sync background tasks run in the threadpool after the response is sent
+    background_tasks.add_task(run_export, job["id"])
+    return job
+
+@router.get("/")
+def list_exports() -> List[Dict]:
+    return export_store.list()
+
+@router.get("/{export_id}")
+def get_export(export_id: str) -> Dict:
+    job = export_store.get(export_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Export not found")
+    return job
+
+@router.get("/{export_id}/files/{path:path}")
+def download_export_file(export_id: str, path: str):
+    """Stream one partition file from disk"""
+    file_path = export_store.file_path(export_id, path)
+    if not file_path:
+        raise HTTPException(status_code=404, detail="Export file not found")
+    media_type = "application/gzip" if path.endswith(".gz") else "application/vnd.apache.parquet"
+    return FileResponse(file_path, media_type=media_type, filename=path.replace("/", "_"))
@@ -3,7 +3,7 @@ from sqlalchemy.orm import Session
 from pydantic import BaseModel
 from datetime import datetime
 from app.services.imputation import impute_linear_interpolation
-from app.api.participants import get_db_session # Reusing the db session from participants api
+from app.db.session import get_db_session
 
 router = APIRouter(prefix="/impute", tags=["Imputation"])
 
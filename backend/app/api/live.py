@@ -0,0 +1,60 @@
+import asyncio
+import json
+from fastapi import APIRouter, HTTPException, Query, Request
+from fastapi.responses import StreamingResponse
+from typing import List
+from app.core.config import settings
+from app.db.catalog import get_metric_id
+from app.services.live import metric_broker
+
+router = APIRouter(prefix="/live", tags=["Live"])
+
+def parse_pairs(pairs: List[str]) -> dict:
+    """{(user_id, metric_id): metric name} from 'user_id:metric' strings"""
+    keys = {}
+    for pair in pairs:
+        user_id, _, metric = pair.partition(":")
+        if not user_id.isdigit() or not metric:
+            raise ValueError(f"Expected user_id:metric, got '{pair}'")
+        metric_id = get_metric_id(metric)
+        if metric_id is None:
+            raise ValueError(f"Unknown metric '{metric}'")
+        keys[(int(user_id), metric_id)] = metric
+    return keys
+
+def sse(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+@router.get("/metrics")
+async def stream_metrics(
+    request: Request,
+    subscribe: List[str] = Query(..., description="user_id:metric pairs, e.g. subscribe=1:heart_rate&subscribe=1:steps"),
+):
+    """
+    Server-Sent Events stream of points as they are ingested or imputed for the subscribed
+    (user, metric) pairs. Each 'points' event carries only the newly written points; a
+    'resync' event means the client fell behind and should re-fetch its window from /api/metrics.
+    """
+    try:
+        keys = parse_pairs(subscribe)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    async def events():
+        subscription = metric_broker.subscribe(keys)
+        try:
+            yield sse("subscribed", {"pairs": [f"{user_id}:{metric}" for (user_id, _), metric in keys.items()]})
+            while not await request.is_disconnected():
+                try:
+                    event, data = await asyncio.wait_for(subscription.queue.get(), settings.LIVE_KEEPALIVE_SECONDS)
+                except asyncio.TimeoutError:
+                    # Keeps proxies from closing an idle stream, and notices disconnects
+                    yield ": keepalive\n\n"
+                    continue
+                if event == "points":
+                    data = {"user_id": data["user_id"], "metric": keys[(data["user_id"], data["metric_id"])], "points": data["points"]}
+                yield sse(event, data)
+        finally:
+            metric_broker.unsubscribe(subscription)
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
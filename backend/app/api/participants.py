@@ -1,13 +1,25 @@
 print('participants.py imported')
-from fastapi import APIRouter, HTTPException, Depends, status, Query, Body
+import csv
+import io
+import json
+from fastapi import APIRouter, HTTPException, Depends, status, Query, Body, Response, Request
+from fastapi.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
-from typing import List, Dict
-from datetime import datetime
-from pydantic import BaseModel, EmailStr
+from typing import List, Dict, Optional
+from datetime import datetime, timedelta, timezone
+from pydantic import BaseModel, EmailStr, Field, ValidationError
 from app.schemas.participant import ParticipantCreate, ParticipantUpdate, ParticipantOut
 from app.models.participant import Participant, Base
 from app.models.raw_data import RawData
+from app.models.raw_data_minute import RawDataMinute
+from app.models.data_freshness import DataFreshness
+from app.models.metric import Metric
+from app.core.admission import admit
 from app.core.mail import send_email
+from app.db.session import get_db_session
+from app.db.catalog import get_metric_id, get_minute_metrics, freshness_snapshot
+from app.services.participants import PARTICIPANT_FIELDS, PARTICIPANT_OPT_IN_FIELDS, MAX_PAGE_SIZE, parse_fields, filter_participants, keyset_page, upsert_participants
+from app.services.outreach import select_targets, send_outreach, log_communications
 
 router = APIRouter(prefix="/participants", tags=["Participants"])
 
@@ -15,32 +27,121 @@ class EmailSchema(BaseModel):
     subject: str
     body: str
 
-# Dependency to get DB session
-
-def get_db_session():
-    from sqlalchemy import create_engine
-    from sqlalchemy.orm import sessionmaker
-    import os
-    DATABASE_URL = f"postgresql://{os.environ.get('DB_USER', 'postgres')}:{os.environ.get('DB_PASS', 'password')}@{os.environ.get('DB_HOST', 'timescaledb')}:{os.environ.get('DB_PORT', '5432')}/{os.environ.get('DB_NAME', 'fitbit_data')}"
-    engine = create_engine(DATABASE_URL)
-    SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
+class OutreachSchema(BaseModel):
+    subject: str
+    body: str
+    email_type: str = "outreach"
+    participant_ids: Optional[List[int]] = None
+    active: Optional[bool] = None
+    stale_hours: Optional[int] = None
+    overall_adherence_below: Optional[float] = None
+    days: int = 30
+    concurrency: Optional[int] = Field(None, ge=1)
+    rate: Optional[float] = Field(None, gt=0)
+    dry_run: bool = False
 
 @router.post("/", response_model=ParticipantOut, status_code=status.HTTP_201_CREATED)
 def create_participant(participant: ParticipantCreate, db: Session = Depends(get_db_session)):
     db_participant = Participant(**participant.dict())
     db.add(db_participant)
     db.commit()
+    freshness_snapshot.invalidate()
     db.refresh(db_participant)
     return db_participant
 
-@router.get("/", response_model=List[ParticipantOut])
-def list_participants(db: Session = Depends(get_db_session)):
-    return db.query(Participant).all()
+@router.post("/bulk")
+async def bulk_upsert_participants(request: Request, db: Session = Depends(get_db_session)) -> Dict:
+    """
+    Create or update many participants, matched on email, in one transaction. The body is a
+    JSON array of participants or, with Content-Type text/csv, a CSV with a header row; empty
+    CSV cells leave the stored value unchanged. Returns a result per input row.
+    """
+    body = await request.body()
+    try:
+        if request.headers.get("content-type", "").startswith("text/csv"):
+            reader = csv.DictReader(io.StringIO(body.decode("utf-8-sig")))
+            records = [{key: value for key, value in row.items() if key and value not in (None, "")} for row in reader]
+        else:
+            records = json.loads(body)
+            if not isinstance(records, list):
+                raise ValueError("Expected a JSON array of participants")
+    except (ValueError, UnicodeDecodeError) as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    results, valid, valid_rows = [], [], []
+    for index, record in enumerate(records):
+        email = record.get("email") if isinstance(record, dict) else None
+        try:
+            participant = ParticipantCreate.parse_obj(record)
+        except ValidationError as e:
+            results.append({"row": index, "email": email, "status": "invalid", "error": str(e)})
+            continue
+        if not participant.email.strip():
+            results.append({"row": index, "email": email, "status": "invalid", "error": "email is required"})
+            continue
+        results.append(None)
+        valid.append(index)
+        valid_rows.append(participant.dict(exclude_unset=True))
+
+    # The upsert blocks on the database, so keep it off the event loop
+    upserted = await run_in_threadpool(upsert_participants, db, valid_rows)
+    freshness_snapshot.invalidate()
+    for index, result in zip(valid, upserted):
+        results[index] = {**result, "row": index}
+
+    summary = {status_name: 0 for status_name in ("created", "updated", "duplicate", "invalid")}
+    for result in results:
+        summary[result["status"]] += 1
+    return {"summary": summary, "results": results}
+
+@router.get("/")
+def list_participants(
+    response: Response,
+    db: Session = Depends(get_db_session),
+    cursor: Optional[int] = Query(None, description="X-Next-Cursor value from the previous page"),
+    limit: int = Query(100, ge=1, le=MAX_PAGE_SIZE),
+    fields: Optional[List[str]] = Query(None, description="Columns to return, e.g. fields=id,name,email"),
+    active: Optional[bool] = Query(None, description="Only participants whose study is (not) running today"),
+    stale_hours: Optional[int] = Query(None, description="Only participants without an upload in this many hours"),
+) -> List[Dict]:
+    """Keyset-paginated participant list; the next page's cursor is sent in X-Next-Cursor"""
+    try:
+        fields = parse_fields(fields, PARTICIPANT_FIELDS, PARTICIPANT_OPT_IN_FIELDS)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    # Only the requested columns are read; id is always selected to build the cursor
+    columns = [Participant.__table__.c[name] for name in dict.fromkeys(['id'] + fields)]
+    query = db.query(*columns).execution_options(query_name='list_participants')
+    query = filter_participants(query, active, stale_hours)
+    rows, next_cursor = keyset_page(query, cursor, limit)
+    if next_cursor is not None:
+        response.headers["X-Next-Cursor"] = str(next_cursor)
+    return [{name: row._mapping[name] for name in fields} for row in rows]
+
+@router.get("/freshness")
+def get_freshness(
+    db: Session = Depends(get_db_session),
+    hours: int = Query(48, description="Participants without data in this many hours are stale")
+) -> List[Dict]:
+    """Last data point per participant and metric, from the table ingestion keeps up to date"""
+    since = datetime.now(timezone.utc) - timedelta(hours=hours)
+    rows = db.query(Participant.id, Participant.name, Metric.name.label('metric'), DataFreshness.last_seen_at) \
+        .execution_options(query_name='participant_freshness') \
+        .outerjoin(DataFreshness, DataFreshness.user_id == Participant.id) \
+        .outerjoin(Metric, Metric.id == DataFreshness.metric_id) \
+        .order_by(Participant.id).all()
+
+    freshness = {}
+    for row in rows:
+        entry = freshness.setdefault(row.id, {"id": row.id, "name": row.name, "last_upload": None, "metrics": {}})
+        if row.last_seen_at is None:
+            continue
+        entry["metrics"][row.metric] = row.last_seen_at
+        if entry["last_upload"] is None or row.last_seen_at > entry["last_upload"]:
+            entry["last_upload"] = row.last_seen_at
+    for entry in freshness.values():
+        entry["recent_upload"] = entry["last_upload"] is not None and entry["last_upload"] >= since
+    return list(freshness.values())
 
 @router.get("/{participant_id}", response_model=ParticipantOut)
 def get_participant(participant_id: int, db: Session = Depends(get_db_session)):
@@ -55,19 +156,50 @@ async def contact_participant(
     email: EmailSchema,
     db: Session = Depends(get_db_session)
 ):
-    participant = db.query(Participant).filter(Participant.id == participant_id).first()
-    if not participant:
-        raise HTTPException(status_code=404, detail="Participant not found")
-    
+    # The session blocks, so its work runs in the threadpool; only the send stays on the event loop
+    participant = await run_in_threadpool(get_participant, participant_id, db)
     try:
         await send_email(
             subject=email.subject,
             recipients=[participant.email],
             body=email.body
         )
-        return {"message": "Email sent successfully"}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+    await run_in_threadpool(log_communications, db, [{
+        "participant_id": participant.id, "email_type": "contact", "message_content": email.body,
+        "email_status": "sent", "recipient_email": participant.email,
+    }])
+    return {"message": "Email sent successfully"}
+
+@router.post("/outreach", status_code=status.HTTP_200_OK)
+async def bulk_outreach(request: OutreachSchema, db: Session = Depends(get_db_session)) -> Dict:
+    """
+    Email every participant matching the filters, e.g. overall_adherence_below=70, over pooled
+    SMTP connections with bounded concurrency and rate. $name, $email and $overall_adherence
+    are filled in the subject and body. Every attempt is logged to communication_logs.
+    """
+    targets = await run_in_threadpool(
+        select_targets, db, request.participant_ids, request.active,
+        request.stale_hours, request.overall_adherence_below, request.days
+    )
+    if request.dry_run:
+        return {"summary": {"targets": len(targets)}, "results": targets}
+
+    filters = request.dict(include={"active", "stale_hours", "overall_adherence_below"}, exclude_none=True)
+    threshold = ",".join(f"{key}={value}" for key, value in filters.items()) or None
+    try:
+        results = await send_outreach(
+            db, targets, request.subject, request.body, request.email_type,
+            threshold_triggered=threshold and threshold[:100],
+            concurrency=request.concurrency, rate=request.rate
+        )
+    except ConnectionError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    summary = {"targets": len(targets), "sent": 0, "failed": 0}
+    for result in results:
+        summary[result["status"]] += 1
+    return {"summary": summary, "results": results}
 
 
 @router.get("/{participant_id}/metrics")
@@ -76,17 +208,28 @@ def get_participant_metrics(
     db: Session = Depends(get_db_session),
     metrics: List[str] = Query(...),
     start_date: datetime = Query(...),
-    end_date: datetime = Query(...)
+    end_date: datetime = Query(...),
+    guard=admit("metrics"),
 ) -> Dict[str, List[Dict]]:
     participant = db.query(Participant).filter(Participant.id == participant_id).first()
     if not participant:
         raise HTTPException(status_code=404, detail="Participant not found")
 
+    # Intraday metrics co-sampled per minute come from one scan of the wide table
+    # instead of one narrow scan per metric
+    minute_metrics = get_minute_metrics()
+    if all(metric in minute_metrics and metric in RawDataMinute.__table__.c for metric in metrics):
+        return get_minute_metrics_data(db, participant_id, metrics, start_date, end_date)
+
     results = {}
     for metric in metrics:
-        data = db.query(RawData).filter(
+        metric_id = get_metric_id(metric)
+        if metric_id is None:
+            results[metric] = []
+            continue
+        data = db.query(RawData).execution_options(query_name='participant_metrics').filter(
             RawData.user_id == participant_id,
-            RawData.metric_name == metric,
+            RawData.metric_id == metric_id,
             RawData.timestamp >= start_date,
             RawData.timestamp <= end_date
         ).order_by(RawData.timestamp).all()
@@ -94,6 +237,26 @@ def get_participant_metrics(
 
     return results
 
+def get_minute_metrics_data(
+    db: Session, participant_id: int, metrics: List[str], start_date: datetime, end_date: datetime
+) -> Dict[str, List[Dict]]:
+    """Read several intraday metrics from raw_data_minute in a single query"""
+    metrics = list(dict.fromkeys(metrics))
+    columns = [RawDataMinute.__table__.c[metric] for metric in metrics]
+    data = db.query(RawDataMinute.timestamp, *columns).execution_options(query_name='participant_metrics_minute').filter(
+        RawDataMinute.user_id == participant_id,
+        RawDataMinute.timestamp >= start_date,
+        RawDataMinute.timestamp <= end_date
+    ).order_by(RawDataMinute.timestamp).all()
+
+    # Imputed values are only written to raw_data, so every value here is measured
+    results = {metric: [] for metric in metrics}
+    for row in data:
+        for metric, value in zip(metrics, row[1:]):
+            if value is not None:
+                results[metric].append({"timestamp": row.timestamp, "value": value, "is_imputed": False})
+    return results
+
 @router.put("/{participant_id}", response_model=ParticipantOut)
 def update_participant(participant_id: int, update: ParticipantUpdate, db: Session = Depends(get_db_session)):
     participant = db.query(Participant).filter(Participant.id == participant_id).first()
@@ -102,6 +265,7 @@ def update_participant(participant_id: int, update: ParticipantUpdate, db: Sessi
     for key, value in update.dict(exclude_unset=True).items():
         setattr(participant, key, value)
     db.commit()
+    freshness_snapshot.invalidate()
     db.refresh(participant)
     return participant
 
@@ -112,4 +276,5 @@ def delete_participant(participant_id: int, db: Session = Depends(get_db_session
         raise HTTPException(status_code=404, detail="Participant not found")
     db.delete(participant)
     db.commit()
+    freshness_snapshot.invalidate()
     return None 
\ No newline at end of file
@@ -0,0 +1,34 @@
+from fastapi import APIRouter, HTTPException, Query
+from fastapi.responses import PlainTextResponse
+import asyncio
+import time
+from app.core.config import settings
+from app.core.profiling import SamplingProfiler, profile_store
+
+router = APIRouter(prefix="/debug/profiles", tags=["Profiling"])
+
+@router.get("/")
+def list_profiles():
+    """List the retained profiles, newest first"""
+    return profile_store.list()
+
+@router.post("/capture")
+async def capture_profile(seconds: float = Query(10, gt=0, le=120, description="How long to sample the whole process")):
+    """Sample every thread of the backend process for a fixed window"""
+    profiler = SamplingProfiler(settings.PROFILE_SAMPLE_INTERVAL)
+    start_time = time.perf_counter()
+    profiler.start()
+    try:
+        await asyncio.sleep(seconds)
+    finally:
+        profiler.stop()
+    profile_id = profile_store.add("process", profiler.collapsed(), profiler.samples, time.perf_counter() - start_time)
+    return {"id": profile_id, "samples": profiler.samples}
+
+@router.get("/{profile_id}", response_class=PlainTextResponse)
+def get_profile(profile_id: str):
+    """Return a profile as collapsed stacks (feed to flamegraph.pl or speedscope)"""
+    profile = profile_store.get(profile_id)
+    if not profile:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return PlainTextResponse(profile["collapsed"])
@@ -0,0 +1,144 @@
+import asyncio
+import threading
+import time
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from typing import Dict, Optional, Set
+from fastapi import Depends, HTTPException, Request
+from fastapi.responses import JSONResponse
+from psycopg2.errors import QueryCanceled
+from app.core.config import settings
+from app.core.metrics import api_admission_rejected_total, api_admission_wait_seconds, api_query_cancellations_total
+
+# Seconds between checks for a client that has gone away
+DISCONNECT_POLL_SECONDS = 0.5
+
+class QueryGuard:
+    """
+    Per-request state for the database layer: the statement_timeout of the request's
+    query class, and the connections its queries are running on, so they can be
+    cancelled if the client disconnects.
+    """
+
+    def __init__(self, query_class: str, timeout_ms: int):
+        self.query_class = query_class
+        self.timeout_ms = timeout_ms
+        self.disconnected = False
+        self._connections: Set = set()
+        self._lock = threading.Lock()
+
+    def track(self, conn):
+        with self._lock:
+            self._connections.add(conn)
+
+    def untrack(self, conn):
+        with self._lock:
+            self._connections.discard(conn)
+
+    def cancel(self):
+        """Cancel whatever the request's connections are running; psycopg2 allows this from any thread"""
+        with self._lock:
+            self.disconnected = True
+            for conn in self._connections:
+                conn.cancel()
+
+# Set for the duration of an admitted request; read by DatabaseManager and the SQLAlchemy session
+current_guard: ContextVar[Optional[QueryGuard]] = ContextVar('current_guard', default=None)
+
+class AdmissionLimiter:
+    """
+    At most `concurrency` requests of a class run at once; up to `queue_size` more wait,
+    each for at most `queue_timeout` seconds. Anything beyond that is rejected with a 503
+    instead of queueing for a pooled connection behind requests that may take minutes.
+    """
+
+    def __init__(self, name: str, concurrency: int, queue_size: int, queue_timeout: float, timeout_ms: int):
+        self.name = name
+        self.concurrency = concurrency
+        self.queue_size = queue_size
+        self.queue_timeout = queue_timeout
+        self.timeout_ms = timeout_ms
+        self.waiting = 0
+        # Created on first use so it binds to the server's event loop, not the import-time one
+        self._slots: Optional[asyncio.Semaphore] = None
+
+    async def acquire(self):
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.concurrency)
+        if not self._slots.locked():
+            await self._slots.acquire()
+            api_admission_wait_seconds.labels(self.name).observe(0)
+            return
+        if self.waiting >= self.queue_size:
+            api_admission_rejected_total.labels(self.name, 'queue_full').inc()
+            raise HTTPException(status_code=503, detail=f"Too many {self.name} requests, try again shortly",
+                                headers={"Retry-After": "1"})
+        self.waiting += 1
+        start_time = time.perf_counter()
+        try:
+            await asyncio.wait_for(self._slots.acquire(), self.queue_timeout)
+        except asyncio.TimeoutError:
+            api_admission_rejected_total.labels(self.name, 'queue_timeout').inc()
+            raise HTTPException(status_code=503, detail=f"Timed out waiting to run {self.name} request",
+                                headers={"Retry-After": "5"})
+        finally:
+            self.waiting -= 1
+        api_admission_wait_seconds.labels(self.name).observe(time.perf_counter() - start_time)
+
+    def release(self):
+        self._slots.release()
+
+limiters: Dict[str, AdmissionLimiter] = {
+    "metrics": AdmissionLimiter("metrics", settings.METRICS_CONCURRENCY, settings.ADMISSION_QUEUE_SIZE,
+                                settings.ADMISSION_QUEUE_TIMEOUT, settings.METRICS_STATEMENT_TIMEOUT_MS),
+    "adherence": AdmissionLimiter("adherence", settings.ADHERENCE_CONCURRENCY, settings.ADMISSION_QUEUE_SIZE,
+                                  settings.ADMISSION_QUEUE_TIMEOUT, settings.ADHERENCE_STATEMENT_TIMEOUT_MS),
+    "cohort": AdmissionLimiter("cohort", settings.COHORT_CONCURRENCY, settings.ADMISSION_QUEUE_SIZE,
+                               settings.ADMISSION_QUEUE_TIMEOUT, settings.COHORT_STATEMENT_TIMEOUT_MS),
+}
+
+async def watch_disconnect(request: Request, guard: QueryGuard):
+    while not await request.is_disconnected():
+        await asyncio.sleep(DISCONNECT_POLL_SECONDS)
+    guard.cancel()
+
+@asynccontextmanager
+async def admitted(request: Request, query_class: str):
+    """
+    Waits for a slot in the class's limiter, then runs the block with the class's
+    statement_timeout and cancels its queries if the client disconnects. Endpoints that
+    can answer from the freshness snapshot (a 304) check that first and only then enter
+    this, so revalidations never queue behind, or get rejected by, the expensive requests.
+    The guard stays set afterwards, so the QueryCanceled handler can still read it.
+    """
+    limiter = limiters[query_class]
+    await limiter.acquire()
+    guard = QueryGuard(query_class, limiter.timeout_ms)
+    current_guard.set(guard)
+    watcher = asyncio.ensure_future(watch_disconnect(request, guard))
+    try:
+        yield guard
+    finally:
+        watcher.cancel()
+        limiter.release()
+
+def admit(query_class: str):
+    """Dependency for an expensive endpoint that holds an admitted() slot for the whole request"""
+    # An unknown class fails when the route is declared, not on its first request
+    limiters[query_class]
+
+    async def dependency(request: Request):
+        async with admitted(request, query_class) as guard:
+            yield guard
+
+    return Depends(dependency)
+
+def query_canceled_response(exc: QueryCanceled) -> JSONResponse:
+    """504 for a query that hit its statement_timeout; 499 (client closed request) for one cancelled on disconnect"""
+    guard = current_guard.get()
+    query_class = guard.query_class if guard else "none"
+    if guard and guard.disconnected:
+        api_query_cancellations_total.labels(query_class, 'disconnect').inc()
+        return JSONResponse(status_code=499, content={"detail": "Client disconnected; query cancelled"})
+    api_query_cancellations_total.labels(query_class, 'timeout').inc()
+    return JSONResponse(status_code=504, content={"detail": f"Query exceeded the {query_class} time limit"})
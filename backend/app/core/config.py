@@ -9,6 +9,23 @@ class Settings(BaseSettings):
     DB_USER: str = os.getenv("DB_USER", "postgres")
     DB_PASS: str = os.getenv("DB_PASS", "password")
     
+    # psycopg2 pool: size, seconds to wait for a free connection, maximum connection age,
+    # idle time after which a connection is checked before reuse, and prepared statements
+    DB_POOL_MIN: int = int(os.getenv("DB_POOL_MIN", "1"))
+    DB_POOL_MAX: int = int(os.getenv("DB_POOL_MAX", "10"))
+    DB_POOL_TIMEOUT: float = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+    DB_POOL_RECYCLE_SECONDS: float = float(os.getenv("DB_POOL_RECYCLE_SECONDS", "1800"))
+    DB_POOL_CHECK_IDLE_SECONDS: float = float(os.getenv("DB_POOL_CHECK_IDLE_SECONDS", "60"))
+    DB_PREPARE_STATEMENTS: bool = os.getenv("DB_PREPARE_STATEMENTS", "True").lower() == "true"
+    # plan_cache_mode for pooled sessions: a generic plan cannot exclude hypertable chunks by
+    # the time range, so prepared statements are planned for their parameters on every
+    # execution. Empty leaves the server's setting (for poolers that reject startup options)
+    DB_PLAN_CACHE_MODE: str = os.getenv("DB_PLAN_CACHE_MODE", "force_custom_plan")
+    
+    # Where ingestion writes heart_rate and spo2; must match the ingest service's setting.
+    # With 'wide', wear time is counted from raw_data_minute instead of raw_data
+    INGEST_LAYOUT: str = os.getenv("INGEST_LAYOUT", "narrow")
+    
     # Database URL
     @property
     def DATABASE_URL(self) -> str:
@@ -18,5 +35,39 @@ class Settings(BaseSettings):
     APP_NAME: str = "Fitbit Data API"
     APP_VERSION: str = "1.0.0"
     DEBUG: bool = os.getenv("DEBUG", "False").lower() == "true"
+    
+    # On-demand profiling (X-Profile header and /api/debug/profiles); off by default
+    PROFILING_ENABLED: bool = os.getenv("PROFILING_ENABLED", "False").lower() == "true"
+    PROFILE_RETENTION: int = int(os.getenv("PROFILE_RETENTION", "20"))
+    PROFILE_SAMPLE_INTERVAL: float = float(os.getenv("PROFILE_SAMPLE_INTERVAL", "0.005"))
+    
+    # Background data exports: output directory, jobs kept before their files are deleted,
+    # rows per fetch/row group and users per output file
+    EXPORT_DIR: str = os.getenv("EXPORT_DIR", "exports")
+    EXPORT_RETENTION: int = int(os.getenv("EXPORT_RETENTION", "20"))
+    EXPORT_BATCH_ROWS: int = int(os.getenv("EXPORT_BATCH_ROWS", "50000"))
+    EXPORT_USERS_PER_PART: int = int(os.getenv("EXPORT_USERS_PER_PART", "100"))
+    
+    # HTTP caching and compression: seconds the freshness snapshot behind ETags is reused,
+    # and the smallest response body worth compressing
+    FRESHNESS_CACHE_SECONDS: float = float(os.getenv("FRESHNESS_CACHE_SECONDS", "30"))
+    COMPRESSION_MIN_SIZE: int = int(os.getenv("COMPRESSION_MIN_SIZE", "1024"))
+    
+    # Live streaming: the NOTIFY channel ingestion writes to, events buffered per client
+    # before it is told to resync, and seconds between keepalives on an idle stream
+    LIVE_CHANNEL: str = os.getenv("LIVE_CHANNEL", "metric_appended")
+    LIVE_QUEUE_SIZE: int = int(os.getenv("LIVE_QUEUE_SIZE", "100"))
+    LIVE_KEEPALIVE_SECONDS: float = float(os.getenv("LIVE_KEEPALIVE_SECONDS", "15"))
+    
+    # Admission control for expensive endpoints: concurrent requests and statement_timeout
+    # per query class, plus how many requests may queue for a slot and for how long
+    METRICS_CONCURRENCY: int = int(os.getenv("METRICS_CONCURRENCY", "4"))
+    METRICS_STATEMENT_TIMEOUT_MS: int = int(os.getenv("METRICS_STATEMENT_TIMEOUT_MS", "30000"))
+    ADHERENCE_CONCURRENCY: int = int(os.getenv("ADHERENCE_CONCURRENCY", "2"))
+    ADHERENCE_STATEMENT_TIMEOUT_MS: int = int(os.getenv("ADHERENCE_STATEMENT_TIMEOUT_MS", "60000"))
+    COHORT_CONCURRENCY: int = int(os.getenv("COHORT_CONCURRENCY", "2"))
+    COHORT_STATEMENT_TIMEOUT_MS: int = int(os.getenv("COHORT_STATEMENT_TIMEOUT_MS", "30000"))
+    ADMISSION_QUEUE_SIZE: int = int(os.getenv("ADMISSION_QUEUE_SIZE", "20"))
+    ADMISSION_QUEUE_TIMEOUT: float = float(os.getenv("ADMISSION_QUEUE_TIMEOUT", "10"))
 
 settings = Settings() 
\ No newline at end of file
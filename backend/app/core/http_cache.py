@@ -0,0 +1,116 @@
+import gzip
+import hashlib
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Optional
+import brotli
+import zstandard
+from fastapi import Request, Response
+from app.core.config import settings
+from app.core.metrics import api_conditional_requests_total, api_response_compression_ratio
+
+# Content types worth compressing; everything else (event streams, exported gzip/Parquet
+# files) is passed through untouched
+COMPRESSIBLE_TYPES = ("application/json", "text/plain", "text/csv", "text/html")
+
+# Preferred first when the client accepts several with the same q-value
+ENCODERS = {
+    "zstd": lambda body: zstandard.ZstdCompressor(level=3).compress(body),
+    "br": lambda body: brotli.compress(body, quality=4),
+    "gzip": lambda body: gzip.compress(body, compresslevel=6),
+}
+
+def make_etag(request: Request, version: datetime, *parts) -> str:
+    """Weak ETag over the request's path and query, the data version and any extra parts"""
+    key = "|".join([request.url.path, str(request.url.query), version.isoformat(), *map(str, parts)])
+    return f'W/"{hashlib.sha1(key.encode()).hexdigest()[:20]}"'
+
+def conditional_response(request: Request, response: Response, version: Optional[datetime], *parts) -> Optional[Response]:
+    """
+    Set ETag and Last-Modified on `response` for data last changed at `version`, and return a 304
+    to send instead when the client's copy is current. Returns None (and sets nothing) if the
+    version is unknown, in which case the endpoint answers normally.
+    """
+    if version is None:
+        return None
+    if version.tzinfo is None:
+        version = version.replace(tzinfo=timezone.utc)
+    etag = make_etag(request, version, *parts)
+    headers = {
+        "ETag": etag,
+        "Last-Modified": format_datetime(version.astimezone(timezone.utc), usegmt=True),
+        "Cache-Control": "private, no-cache",
+    }
+    route = request.scope["route"].path
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        # If-None-Match takes precedence over If-Modified-Since when both are sent
+        current = if_none_match.strip() == "*" or etag in [tag.strip() for tag in if_none_match.split(",")]
+    else:
+        current = is_not_modified_since(request.headers.get("if-modified-since"), version)
+    if current:
+        api_conditional_requests_total.labels(route, "not_modified").inc()
+        return Response(status_code=304, headers=headers)
+    api_conditional_requests_total.labels(route, "modified").inc()
+    response.headers.update(headers)
+    return None
+
+def is_not_modified_since(header: Optional[str], version: datetime) -> bool:
+    if not header:
+        return False
+    try:
+        since = parsedate_to_datetime(header)
+    except (TypeError, ValueError):
+        return False
+    if since.tzinfo is None:
+        since = since.replace(tzinfo=timezone.utc)
+    # HTTP dates have whole-second precision
+    return version.replace(microsecond=0) <= since
+
+def negotiate_encoding(accept_encoding: str) -> Optional[str]:
+    """Best encoding in ENCODERS that the Accept-Encoding header allows, or None for identity"""
+    accepted = {}
+    for item in accept_encoding.split(","):
+        name, _, params = item.strip().partition(";")
+        q = 1.0
+        if params.strip().startswith("q="):
+            try:
+                q = float(params.strip()[2:])
+            except ValueError:
+                q = 0.0
+        accepted[name.strip().lower()] = q
+    best, best_q = None, 0.0
+    for encoding in ENCODERS:
+        q = accepted.get(encoding, accepted.get("*", 0.0))
+        if q > best_q:
+            best, best_q = encoding, q
+    return best
+
+async def compress_response(request: Request, response: Response) -> Response:
+    """
+    Compress a JSON or text response with the client's preferred encoding when the body is at
+    least COMPRESSION_MIN_SIZE bytes. Other responses are returned as they are, unbuffered.
+    """
+    content_type = response.headers.get("content-type", "")
+    if (
+        "content-encoding" in response.headers
+        or response.status_code < 200 or response.status_code in (204, 304)
+        or not content_type.startswith(COMPRESSIBLE_TYPES)
+    ):
+        return response
+    response.headers["vary"] = "Accept-Encoding"
+    encoding = negotiate_encoding(request.headers.get("accept-encoding", ""))
+    # Known to be too small without reading the body
+    length = response.headers.get("content-length")
+    if encoding is None or (length is not None and int(length) < settings.COMPRESSION_MIN_SIZE):
+        return response
+
+    body = b"".join([chunk async for chunk in response.body_iterator])
+    headers = {key: value for key, value in response.headers.items() if key != "content-length"}
+    if len(body) >= settings.COMPRESSION_MIN_SIZE:
+        compressed = ENCODERS[encoding](body)
+        route = request.scope.get("route")
+        api_response_compression_ratio.labels(route.path if route else "unmatched", encoding).observe(len(body) / max(len(compressed), 1))
+        body = compressed
+        headers["content-encoding"] = encoding
+    return Response(body, status_code=response.status_code, headers=headers, background=response.background)
@@ -1,6 +1,10 @@
-from fastapi_mail import FastMail, MessageSchema, ConnectionConfig
+from fastapi_mail import ConnectionConfig
 from pydantic import EmailStr
+from email.message import EmailMessage
 from typing import List, Optional
+import asyncio
+import time
+import aiosmtplib
 import os
 
 conf: Optional[ConnectionConfig] = None
@@ -19,15 +23,118 @@ if all(os.getenv(key) for key in ["MAIL_USERNAME", "MAIL_PASSWORD", "MAIL_SERVER
         VALIDATE_CERTS=os.getenv("VALIDATE_CERTS", "True").lower() == "true"
     )
 
-fm: Optional[FastMail] = FastMail(conf) if conf else None
+# SMTP connections kept open between sends, and the bulk outreach limits
+MAIL_POOL_SIZE = int(os.getenv("MAIL_POOL_SIZE", "4"))
+MAIL_CONCURRENCY = int(os.getenv("MAIL_CONCURRENCY", "8"))
+MAIL_RATE_LIMIT = float(os.getenv("MAIL_RATE_LIMIT", "10"))
+
+class SMTPPool:
+    """
+    Keeps up to `size` logged-in SMTP connections open and reuses them across messages,
+    instead of connecting, negotiating TLS and authenticating for every email.
+    """
+
+    def __init__(self, config: ConnectionConfig, size: int = MAIL_POOL_SIZE):
+        self.config = config
+        self.size = size
+        self._idle: List[aiosmtplib.SMTP] = []
+        # Created on first use so it binds to the server's event loop, not the import-time one
+        self._slots: Optional[asyncio.Semaphore] = None
+
+    async def _connect(self) -> aiosmtplib.SMTP:
+        smtp = aiosmtplib.SMTP(
+            hostname=self.config.MAIL_SERVER,
+            port=self.config.MAIL_PORT,
+            use_tls=self.config.MAIL_SSL_TLS,
+            start_tls=self.config.MAIL_STARTTLS,
+            validate_certs=self.config.VALIDATE_CERTS,
+        )
+        await smtp.connect()
+        if self.config.USE_CREDENTIALS:
+            await smtp.login(self.config.MAIL_USERNAME, self.config.MAIL_PASSWORD.get_secret_value())
+        return smtp
+
+    async def send(self, message: EmailMessage):
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.size)
+        async with self._slots:
+            smtp = self._idle.pop() if self._idle else None
+            try:
+                if smtp is None or not smtp.is_connected:
+                    smtp = await self._connect()
+                try:
+                    await smtp.send_message(message)
+                except aiosmtplib.SMTPServerDisconnected:
+                    # The server closed an idle connection; retry once on a fresh one
+                    smtp = await self._connect()
+                    await smtp.send_message(message)
+            except Exception:
+                if smtp is not None:
+                    smtp.close()
+                raise
+            self._idle.append(smtp)
+
+    async def close(self):
+        while self._idle:
+            smtp = self._idle.pop()
+            try:
+                await smtp.quit()
+            except aiosmtplib.SMTPException:
+                smtp.close()
+
+class RateLimiter:
+    """Spaces calls to wait() at least 1/rate seconds apart across all callers"""
+
+    def __init__(self, rate: float = MAIL_RATE_LIMIT):
+        self.interval = 1.0 / rate if rate > 0 else 0.0
+        self._next = 0.0
+        self._lock = asyncio.Lock()
+
+    async def wait(self):
+        async with self._lock:
+            now = time.monotonic()
+            delay = self._next - now
+            self._next = max(now, self._next) + self.interval
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+smtp_pool: Optional[SMTPPool] = SMTPPool(conf) if conf else None
+
+def build_message(subject: str, recipients: List[EmailStr], body: str) -> EmailMessage:
+    message = EmailMessage()
+    message["From"] = conf.MAIL_FROM
+    message["To"] = ", ".join(recipients)
+    message["Subject"] = subject
+    message.set_content(body, subtype="html")
+    return message
 
 async def send_email(subject: str, recipients: List[EmailStr], body: str):
-    if not fm:
+    if not smtp_pool:
         raise ConnectionError("Mail service is not configured. Please set MAIL_* environment variables.")
-    message = MessageSchema(
-        subject=subject,
-        recipients=recipients,
-        body=body,
-        subtype="html"
-    )
-    await fm.send_message(message) 
\ No newline at end of file
+    await smtp_pool.send(build_message(subject, recipients, body))
+
+async def send_bulk_email(messages: List[dict], concurrency: int = MAIL_CONCURRENCY, rate: float = MAIL_RATE_LIMIT, on_result=None) -> List[dict]:
+    """
+    Send many {subject, recipients, body} messages through send_email with at most
+    `concurrency` in flight and at most `rate` started per second. Returns a
+    {status, error} result per message, in order; on_result(index, result) is
+    called as each one finishes.
+    """
+    if not smtp_pool:
+        raise ConnectionError("Mail service is not configured. Please set MAIL_* environment variables.")
+    semaphore = asyncio.Semaphore(concurrency)
+    limiter = RateLimiter(rate)
+
+    async def send_one(index: int, message: dict) -> dict:
+        async with semaphore:
+            await limiter.wait()
+            try:
+                await send_email(message["subject"], message["recipients"], message["body"])
+                result = {"status": "sent", "error": None}
+            except Exception as e:
+                result = {"status": "failed", "error": str(e)}
+        if on_result is not None:
+            await on_result(index, result)
+        return result
+
+    return await asyncio.gather(*(send_one(index, message) for index, message in enumerate(messages)))
@@ -0,0 +1,79 @@
+from prometheus_client import Counter, Gauge, Histogram
+
+# Prometheus metrics for the backend API. Names are prefixed with api_/db_ so they
+# don't collide with the ingestion service's ingestion_* metrics in Prometheus.
+
+api_request_duration_seconds = Histogram(
+    'api_request_duration_seconds',
+    'Latency of backend API requests in seconds',
+    ['method', 'route', 'status']
+)
+
+db_query_duration_seconds = Histogram(
+    'db_query_duration_seconds',
+    'Latency of database queries in seconds',
+    ['query', 'table']
+)
+
+db_query_rows = Histogram(
+    'db_query_rows',
+    'Number of rows returned by database queries',
+    ['query', 'table'],
+    buckets=(0, 1, 10, 100, 1000, 10000, 100000, 1000000)
+)
+
+db_pool_wait_seconds = Histogram(
+    'db_pool_wait_seconds',
+    'Time spent waiting for a pooled database connection in seconds',
+    ['pool'],
+    buckets=(0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5)
+)
+
+api_conditional_requests_total = Counter(
+    'api_conditional_requests_total',
+    'Requests to endpoints with ETag/Last-Modified validators, by whether a 304 was returned',
+    ['route', 'result']
+)
+
+api_response_compression_ratio = Histogram(
+    'api_response_compression_ratio',
+    'Uncompressed over compressed response body size',
+    ['route', 'encoding'],
+    buckets=(1, 1.5, 2, 3, 5, 8, 12, 20, 50)
+)
+
+api_live_subscribers = Gauge(
+    'api_live_subscribers',
+    'Open live metric streams'
+)
+
+api_live_events_total = Counter(
+    'api_live_events_total',
+    'Live stream events queued for clients, or dropped because a client fell behind',
+    ['result']
+)
+
+api_admission_rejected_total = Counter(
+    'api_admission_rejected_total',
+    'Requests turned away by admission control, by query class and reason',
+    ['query_class', 'reason']
+)
+
+api_admission_wait_seconds = Histogram(
+    'api_admission_wait_seconds',
+    'Time admitted requests waited for a slot in their query class',
+    ['query_class'],
+    buckets=(0.001, 0.01, 0.05, 0.1, 0.5, 1, 2, 5, 10)
+)
+
+api_query_cancellations_total = Counter(
+    'api_query_cancellations_total',
+    'Queries stopped by statement_timeout or cancelled after the client disconnected',
+    ['query_class', 'reason']
+)
+
+db_pool_discarded_total = Counter(
+    'db_pool_discarded_total',
+    'Pooled psycopg2 connections closed instead of reused, by reason (recycled, broken, health_check)',
+    ['reason']
+)
@@ -0,0 +1,89 @@
+import sys
+import threading
+import uuid
+from collections import Counter, OrderedDict
+from datetime import datetime
+from typing import Dict, Any, List, Optional
+from app.core.config import settings
+
+class SamplingProfiler:
+    """
+    Periodically samples thread stacks and aggregates them as collapsed stacks
+    ("frame;frame;frame count"), the input format of flamegraph tools.
+    Samples every thread except its own unless thread_ids is given, so it also
+    sees sync routes that FastAPI runs in its threadpool.
+    """
+
+    def __init__(self, interval: float = 0.005, thread_ids: Optional[List[int]] = None):
+        self.interval = interval
+        self.thread_ids = thread_ids
+        self.stacks = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+
+    def _run(self):
+        own_id = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id or (self.thread_ids and thread_id not in self.thread_ids):
+                    continue
+                self.stacks[self._collapse(frame)] += 1
+            self.samples += 1
+
+    @staticmethod
+    def _collapse(frame) -> str:
+        names = []
+        while frame is not None:
+            code = frame.f_code
+            names.append(f"{code.co_name} ({code.co_filename}:{code.co_firstlineno})")
+            frame = frame.f_back
+        return ";".join(reversed(names))
+
+    def collapsed(self) -> str:
+        return "\n".join(f"{stack} {count}" for stack, count in self.stacks.most_common())
+
+class ProfileStore:
+    """Keeps the most recent profiles in memory, evicting the oldest beyond `retention`"""
+
+    def __init__(self, retention: int = 20):
+        self.retention = retention
+        self._profiles = OrderedDict()
+        self._lock = threading.Lock()
+
+    def add(self, target: str, collapsed: str, samples: int, duration: float) -> str:
+        profile_id = uuid.uuid4().hex[:12]
+        with self._lock:
+            self._profiles[profile_id] = {
+                "id": profile_id,
+                "target": target,
+                "created_at": datetime.now().isoformat(),
+                "duration_seconds": round(duration, 4),
+                "samples": samples,
+                "collapsed": collapsed,
+            }
+            while len(self._profiles) > self.retention:
+                self._profiles.popitem(last=False)
+        return profile_id
+
+    def get(self, profile_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            return self._profiles.get(profile_id)
+
+    def list(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            return [
+                {k: v for k, v in profile.items() if k != "collapsed"}
+                for profile in reversed(self._profiles.values())
+            ]
+
+profile_store = ProfileStore(settings.PROFILE_RETENTION)
@@ -0,0 +1,141 @@
+from datetime import datetime
+from typing import Dict, List, Optional, Set, Tuple
+from app.core.config import settings
+from app.db.database import db_manager
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# Metric ids never change once assigned, so resolved names are cached for the
+# life of the process. Misses are not cached: ingestion may add the metric later.
+_metric_ids: Dict[str, int] = {}
+
+# The wide table's columns change only when ingestion creates or extends it, in another
+# process, so the list (empty included) is re-read at most every MINUTE_METRICS_TTL seconds
+MINUTE_METRICS_TTL = 300
+_minute_metrics: Set[str] = set()
+_minute_metrics_loaded_at: Optional[float] = None
+
+def get_metric_id(name: str) -> Optional[int]:
+    """
+    Resolve a metric name to its id in the metrics dictionary; None if unknown
+    """
+    metric_id = _metric_ids.get(name)
+    if metric_id is None:
+        row = db_manager.execute_query_single(
+            "SELECT id FROM metrics WHERE name = %s", (name,),
+            query_name='get_metric_id', table='metrics', prepare=True
+        )
+        if row:
+            metric_id = _metric_ids[name] = row['id']
+    return metric_id
+
+def get_metric_names() -> List[str]:
+    """
+    Names of all metrics in the dictionary, sorted
+    """
+    rows = db_manager.execute_query(
+        "SELECT id, name FROM metrics ORDER BY name",
+        query_name='get_metric_names', table='metrics', prepare=True
+    )
+    for row in rows:
+        _metric_ids[row['name']] = row['id']
+    return [row['name'] for row in rows]
+
+def get_minute_metrics() -> Set[str]:
+    """
+    Metric columns of the wide raw_data_minute table; empty if ingestion has not created it
+    """
+    global _minute_metrics, _minute_metrics_loaded_at
+    if _minute_metrics_loaded_at is None or time.monotonic() - _minute_metrics_loaded_at >= MINUTE_METRICS_TTL:
+        rows = db_manager.execute_query(
+            """
+            SELECT column_name FROM information_schema.columns
+            WHERE table_name = 'raw_data_minute' AND column_name NOT IN ('user_id', 'timestamp')
+            """,
+            query_name='get_minute_metrics', table='raw_data_minute'
+        )
+        _minute_metrics = {row['column_name'] for row in rows}
+        _minute_metrics_loaded_at = time.monotonic()
+    return _minute_metrics
+
+class FreshnessSnapshot:
+    """
+    In-process copy of data_freshness and of each participant's updated_at, reloaded at most
+    every `ttl` seconds. HTTP validators are computed from it, so a conditional request that
+    turns into a 304 does not touch the database; a response can lag an ingestion run by up
+    to `ttl` seconds. Writes made through this process call invalidate(); writes from other
+    processes (other API workers, ingestion) are only seen at the next reload, so they can
+    take up to `ttl` (FRESHNESS_CACHE_SECONDS) to change a validator.
+    """
+
+    def __init__(self, ttl: float):
+        self.ttl = ttl
+        self._loaded_at: Optional[float] = None
+        self._lock = threading.Lock()
+        # Indexed on reload so each lookup is a dict access rather than a scan:
+        # updated_at per (user_id, metric_id), newest per user and per metric, newest overall
+        self._ingested: Dict[Tuple[int, int], datetime] = {}
+        self._ingested_by_user: Dict[int, datetime] = {}
+        self._ingested_by_metric: Dict[int, datetime] = {}
+        self._ingested_latest: Optional[datetime] = None
+        # Newest data point per user, across metrics
+        self._last_seen: Dict[int, datetime] = {}
+        self._participants: Dict[int, datetime] = {}
+
+    def _refresh(self):
+        with self._lock:
+            if self._loaded_at is not None and time.monotonic() - self._loaded_at < self.ttl:
+                return
+            rows = db_manager.execute_query(
+                "SELECT user_id, metric_id, updated_at, last_seen_at FROM data_freshness",
+                query_name='freshness_snapshot', table='data_freshness'
+            )
+            ingested, by_user, by_metric, last_seen = {}, {}, {}, {}
+            for row in rows:
+                user_id, metric_id, updated_at = row['user_id'], row['metric_id'], row['updated_at']
+                ingested[(user_id, metric_id)] = updated_at
+                if user_id not in by_user or updated_at > by_user[user_id]:
+                    by_user[user_id] = updated_at
+                if metric_id not in by_metric or updated_at > by_metric[metric_id]:
+                    by_metric[metric_id] = updated_at
+                if user_id not in last_seen or row['last_seen_at'] > last_seen[user_id]:
+                    last_seen[user_id] = row['last_seen_at']
+            self._ingested, self._ingested_by_user, self._ingested_by_metric = ingested, by_user, by_metric
+            self._ingested_latest = max(by_user.values(), default=None)
+            self._last_seen = last_seen
+            rows = db_manager.execute_query(
+                "SELECT id, updated_at FROM participants",
+                query_name='freshness_snapshot', table='participants'
+            )
+            self._participants = {row['id']: row['updated_at'] for row in rows}
+            self._loaded_at = time.monotonic()
+
+    def invalidate(self):
+        with self._lock:
+            self._loaded_at = None
+
+    def ingested_at(self, user_id: Optional[int] = None, metric_id: Optional[int] = None) -> Optional[datetime]:
+        """When data was last ingested for a user (and metric); None for everyone gives the latest overall"""
+        self._refresh()
+        if user_id is not None and metric_id is not None:
+            return self._ingested.get((user_id, metric_id))
+        if user_id is not None:
+            return self._ingested_by_user.get(user_id)
+        if metric_id is not None:
+            return self._ingested_by_metric.get(metric_id)
+        return self._ingested_latest
+
+    def last_seen(self) -> Dict[int, datetime]:
+        """Newest data point per user, across metrics"""
+        self._refresh()
+        return self._last_seen
+
+    def participants(self) -> Dict[int, datetime]:
+        """updated_at per participant id"""
+        self._refresh()
+        return self._participants
+
+freshness_snapshot = FreshnessSnapshot(settings.FRESHNESS_CACHE_SECONDS)
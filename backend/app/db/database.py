@@ -1,32 +1,178 @@
 import psycopg2
+import psycopg2.errors
+import psycopg2.extensions
 import psycopg2.pool
 from psycopg2.extras import RealDictCursor
 from contextlib import contextmanager
 import logging
-from typing import Generator, Dict, Any, List
+import re
+import threading
+import time
+from datetime import datetime
+from typing import Generator, Dict, Any, List, Optional
 from app.core.config import settings
+from app.core.metrics import db_query_duration_seconds, db_query_rows, db_pool_wait_seconds, db_pool_discarded_total
+from app.core.admission import current_guard
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+_FROM_TABLE = re.compile(r'\bFROM\s+"?(\w+)"?', re.IGNORECASE)
+
+def source_table(query: str) -> str:
+    """Best-effort name of the first table a query reads from, for metric labels"""
+    match = _FROM_TABLE.search(query)
+    return match.group(1) if match else 'none'
+
+_PLACEHOLDER = re.compile(r'%s')
+
+def to_positional(query: str) -> str:
+    """Rewrite psycopg2 %s placeholders as PREPARE's $1, $2, ..."""
+    counter = iter(range(1, 1000))
+    return _PLACEHOLDER.sub(lambda _: f"${next(counter)}", query)
+
+class PooledConnection(psycopg2.extensions.connection):
+    """psycopg2 connection carrying the pool's bookkeeping and its prepared statements"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.created_at = time.monotonic()
+        self.last_used = self.created_at
+        # query text -> prepared statement name, for this session
+        self.prepared: Dict[str, str] = {}
+
+class ConnectionPool:
+    """
+    Thread-safe psycopg2 pool. getconn() waits up to `timeout` seconds for a connection
+    instead of failing when all `maxconn` are in use. A connection idle for more than
+    `check_idle` seconds is checked with a round trip before it is handed out. Connections
+    older than `recycle` seconds, or left broken or mid-transaction, are closed and replaced.
+    """
+
+    def __init__(self, minconn: int, maxconn: int, timeout: float, recycle: float, check_idle: float, **connect_kwargs):
+        self.maxconn = maxconn
+        self.timeout = timeout
+        self.recycle = recycle
+        self.check_idle = check_idle
+        self._connect_kwargs = connect_kwargs
+        self._idle: List[PooledConnection] = []
+        # Open connections, idle or checked out
+        self._size = 0
+        self._cond = threading.Condition()
+        for _ in range(minconn):
+            self._idle.append(self._connect())
+            self._size += 1
+
+    def _connect(self) -> PooledConnection:
+        return psycopg2.connect(connection_factory=PooledConnection, **self._connect_kwargs)
+
+    def _discard(self, conn: PooledConnection, reason: str):
+        db_pool_discarded_total.labels(reason).inc()
+        try:
+            conn.close()
+        except psycopg2.Error:
+            pass
+
+    def _usable(self, conn: PooledConnection) -> bool:
+        now = time.monotonic()
+        if conn.closed:
+            self._discard(conn, 'broken')
+            return False
+        if now - conn.created_at > self.recycle:
+            self._discard(conn, 'recycled')
+            return False
+        if now - conn.last_used > self.check_idle:
+            try:
+                with conn.cursor() as cursor:
+                    cursor.execute("SELECT 1")
+                conn.rollback()
+            except psycopg2.Error:
+                self._discard(conn, 'health_check')
+                return False
+        return True
+
+    def getconn(self) -> PooledConnection:
+        deadline = time.monotonic() + self.timeout
+        with self._cond:
+            while True:
+                if self._idle:
+                    # Most recently used first, so surplus connections go idle and get recycled
+                    conn = self._idle.pop()
+                    break
+                if self._size < self.maxconn:
+                    self._size += 1
+                    conn = None
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise psycopg2.pool.PoolError(f"No database connection free within {self.timeout}s")
+                self._cond.wait(remaining)
+        # Connecting and health checks happen outside the lock; the slot is already ours
+        try:
+            if conn is None or not self._usable(conn):
+                conn = self._connect()
+        except Exception:
+            with self._cond:
+                self._size -= 1
+                self._cond.notify()
+            raise
+        return conn
+
+    def putconn(self, conn: PooledConnection):
+        keep = not conn.closed
+        if keep and conn.info.transaction_status != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+            try:
+                conn.rollback()
+            except psycopg2.Error:
+                keep = False
+        if keep:
+            conn.last_used = time.monotonic()
+            if conn.last_used - conn.created_at > self.recycle:
+                keep = False
+                self._discard(conn, 'recycled')
+        else:
+            self._discard(conn, 'broken')
+        with self._cond:
+            if keep:
+                self._idle.append(conn)
+            else:
+                self._size -= 1
+            self._cond.notify()
+
+    def closeall(self):
+        with self._cond:
+            for conn in self._idle:
+                conn.close()
+            self._size -= len(self._idle)
+            self._idle = []
+
 class DatabaseManager:
     def __init__(self):
         self.connection_pool = None
+        # Hot queries run as prepared statements; off for poolers that do not keep sessions
+        self.prepare_statements = settings.DB_PREPARE_STATEMENTS
         self._init_pool()
     
     def _init_pool(self):
         """Initialize the connection pool"""
+        options = {}
+        if settings.DB_PLAN_CACHE_MODE:
+            options["options"] = f"-c plan_cache_mode={settings.DB_PLAN_CACHE_MODE}"
         try:
-            self.connection_pool = psycopg2.pool.SimpleConnectionPool(
-                minconn=1,
-                maxconn=10,
+            self.connection_pool = ConnectionPool(
+                minconn=settings.DB_POOL_MIN,
+                maxconn=settings.DB_POOL_MAX,
+                timeout=settings.DB_POOL_TIMEOUT,
+                recycle=settings.DB_POOL_RECYCLE_SECONDS,
+                check_idle=settings.DB_POOL_CHECK_IDLE_SECONDS,
                 host=settings.DB_HOST,
                 port=settings.DB_PORT,
                 database=settings.DB_NAME,
                 user=settings.DB_USER,
                 password=settings.DB_PASS,
-                cursor_factory=RealDictCursor
+                cursor_factory=RealDictCursor,
+                **options
             )
             logger.info("Database connection pool initialized successfully")
         except Exception as e:
@@ -36,32 +182,96 @@ class DatabaseManager:
     @contextmanager
     def get_connection(self) -> Generator[psycopg2.extensions.connection, None, None]:
         """Get a database connection from the pool"""
-        conn = None
+        conn = guard = None
         try:
+            start_time = time.perf_counter()
             conn = self.connection_pool.getconn()
+            db_pool_wait_seconds.labels('psycopg2').observe(time.perf_counter() - start_time)
+            guard = current_guard.get()
+            if guard:
+                guard.track(conn)
             yield conn
         except Exception as e:
             logger.error(f"Database connection error: {e}")
-            if conn:
-                conn.rollback()
+            if conn and not conn.closed:
+                try:
+                    conn.rollback()
+                except psycopg2.Error:
+                    # Broken connection; putconn discards it
+                    pass
             raise
         finally:
             if conn:
+                if guard:
+                    guard.untrack(conn)
                 self.connection_pool.putconn(conn)
     
-    def execute_query(self, query: str, params: tuple = None) -> List[Dict[str, Any]]:
-        """Execute a SELECT query and return results"""
+    @staticmethod
+    def apply_statement_timeout(cursor):
+        """Limit the transaction's statements to the admitted request's statement_timeout, if any"""
+        guard = current_guard.get()
+        if guard and guard.timeout_ms:
+            # SET LOCAL ends with the transaction, which the pool rolls back on putconn
+            cursor.execute("SET LOCAL statement_timeout = %s", (guard.timeout_ms,))
+    
+    def execute_prepared(self, conn: PooledConnection, cursor, query: str, params: tuple = None):
+        """
+        Run a query as a prepared statement, PREPAREd the first time this connection sees it,
+        so repeat calls skip parsing and planning. Prepared statements outlive the pool's
+        rollbacks. If the server no longer has them, or a schema change invalidated one, they
+        are dropped and prepared again once.
+        """
+        for attempt in range(2):
+            try:
+                name = conn.prepared.get(query)
+                if name is None:
+                    name = f"stmt_{len(conn.prepared) + 1}"
+                    cursor.execute(f"PREPARE {name} AS {to_positional(query)}")
+                    conn.prepared[query] = name
+                if params:
+                    cursor.execute(f"EXECUTE {name} ({', '.join(['%s'] * len(params))})", params)
+                else:
+                    cursor.execute(f"EXECUTE {name}")
+                return
+            except (psycopg2.errors.InvalidSqlStatementName, psycopg2.errors.FeatureNotSupported):
+                if attempt:
+                    raise
+                conn.rollback()
+                cursor.execute("DEALLOCATE ALL")
+                conn.prepared.clear()
+                self.apply_statement_timeout(cursor)
+
+    def _execute(self, conn, cursor, query: str, params: tuple, prepare: bool):
+        if prepare and self.prepare_statements:
+            self.execute_prepared(conn, cursor, query, params)
+        else:
+            cursor.execute(query, params)
+
+    def execute_query(self, query: str, params: tuple = None, query_name: str = 'unnamed', table: Optional[str] = None, prepare: bool = False) -> List[Dict[str, Any]]:
+        """Execute a SELECT query and return results; `prepare` runs it as a prepared statement"""
+        table = table or source_table(query)
         with self.get_connection() as conn:
             with conn.cursor() as cursor:
-                cursor.execute(query, params)
-                return cursor.fetchall()
+                self.apply_statement_timeout(cursor)
+                start_time = time.perf_counter()
+                self._execute(conn, cursor, query, params, prepare)
+                results = cursor.fetchall()
+                db_query_duration_seconds.labels(query_name, table).observe(time.perf_counter() - start_time)
+                db_query_rows.labels(query_name, table).observe(len(results))
+                return results
     
-    def execute_query_single(self, query: str, params: tuple = None) -> Dict[str, Any]:
-        """Execute a SELECT query and return single result"""
+    def execute_query_single(self, query: str, params: tuple = None, query_name: str = 'unnamed', table: Optional[str] = None, prepare: bool = False) -> Dict[str, Any]:
+        """Execute a SELECT query and return single result; `prepare` runs it as a prepared statement"""
+        table = table or source_table(query)
         with self.get_connection() as conn:
             with conn.cursor() as cursor:
-                cursor.execute(query, params)
-                return cursor.fetchone()
+                self.apply_statement_timeout(cursor)
+                start_time = time.perf_counter()
+                self._execute(conn, cursor, query, params, prepare)
+                result = cursor.fetchone()
+                db_query_duration_seconds.labels(query_name, table).observe(time.perf_counter() - start_time)
+                db_query_rows.labels(query_name, table).observe(1 if result else 0)
+                return result
     
     def create_continuous_aggregates(self):
         """Create continuous aggregates if they don't exist"""
@@ -79,8 +289,13 @@ class DatabaseManager:
                         # Check if the continuous aggregate already exists in TimescaleDB's metadata
                         cursor.execute("SELECT 1 FROM timescaledb_information.continuous_aggregates WHERE view_name = %s", (view_name,))
                         if cursor.fetchone():
-                            logger.info(f"Continuous aggregate '{view_name}' already exists.")
-                            continue
+                            # Aggregates from before the metrics dictionary group by metric_name
+                            cursor.execute("SELECT 1 FROM information_schema.columns WHERE table_name = %s AND column_name = 'metric_id'", (view_name,))
+                            if cursor.fetchone():
+                                logger.info(f"Continuous aggregate '{view_name}' already exists.")
+                                continue
+                            logger.info(f"Dropping continuous aggregate '{view_name}' keyed by metric_name")
+                            cursor.execute(f"DROP MATERIALIZED VIEW {view_name} CASCADE")
                         
                         logger.info(f"Creating continuous aggregate: {view_name}")
                         query = f"""
@@ -88,24 +303,109 @@ class DatabaseManager:
                             WITH (timescaledb.continuous) AS
                             SELECT
                                 user_id,
-                                metric_name,
+                                metric_id,
                                 time_bucket('{bucket_size}', timestamp) AS bucket,
                                 AVG(value) AS avg_value,
                                 MIN(value) AS min_value,
                                 MAX(value) AS max_value,
                                 COUNT(*) as data_points
                             FROM raw_data
-                            GROUP BY user_id, metric_name, bucket;
+                            GROUP BY user_id, metric_id, bucket;
                         """
                         try:
                             cursor.execute(query)
                             logger.info(f"Successfully submitted creation for continuous aggregate '{view_name}'.")
                         except Exception as e:
                             logger.error(f"Failed to create continuous aggregate '{view_name}': {e}")
+                    self.create_aggregate_indexes(cursor, aggregates.keys())
+                    self.create_compatibility_views(cursor, aggregates.keys())
+                    self.create_cohort_rollup(cursor)
             finally:
                 # Restore default autocommit behavior
                 conn.autocommit = False
 
+    def create_aggregate_indexes(self, cursor, view_names):
+        """Create the (user_id, metric_id, bucket DESC) index on each continuous aggregate"""
+        for view_name in view_names:
+            try:
+                cursor.execute(f"""
+                    CREATE INDEX IF NOT EXISTS ix_{view_name}_user_metric_bucket
+                    ON {view_name} (user_id, metric_id, bucket DESC)
+                """)
+            except Exception as e:
+                logger.error(f"Failed to create index on continuous aggregate '{view_name}': {e}")
+
+    def create_compatibility_views(self, cursor, view_names):
+        """
+        Create *_named views exposing metric_name alongside metric_id, so ad-hoc SQL and
+        dashboards written against the string-keyed tables keep working
+        """
+        views = {'raw_data_named': 'raw_data'}
+        views.update({f"{view_name}_named": view_name for view_name in view_names})
+        for named_view, source in views.items():
+            try:
+                cursor.execute(f"""
+                    CREATE OR REPLACE VIEW {named_view} AS
+                    SELECT s.*, m.name AS metric_name
+                    FROM {source} s
+                    JOIN metrics m ON m.id = s.metric_id
+                """)
+            except Exception as e:
+                logger.error(f"Failed to create compatibility view '{named_view}': {e}")
+
+    def create_cohort_rollup(self, cursor):
+        """
+        Create cohort_1d: per metric and day, the distribution of the participants' daily
+        means from data_1d. Percentiles cannot live in a continuous aggregate, so this is a
+        plain table that ingestion refreshes for the days each run touches.
+        """
+        try:
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS cohort_1d (
+                    metric_id SMALLINT NOT NULL,
+                    bucket TIMESTAMPTZ NOT NULL,
+                    participants INTEGER NOT NULL,
+                    mean_value DOUBLE PRECISION,
+                    stddev_value DOUBLE PRECISION,
+                    min_value DOUBLE PRECISION,
+                    p25_value DOUBLE PRECISION,
+                    median_value DOUBLE PRECISION,
+                    p75_value DOUBLE PRECISION,
+                    max_value DOUBLE PRECISION,
+                    data_points BIGINT,
+                    refreshed_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+                    PRIMARY KEY (metric_id, bucket)
+                )
+            """)
+        except Exception as e:
+            logger.error(f"Failed to create cohort rollup: {e}")
+
+    def refresh_cohort_rollup(self, start: Optional[datetime] = None, end: Optional[datetime] = None) -> int:
+        """Recompute cohort_1d from data_1d for buckets in [start, end), or all of it; returns buckets written"""
+        with self.get_connection() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute("""
+                    INSERT INTO cohort_1d (metric_id, bucket, participants, mean_value, stddev_value, min_value,
+                        p25_value, median_value, p75_value, max_value, data_points, refreshed_at)
+                    SELECT metric_id, bucket, count(*), avg(avg_value), stddev(avg_value), min(avg_value),
+                           percentile_cont(0.25) WITHIN GROUP (ORDER BY avg_value),
+                           percentile_cont(0.5) WITHIN GROUP (ORDER BY avg_value),
+                           percentile_cont(0.75) WITHIN GROUP (ORDER BY avg_value),
+                           max(avg_value), sum(data_points), NOW()
+                    FROM data_1d
+                    WHERE (%(start)s::timestamptz IS NULL OR bucket >= %(start)s)
+                      AND (%(end)s::timestamptz IS NULL OR bucket < %(end)s)
+                    GROUP BY metric_id, bucket
+                    ON CONFLICT (metric_id, bucket) DO UPDATE SET
+                        participants = EXCLUDED.participants, mean_value = EXCLUDED.mean_value,
+                        stddev_value = EXCLUDED.stddev_value, min_value = EXCLUDED.min_value,
+                        p25_value = EXCLUDED.p25_value, median_value = EXCLUDED.median_value,
+                        p75_value = EXCLUDED.p75_value, max_value = EXCLUDED.max_value,
+                        data_points = EXCLUDED.data_points, refreshed_at = EXCLUDED.refreshed_at
+                """, {'start': start, 'end': end})
+                written = cursor.rowcount
+            conn.commit()
+        return written
 
     def health_check(self) -> bool:
         """Check if database connection is healthy"""
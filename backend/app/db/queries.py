@@ -1,6 +1,7 @@
 from typing import List, Dict, Any, Optional
 from datetime import datetime, timedelta
 from app.db.database import db_manager
+from app.db.catalog import get_metric_id, get_metric_names
 import logging
 
 logger = logging.getLogger(__name__)
@@ -41,34 +42,40 @@ def get_metrics_data(
             SELECT 
                 timestamp AS ts,
                 value AS avg_value,
-                metric_name,
+                metric_id,
                 user_id
             FROM raw_data 
             WHERE user_id = %s 
-            AND metric_name = %s 
+            AND metric_id = %s 
             AND timestamp BETWEEN %s AND %s
             ORDER BY timestamp ASC
         """
-        params = (user_id, metric, start_date, end_date)
     else:
         query = f"""
             SELECT 
                 bucket AS ts,
                 avg_value,
-                metric_name,
+                metric_id,
                 user_id,
                 min_value,
                 max_value,
                 data_points
             FROM {table}
             WHERE user_id = %s 
-            AND metric_name = %s 
+            AND metric_id = %s 
             AND bucket BETWEEN %s AND %s
             ORDER BY bucket ASC
         """
-        params = (user_id, metric, start_date, end_date)
     try:
-        results = db_manager.execute_query(query, params)
+        metric_id = get_metric_id(metric)
+        if metric_id is None:
+            logger.info(f"Unknown metric {metric}")
+            return []
+        params = (user_id, metric_id, start_date, end_date)
+        # One prepared statement per source table and connection
+        results = db_manager.execute_query(query, params, query_name='get_metrics_data', table=table, prepare=True)
+        for row in results:
+            row['metric_name'] = metric
         logger.info(f"Retrieved {len(results)} records for metric {metric} from {table}")
         return results
     except Exception as e:
@@ -79,15 +86,9 @@ def get_available_metrics() -> List[str]:
     """
     Get list of available metrics in the database
     """
-    query = """
-        SELECT DISTINCT metric_name 
-        FROM raw_data 
-        ORDER BY metric_name
-    """
-    
     try:
-        results = db_manager.execute_query(query)
-        metrics = [row['metric_name'] for row in results]
+        # Read from the metrics dictionary instead of a DISTINCT over raw_data
+        metrics = get_metric_names()
         logger.info(f"Found {len(metrics)} available metrics")
         return metrics
     except Exception as e:
@@ -105,7 +106,7 @@ def get_available_users() -> List[int]:
     """
     
     try:
-        results = db_manager.execute_query(query)
+        results = db_manager.execute_query(query, query_name='get_available_users', table='raw_data')
         users = [row['user_id'] for row in results]
         logger.info(f"Found {len(users)} available users")
         return users
@@ -131,14 +132,16 @@ def get_metric_summary(
             STDDEV(value) as std_dev
         FROM raw_data 
         WHERE user_id = %s 
-        AND metric_name = %s 
+        AND metric_id = %s 
         AND timestamp BETWEEN %s AND %s
     """
     
     try:
         result = db_manager.execute_query_single(
             query, 
-            (user_id, metric, start_date, end_date)
+            (user_id, get_metric_id(metric), start_date, end_date),
+            query_name='get_metric_summary',
+            table='raw_data'
         )
         return result
     except Exception as e:
@@ -152,8 +155,68 @@ def get_data_count() -> int:
     query = "SELECT COUNT(*) as count FROM raw_data"
     
     try:
-        result = db_manager.execute_query_single(query)
+        result = db_manager.execute_query_single(query, query_name='get_data_count', table='raw_data')
         return result['count'] if result else 0
     except Exception as e:
         logger.error(f"Error retrieving data count: {e}")
-        raise 
\ No newline at end of file
+        raise 
+# Distribution of the participants' per-bucket means, computed over a continuous aggregate
+COHORT_STATS = """
+    count(*) AS participants,
+    avg(avg_value) AS mean_value,
+    stddev(avg_value) AS stddev_value,
+    min(avg_value) AS min_value,
+    percentile_cont(0.25) WITHIN GROUP (ORDER BY avg_value) AS p25_value,
+    percentile_cont(0.5) WITHIN GROUP (ORDER BY avg_value) AS median_value,
+    percentile_cont(0.75) WITHIN GROUP (ORDER BY avg_value) AS p75_value,
+    max(avg_value) AS max_value,
+    sum(data_points) AS data_points
+"""
+
+def get_cohort_metrics(
+    metric: str,
+    start_date: datetime,
+    end_date: datetime,
+    granularity: str = 'day',
+    user_ids: Optional[List[int]] = None
+) -> Dict[str, Any]:
+    """
+    Per-bucket distribution statistics of a metric across participants. Whole-cohort daily
+    requests read the precomputed cohort_1d rollup; hourly or user-filtered requests are
+    aggregated in the database from data_1h/data_1d.
+    """
+    metric_id = get_metric_id(metric)
+    if metric_id is None:
+        logger.info(f"Unknown metric {metric}")
+        return {'source': None, 'buckets': []}
+    if granularity == 'day' and not user_ids:
+        source = 'cohort_1d'
+        query = """
+            SELECT bucket AS ts, participants, mean_value, stddev_value, min_value,
+                   p25_value, median_value, p75_value, max_value, data_points
+            FROM cohort_1d
+            WHERE metric_id = %s
+            AND bucket BETWEEN %s AND %s
+            ORDER BY bucket ASC
+        """
+        params = (metric_id, start_date, end_date)
+    else:
+        source = 'data_1d' if granularity == 'day' else 'data_1h'
+        user_filter = "AND user_id = ANY(%s)" if user_ids else ""
+        query = f"""
+            SELECT bucket AS ts, {COHORT_STATS}
+            FROM {source}
+            WHERE metric_id = %s
+            AND bucket BETWEEN %s AND %s
+            {user_filter}
+            GROUP BY bucket
+            ORDER BY bucket ASC
+        """
+        params = (metric_id, start_date, end_date) + ((list(user_ids),) if user_ids else ())
+    try:
+        results = db_manager.execute_query(query, params, query_name='get_cohort_metrics', table=source)
+        logger.info(f"Retrieved {len(results)} cohort buckets for metric {metric} from {source}")
+        return {'source': source, 'buckets': results}
+    except Exception as e:
+        logger.error(f"Error retrieving cohort metrics: {e}")
+        raise
@@ -0,0 +1,67 @@
+import time
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import QueuePool
+from app.core.admission import current_guard
+from app.core.config import settings
+from app.core.metrics import db_query_duration_seconds, db_query_rows, db_pool_wait_seconds
+from app.db.database import source_table
+
+class InstrumentedQueuePool(QueuePool):
+    """QueuePool that records how long each checkout waits for a connection"""
+
+    def _do_get(self):
+        start_time = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            db_pool_wait_seconds.labels('sqlalchemy').observe(time.perf_counter() - start_time)
+
+# One engine for the whole process; creating an engine per request throws away the pool
+engine = create_engine(settings.DATABASE_URL, poolclass=InstrumentedQueuePool)
+SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+@event.listens_for(engine, "before_cursor_execute")
+def _start_query_timer(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('query_start_time', []).append(time.perf_counter())
+
+@event.listens_for(engine, "after_cursor_execute")
+def _record_query(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info['query_start_time'].pop()
+    # ORM queries can name themselves with .execution_options(query_name=...)
+    query_name = context.execution_options.get('query_name', 'orm') if context else 'orm'
+    table = source_table(statement)
+    db_query_duration_seconds.labels(query_name, table).observe(elapsed)
+    if cursor.rowcount is not None and cursor.rowcount >= 0:
+        db_query_rows.labels(query_name, table).observe(cursor.rowcount)
+
+@event.listens_for(engine, "checkout")
+def _track_connection(dbapi_connection, connection_record, connection_proxy):
+    # Checkouts happen in the request's thread, which carries its guard
+    guard = current_guard.get()
+    if guard:
+        guard.track(dbapi_connection)
+        connection_record.info['guard'] = guard
+
+@event.listens_for(engine, "checkin")
+def _untrack_connection(dbapi_connection, connection_record):
+    guard = connection_record.info.pop('guard', None)
+    if guard:
+        guard.untrack(dbapi_connection)
+
+@event.listens_for(SessionLocal, "after_begin")
+def _apply_statement_timeout(session, transaction, connection):
+    guard = current_guard.get()
+    if guard and guard.timeout_ms:
+        connection.exec_driver_sql(
+            f"SET LOCAL statement_timeout = {int(guard.timeout_ms)}",
+            execution_options={"query_name": "statement_timeout"}
+        )
+
+def get_db_session():
+    """FastAPI dependency yielding a session from the shared engine"""
+    db = SessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
@@ -1,11 +1,20 @@
-from fastapi import FastAPI, HTTPException, Query
+from fastapi import FastAPI, HTTPException, Query, Request
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
 from datetime import datetime, timedelta
 from typing import Optional
 import logging
+from psycopg2.errors import QueryCanceled
+from sqlalchemy.exc import DBAPIError
 
 from app.core.config import settings
+from app.core.metrics import api_request_duration_seconds
+from app.core.http_cache import conditional_response, compress_response
+from app.core.admission import admitted, query_canceled_response
+from app.core.profiling import SamplingProfiler, profile_store
+from app.core.mail import smtp_pool
 from app.db.database import db_manager
+from app.db.catalog import get_metric_id, freshness_snapshot
 from app.schemas.metrics import (
     MetricResponse, 
     MetricDataPoint, 
@@ -22,7 +31,13 @@ from app.db.queries import (
 from app.api import participants
 from app.api import adherence
 from app.api import imputation
-from prometheus_client import Counter, Histogram, generate_latest, CONTENT_TYPE_LATEST
+from app.api import alerts
+from app.api import cohort
+from app.api import exports
+from app.api import live
+from app.services.live import metric_broker
+from app.api import profiling
+from prometheus_client import generate_latest, CONTENT_TYPE_LATEST
 from fastapi import Response
 import time
 
@@ -44,17 +59,71 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor"],
 )
 
 app.include_router(participants.router, prefix="/api")
 app.include_router(adherence.router, prefix="/api")
 app.include_router(imputation.router, prefix="/api")
+app.include_router(alerts.router, prefix="/api")
+app.include_router(cohort.router, prefix="/api")
+app.include_router(exports.router, prefix="/api")
+app.include_router(live.router, prefix="/api")
 
-# Prometheus metrics
-ingestion_error_count = Counter(
-    'ingestion_error_count', 'Number of ingestion errors encountered by the API')
-ingestion_latency_seconds = Histogram(
-    'ingestion_latency_seconds', 'Latency of ingestion operations in seconds')
+@app.exception_handler(QueryCanceled)
+async def handle_query_canceled(request: Request, exc: QueryCanceled):
+    return query_canceled_response(exc)
+
+@app.exception_handler(DBAPIError)
+async def handle_dbapi_error(request: Request, exc: DBAPIError):
+    # SQLAlchemy wraps the driver's exception; only cancellations get a dedicated response
+    if isinstance(exc.orig, QueryCanceled):
+        return query_canceled_response(exc.orig)
+    raise exc
+
+@app.middleware("http")
+async def compress_responses(request: Request, call_next):
+    """gzip, brotli or zstd for large JSON/text responses, as negotiated by Accept-Encoding"""
+    return await compress_response(request, await call_next(request))
+
+@app.middleware("http")
+async def record_request_metrics(request: Request, call_next):
+    """Record request latency labeled by route template and status"""
+    start_time = time.perf_counter()
+    status_code = 500
+    try:
+        response = await call_next(request)
+        status_code = response.status_code
+        return response
+    finally:
+        # Label by the matched route template, not the raw path, to bound cardinality
+        route = request.scope.get("route")
+        route_template = route.path if route else "unmatched"
+        api_request_duration_seconds.labels(
+            request.method, route_template, str(status_code)
+        ).observe(time.perf_counter() - start_time)
+
+if settings.PROFILING_ENABLED:
+    # Only installed when enabled, so unprofiled deployments pay nothing
+    @app.middleware("http")
+    async def profile_request(request: Request, call_next):
+        """Sample the process for the duration of a request sent with 'X-Profile: 1'"""
+        if request.headers.get("x-profile") != "1":
+            return await call_next(request)
+        profiler = SamplingProfiler(settings.PROFILE_SAMPLE_INTERVAL)
+        start_time = time.perf_counter()
+        profiler.start()
+        try:
+            response = await call_next(request)
+        finally:
+            profiler.stop()
+        profile_id = profile_store.add(
+            f"{request.method} {request.url.path}", profiler.collapsed(), profiler.samples, time.perf_counter() - start_time
+        )
+        response.headers["X-Profile-Id"] = profile_id
+        return response
+
+    app.include_router(profiling.router, prefix="/api")
 
 @app.on_event("startup")
 async def startup_event():
@@ -64,6 +133,15 @@ async def startup_event():
         logger.error("Database connection failed on startup")
         raise Exception("Database connection failed")
     db_manager.create_continuous_aggregates()
+    await metric_broker.start()
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Close the pooled SMTP connections, the live stream listener and idle database connections"""
+    if smtp_pool:
+        await smtp_pool.close()
+    await metric_broker.stop()
+    db_manager.connection_pool.closeall()
 
 @app.get("/", tags=["Root"])
 async def root():
@@ -90,16 +168,17 @@ def metrics():
 
 @app.get("/api/metrics", response_model=MetricResponse, tags=["Metrics"])
 async def get_metrics(
+    request: Request,
+    response: Response,
     start_date: datetime = Query(..., description="Start date (ISO format)"),
     end_date: datetime = Query(..., description="End date (ISO format)"),
     user_id: int = Query(..., description="User ID"),
     metric: str = Query(..., description="Metric name"),
-    granularity: Optional[str] = Query(None, description="Granularity: raw, minute, hour, day")
+    granularity: Optional[str] = Query(None, description="Granularity: raw, minute, hour, day"),
 ):
     """
     Get metric data for a specific user and time range, with optional granularity
     """
-    start_time = time.time()
     try:
         # Validate date range
         if start_date >= end_date:
@@ -108,8 +187,18 @@ async def get_metrics(
                 detail="Start date must be before end date"
             )
         
-        # Get data from database
-        raw_data = get_metrics_data(start_date, end_date, user_id, metric, granularity)
+        # Answered from the freshness snapshot when the client already has this range
+        metric_id = get_metric_id(metric)
+        not_modified = conditional_response(
+            request, response, freshness_snapshot.ingested_at(user_id, metric_id) if metric_id else None
+        )
+        if not_modified:
+            return not_modified
+        
+        # Get data from database; only this part waits for a metrics slot, so 304s never do
+        # In the threadpool, so the event loop can notice a disconnect and cancel the query
+        async with admitted(request, "metrics"):
+            raw_data = await run_in_threadpool(get_metrics_data, start_date, end_date, user_id, metric, granularity)
         
         # Convert to response format
         data_points = []
@@ -130,13 +219,12 @@ async def get_metrics(
             end_date=end_date
         )
         
+    except (HTTPException, QueryCanceled):
+        # A 503 from admission control, or a timeout/disconnect handled by query_canceled_response
+        raise
     except Exception as e:
-        ingestion_error_count.inc()
         logger.error(f"Error in get_metrics: {e}")
         raise HTTPException(status_code=500, detail=str(e))
-    finally:
-        elapsed = time.time() - start_time
-        ingestion_latency_seconds.observe(elapsed)
 
 @app.get("/api/metrics/available", response_model=AvailableMetrics, tags=["Metrics"])
 async def get_available_metrics_and_users():
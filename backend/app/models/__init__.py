@@ -1,11 +1,19 @@
 from .participant import Participant
 from .raw_data import RawData
+from .raw_data_minute import RawDataMinute
+from .metric import Metric
+from .sleep_summary import SleepSummary
+from .data_freshness import DataFreshness
 from .communication_log import CommunicationLog
 from .adherence_history import AdherenceHistory
 
 __all__ = [
     "Participant",
     "RawData", 
+    "RawDataMinute",
+    "Metric",
+    "SleepSummary",
+    "DataFreshness",
     "CommunicationLog",
     "AdherenceHistory"
 ] 
\ No newline at end of file
@@ -0,0 +1,26 @@
+from sqlalchemy import Column, Integer, SmallInteger, DateTime
+from sqlalchemy.orm import DeclarativeBase
+
+class Base(DeclarativeBase):
+    pass
+
+class DataFreshness(Base):
+    """Latest data point per participant and metric, advanced by ingestion at the end of each run"""
+    __tablename__ = "data_freshness"
+    
+    user_id = Column(Integer, primary_key=True)
+    metric_id = Column(SmallInteger, primary_key=True)
+    last_seen_at = Column(DateTime(timezone=True), nullable=False)
+    updated_at = Column(DateTime(timezone=True), nullable=False)
+    
+    def __repr__(self):
+        return f"<DataFreshness(user_id={self.user_id}, metric_id={self.metric_id}, last_seen_at='{self.last_seen_at}')>"
+    
+    def to_dict(self):
+        """Convert freshness row to dictionary"""
+        return {
+            'user_id': self.user_id,
+            'metric_id': self.metric_id,
+            'last_seen_at': self.last_seen_at.isoformat() if self.last_seen_at else None,
+            'updated_at': self.updated_at.isoformat() if self.updated_at else None
+        }
@@ -0,0 +1,21 @@
+from sqlalchemy import Column, SmallInteger, Text
+from sqlalchemy.orm import DeclarativeBase
+
+class Base(DeclarativeBase):
+    pass
+
+class Metric(Base):
+    __tablename__ = "metrics"
+    
+    id = Column(SmallInteger, primary_key=True)
+    name = Column(Text, unique=True, nullable=False)
+    
+    def __repr__(self):
+        return f"<Metric(id={self.id}, name='{self.name}')>"
+    
+    def to_dict(self):
+        """Convert metric to dictionary"""
+        return {
+            'id': self.id,
+            'name': self.name
+        }
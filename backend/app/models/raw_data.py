@@ -1,6 +1,7 @@
-from sqlalchemy import Column, Integer, String, DateTime, Float, Boolean, Text
-from sqlalchemy.orm import DeclarativeBase
+from sqlalchemy import Column, Integer, SmallInteger, String, DateTime, Float, Boolean, Text, Index, select
+from sqlalchemy.orm import DeclarativeBase, column_property
 from sqlalchemy.sql import func
+from .metric import Metric
 
 class Base(DeclarativeBase):
     pass
@@ -9,15 +10,28 @@ class RawData(Base):
     __tablename__ = "raw_data"
     
     id = Column(Integer, primary_key=True, index=True)
-    user_id = Column(Integer, nullable=False, index=True)
-    timestamp = Column(DateTime(timezone=True), nullable=False, index=True)
-    metric_name = Column(String(100), nullable=False, index=True)
+    user_id = Column(Integer, nullable=False)
+    timestamp = Column(DateTime(timezone=True), nullable=False)
+    metric_id = Column(SmallInteger, nullable=False)
     value = Column(Float, nullable=False)
-    is_imputed = Column(Boolean, default=False, index=True)
+    is_imputed = Column(Boolean, default=False)
     imputation_method = Column(String(100))
     imputed_at = Column(DateTime(timezone=True))
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     
+    # Read-only name from the metrics dictionary, loaded only when accessed.
+    # Filter on metric_id (see app.db.catalog) rather than on this column.
+    metric_name = column_property(
+        select(Metric.name).where(Metric.id == metric_id).scalar_subquery(),
+        deferred=True
+    )
+    
+    # All read paths filter on (user_id, metric_id, timestamp range); this composite
+    # index replaces the former single-column indexes on each of those columns.
+    __table_args__ = (
+        Index('ix_raw_data_user_metric_ts', 'user_id', 'metric_id', timestamp.desc()),
+    )
+    
     def __repr__(self):
         return f"<RawData(id={self.id}, user_id={self.user_id}, metric='{self.metric_name}', timestamp='{self.timestamp}', is_imputed={self.is_imputed})>"
     
@@ -27,6 +41,7 @@ class RawData(Base):
             'id': self.id,
             'user_id': self.user_id,
             'timestamp': self.timestamp.isoformat() if self.timestamp else None,
+            'metric_id': self.metric_id,
             'metric_name': self.metric_name,
             'value': self.value,
             'is_imputed': self.is_imputed,
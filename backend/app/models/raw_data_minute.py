@@ -0,0 +1,29 @@
+from sqlalchemy import Column, Integer, DateTime, Float
+from sqlalchemy.orm import DeclarativeBase
+
+class Base(DeclarativeBase):
+    pass
+
+class RawDataMinute(Base):
+    """
+    Wide per-minute layout of the intraday metrics: one row per (user, minute) and
+    one column per metric. Written by ingestion when INGEST_LAYOUT is 'wide' or 'both'.
+    """
+    __tablename__ = "raw_data_minute"
+    
+    user_id = Column(Integer, primary_key=True)
+    timestamp = Column(DateTime(timezone=True), primary_key=True)
+    heart_rate = Column(Float)
+    spo2 = Column(Float)
+    
+    def __repr__(self):
+        return f"<RawDataMinute(user_id={self.user_id}, timestamp='{self.timestamp}')>"
+    
+    def to_dict(self):
+        """Convert the minute row to dictionary"""
+        return {
+            'user_id': self.user_id,
+            'timestamp': self.timestamp.isoformat() if self.timestamp else None,
+            'heart_rate': self.heart_rate,
+            'spo2': self.spo2
+        }
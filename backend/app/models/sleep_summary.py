@@ -0,0 +1,46 @@
+from sqlalchemy import Column, Integer, BigInteger, SmallInteger, Date, DateTime, Boolean
+from sqlalchemy.orm import DeclarativeBase
+
+class Base(DeclarativeBase):
+    pass
+
+class SleepSummary(Base):
+    """One row per participant and night, written by ingestion from the Fitbit sleep logs"""
+    __tablename__ = "sleep_summary"
+    
+    user_id = Column(Integer, primary_key=True)
+    date_of_sleep = Column(Date, primary_key=True)
+    log_id = Column(BigInteger)
+    is_main_sleep = Column(Boolean, default=True)
+    start_time = Column(DateTime(timezone=True), nullable=False)
+    end_time = Column(DateTime(timezone=True), nullable=False)
+    minutes_in_bed = Column(Integer)
+    minutes_asleep = Column(Integer)
+    minutes_awake = Column(Integer)
+    minutes_deep = Column(Integer)
+    minutes_light = Column(Integer)
+    minutes_rem = Column(Integer)
+    minutes_wake = Column(Integer)
+    efficiency = Column(SmallInteger)
+    
+    def __repr__(self):
+        return f"<SleepSummary(user_id={self.user_id}, date_of_sleep='{self.date_of_sleep}', minutes_asleep={self.minutes_asleep})>"
+    
+    def to_dict(self):
+        """Convert sleep summary to dictionary"""
+        return {
+            'user_id': self.user_id,
+            'date_of_sleep': self.date_of_sleep.isoformat() if self.date_of_sleep else None,
+            'log_id': self.log_id,
+            'is_main_sleep': self.is_main_sleep,
+            'start_time': self.start_time.isoformat() if self.start_time else None,
+            'end_time': self.end_time.isoformat() if self.end_time else None,
+            'minutes_in_bed': self.minutes_in_bed,
+            'minutes_asleep': self.minutes_asleep,
+            'minutes_awake': self.minutes_awake,
+            'minutes_deep': self.minutes_deep,
+            'minutes_light': self.minutes_light,
+            'minutes_rem': self.minutes_rem,
+            'minutes_wake': self.minutes_wake,
+            'efficiency': self.efficiency
+        }
@@ -1,69 +1,102 @@
 from datetime import datetime, timedelta, date
 from sqlalchemy.orm import Session
 from app.models.raw_data import RawData
+from app.models.raw_data_minute import RawDataMinute
 from app.models.participant import Participant
 from app.models.adherence_history import AdherenceHistory
+from app.models.sleep_summary import SleepSummary
+from app.models.data_freshness import DataFreshness
+from app.core.config import settings
+from app.db.catalog import get_metric_id
+
+# Window for recent_upload
+RECENT_UPLOAD_HOURS = 48
 
 # --- Wear time calculation ---
+def count_wear_minutes(db: Session, user_id: int, day: date, query_name: str = 'wear_time') -> int:
+    """
+    Minutes with heart rate data on `day`: heart_rate points in raw_data, or, when
+    INGEST_LAYOUT is 'wide' and heart_rate only reaches it, rows of raw_data_minute.
+    """
+    day_start = datetime.combine(day, datetime.min.time())
+    day_end = datetime.combine(day + timedelta(days=1), datetime.min.time())
+    if settings.INGEST_LAYOUT == 'wide':
+        return db.query(RawDataMinute).execution_options(query_name=query_name).filter(
+            RawDataMinute.user_id == user_id,
+            RawDataMinute.heart_rate.isnot(None),
+            RawDataMinute.timestamp >= day_start,
+            RawDataMinute.timestamp < day_end
+        ).count()
+    return db.query(RawData).execution_options(query_name=query_name).filter(
+        RawData.user_id == user_id,
+        RawData.metric_id == get_metric_id('heart_rate'),
+        RawData.timestamp >= day_start,
+        RawData.timestamp < day_end
+    ).count()
+
 def calculate_wear_time(db: Session, user_id: int, start_date: date, end_date: date) -> float:
     """
     Calculate the percentage of time with heart rate data (proxy for device worn).
     Returns percentage (0-100).
     """
-    # Get all heart rate data points for the user in the range
     total_minutes = 0
     worn_minutes = 0
     current = start_date
     while current <= end_date:
         # Assume 24*60 minutes per day
         total_minutes += 1440
-        # Count heart_rate data points for this day
-        count = db.query(RawData).filter(
-            RawData.user_id == user_id,
-            RawData.metric_name == 'heart_rate',
-            RawData.timestamp >= datetime.combine(current, datetime.min.time()),
-            RawData.timestamp < datetime.combine(current + timedelta(days=1), datetime.min.time())
-        ).count()
-        worn_minutes += count
+        worn_minutes += count_wear_minutes(db, user_id, current)
         current += timedelta(days=1)
     if total_minutes == 0:
         return 0.0
     return round(100.0 * worn_minutes / total_minutes, 2)
 
 # --- Sleep compliance calculation ---
+def get_sleep_nights(db: Session, user_id: int, start_date: date, end_date: date, threshold: int = 7, query_name: str = 'sleep_nights') -> set:
+    """
+    Dates in the range whose nightly sleep summary tracked at least `threshold` hours in bed.
+    """
+    rows = db.query(SleepSummary.date_of_sleep).execution_options(query_name=query_name).filter(
+        SleepSummary.user_id == user_id,
+        SleepSummary.date_of_sleep >= start_date,
+        SleepSummary.date_of_sleep <= end_date,
+        SleepSummary.minutes_in_bed >= threshold * 60
+    ).all()
+    return {row.date_of_sleep for row in rows}
+
 def calculate_sleep_compliance(db: Session, user_id: int, start_date: date, end_date: date, threshold: int = 7) -> float:
     """
-    Calculate the percentage of days with sleep data present.
+    Calculate the percentage of days with a tracked night of at least `threshold` hours.
     Returns percentage (0-100).
     """
     total_days = (end_date - start_date).days + 1
-    days_with_sleep = 0
-    current = start_date
-    while current <= end_date:
-        count = db.query(RawData).filter(
-            RawData.user_id == user_id,
-            RawData.metric_name.like('sleep%'),
-            RawData.timestamp >= datetime.combine(current, datetime.min.time()),
-            RawData.timestamp < datetime.combine(current + timedelta(days=1), datetime.min.time())
-        ).count()
-        if count >= threshold:
-            days_with_sleep += 1
-        current += timedelta(days=1)
+    days_with_sleep = len(get_sleep_nights(db, user_id, start_date, end_date, threshold, query_name='sleep_compliance'))
     if total_days == 0:
         return 0.0
     return round(100.0 * days_with_sleep / total_days, 2)
 
 # --- Recent upload check ---
-def has_recent_upload(db: Session, user_id: int, hours: int = 48) -> bool:
+def has_recent_upload(db: Session, user_id: int, hours: int = RECENT_UPLOAD_HOURS) -> bool:
     """
     Check if the user has uploaded any data in the last N hours.
+    Reads the per-metric last-seen times ingestion keeps in data_freshness.
     """
     since = datetime.utcnow() - timedelta(hours=hours)
-    count = db.query(RawData).filter(
-        RawData.user_id == user_id,
-        RawData.timestamp >= since
-    ).count()
-    return count > 0
+    row = db.query(DataFreshness.user_id).execution_options(query_name='recent_upload').filter(
+        DataFreshness.user_id == user_id,
+        DataFreshness.last_seen_at >= since
+    ).first()
+    return row is not None
+
+def get_recent_uploaders(db: Session, hours: int = RECENT_UPLOAD_HOURS) -> set:
+    """
+    Ids of all users with data in the last N hours, in one read for the whole cohort.
+    """
+    since = datetime.utcnow() - timedelta(hours=hours)
+    rows = db.query(DataFreshness.user_id).execution_options(query_name='recent_uploaders').filter(
+        DataFreshness.last_seen_at >= since
+    ).distinct().all()
+    return {row.user_id for row in rows}
 
 # --- Overall adherence calculation ---
 def calculate_overall_adherence(db: Session, user_id: int, start_date: date, end_date: date, wear_threshold: float = 70.0, sleep_threshold: int = 7) -> float:
@@ -71,24 +104,13 @@ def calculate_overall_adherence(db: Session, user_id: int, start_date: date, end
     Calculate overall adherence as % of days meeting both wear and sleep thresholds.
     """
     total_days = (end_date - start_date).days + 1
+    sleep_nights = get_sleep_nights(db, user_id, start_date, end_date, sleep_threshold, query_name='overall_adherence_sleep')
     adherent_days = 0
     current = start_date
     while current <= end_date:
         # Wear time for this day
-        wear_count = db.query(RawData).filter(
-            RawData.user_id == user_id,
-            RawData.metric_name == 'heart_rate',
-            RawData.timestamp >= datetime.combine(current, datetime.min.time()),
-            RawData.timestamp < datetime.combine(current + timedelta(days=1), datetime.min.time())
-        ).count()
-        # Sleep data for this day
-        sleep_count = db.query(RawData).filter(
-            RawData.user_id == user_id,
-            RawData.metric_name.like('sleep%'),
-            RawData.timestamp >= datetime.combine(current, datetime.min.time()),
-            RawData.timestamp < datetime.combine(current + timedelta(days=1), datetime.min.time())
-        ).count()
-        if wear_count >= (1440 * wear_threshold / 100.0) and sleep_count >= sleep_threshold:
+        wear_count = count_wear_minutes(db, user_id, current, query_name='overall_adherence_wear')
+        if wear_count >= (1440 * wear_threshold / 100.0) and current in sleep_nights:
             adherent_days += 1
         current += timedelta(days=1)
     if total_days == 0:
@@ -0,0 +1,222 @@
+import gzip
+import os
+import shutil
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+import psycopg2
+import pyarrow as pa
+import pyarrow.parquet as pq
+from app.core.config import settings
+from app.db.catalog import get_metric_id
+
+# Columns exported per granularity: raw points, or the continuous aggregate's buckets
+EXPORT_SOURCES = {
+    'raw': ('raw_data', ['user_id', 'timestamp', 'value', 'is_imputed']),
+    'minute': ('data_1m', ['user_id', 'bucket', 'avg_value', 'min_value', 'max_value', 'data_points']),
+    'hour': ('data_1h', ['user_id', 'bucket', 'avg_value', 'min_value', 'max_value', 'data_points']),
+    'day': ('data_1d', ['user_id', 'bucket', 'avg_value', 'min_value', 'max_value', 'data_points']),
+}
+EXPORT_FORMATS = ('csv', 'parquet')
+
+# Parquet column types, fixed up front: inferring them per batch fails on an all-null batch
+# or a batch whose values happen to be whole numbers
+BUCKET_SCHEMA = pa.schema([
+    ('user_id', pa.int32()), ('bucket', pa.timestamp('us', tz='UTC')), ('avg_value', pa.float64()),
+    ('min_value', pa.float64()), ('max_value', pa.float64()), ('data_points', pa.int64()),
+])
+EXPORT_SCHEMAS = {
+    'raw': pa.schema([
+        ('user_id', pa.int32()), ('timestamp', pa.timestamp('us', tz='UTC')),
+        ('value', pa.float64()), ('is_imputed', pa.bool_()),
+    ]),
+    'minute': BUCKET_SCHEMA,
+    'hour': BUCKET_SCHEMA,
+    'day': BUCKET_SCHEMA,
+}
+
+class ExportStore:
+    """
+    Export jobs and their files under `directory`. Keeps the most recent `retention`
+    jobs and deletes the files of older ones; a queued or running job is never deleted,
+    so the store can briefly hold more while they finish.
+    """
+
+    def __init__(self, directory: str, retention: int = 20):
+        self.directory = directory
+        self.retention = retention
+        self._jobs = OrderedDict()
+        self._lock = threading.Lock()
+
+    def create(self, request: Dict[str, Any]) -> Dict[str, Any]:
+        job_id = uuid.uuid4().hex[:12]
+        job = {
+            "id": job_id,
+            "status": "queued",
+            "created_at": datetime.now().isoformat(),
+            "finished_at": None,
+            "request": request,
+            "rows": 0,
+            "files": [],
+            "error": None,
+        }
+        with self._lock:
+            self._jobs[job_id] = job
+            self._sweep()
+        return job
+
+    def _sweep(self):
+        """Delete the oldest finished or failed jobs beyond `retention`; call with the lock held"""
+        excess = len(self._jobs) - self.retention
+        for old_id, old_job in list(self._jobs.items()):
+            if excess <= 0:
+                break
+            if old_job["status"] in ("queued", "running"):
+                continue
+            del self._jobs[old_id]
+            shutil.rmtree(self.job_dir(old_id), ignore_errors=True)
+            excess -= 1
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return dict(job, files=list(job["files"])) if job else None
+
+    def list(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            return [dict(job, files=len(job["files"])) for job in reversed(self._jobs.values())]
+
+    def update(self, job_id: str, **fields):
+        with self._lock:
+            if job_id in self._jobs:
+                self._jobs[job_id].update(fields)
+                # Jobs kept past retention while they ran can go once they finish
+                self._sweep()
+
+    def add_file(self, job_id: str, path: str, rows: int):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job:
+                job["files"].append({"path": path, "rows": rows, "bytes": os.path.getsize(os.path.join(self.job_dir(job_id), path))})
+                job["rows"] += rows
+
+    def job_dir(self, job_id: str) -> str:
+        return os.path.join(self.directory, job_id)
+
+    def file_path(self, job_id: str, path: str) -> Optional[str]:
+        """Absolute path of one of a job's files, or None if it is not one of them"""
+        job = self.get(job_id)
+        if not job or path not in {f["path"] for f in job["files"]}:
+            return None
+        return os.path.join(self.job_dir(job_id), path)
+
+export_store = ExportStore(settings.EXPORT_DIR, settings.EXPORT_RETENTION)
+
+def export_connection():
+    """A dedicated connection, so a long export never holds one of the API pool's"""
+    return psycopg2.connect(
+        host=settings.DB_HOST, port=settings.DB_PORT, database=settings.DB_NAME,
+        user=settings.DB_USER, password=settings.DB_PASS
+    )
+
+def partition_users(user_ids: Optional[List[int]], size: int) -> List[Optional[List[int]]]:
+    """Split the user set into partitions of `size`; [None] exports every user in one partition"""
+    if not user_ids:
+        return [None]
+    user_ids = sorted(set(user_ids))
+    return [user_ids[i:i + size] for i in range(0, len(user_ids), size)]
+
+def export_query(table: str, columns: List[str], users: Optional[List[int]]) -> str:
+    time_column = columns[1]
+    user_filter = "AND user_id = ANY(%(users)s)" if users else ""
+    return f"""
+        SELECT {", ".join(columns)} FROM {table}
+        WHERE metric_id = %(metric_id)s
+        AND {time_column} >= %(start)s AND {time_column} < %(end)s
+        {user_filter}
+        ORDER BY user_id, {time_column}
+    """
+
+class LineCountingWriter:
+    """File wrapper counting the lines written through it; exported values never contain newlines"""
+
+    def __init__(self, file):
+        self.file = file
+        self.lines = 0
+
+    def write(self, data):
+        self.lines += data.count(b'\n')
+        return self.file.write(data)
+
+def write_csv_part(conn, query: str, params: Dict[str, Any], path: str) -> int:
+    """COPY the query's result straight into a gzip file, chunk by chunk; returns rows written"""
+    with conn.cursor() as cursor:
+        sql = cursor.mogrify(query, params).decode()
+        with gzip.open(path, 'wb', compresslevel=6) as file:
+            writer = LineCountingWriter(file)
+            cursor.copy_expert(f"COPY ({sql}) TO STDOUT WITH (FORMAT csv, HEADER true)", writer)
+    # Minus the header line
+    return max(writer.lines - 1, 0)
+
+def write_parquet_part(conn, query: str, params: Dict[str, Any], path: str, schema: pa.Schema) -> int:
+    """Stream the query through a server-side cursor into a zstd Parquet file, one row group per batch"""
+    rows = 0
+    writer = None
+    with conn.cursor(name=f"export_{uuid.uuid4().hex[:8]}") as cursor:
+        cursor.itersize = settings.EXPORT_BATCH_ROWS
+        cursor.execute(query, params)
+        try:
+            while True:
+                batch = cursor.fetchmany(settings.EXPORT_BATCH_ROWS)
+                if not batch:
+                    break
+                table = pa.Table.from_pydict({name: [row[i] for row in batch] for i, name in enumerate(schema.names)}, schema=schema)
+                if writer is None:
+                    writer = pq.ParquetWriter(path, schema, compression='zstd')
+                writer.write_table(table)
+                rows += len(batch)
+        finally:
+            if writer is not None:
+                writer.close()
+    return rows
+
+def run_export(job_id: str):
+    """Background job: write one file per metric and user partition, recording progress on the job"""
+    job = export_store.get(job_id)
+    request = job["request"]
+    table, columns = EXPORT_SOURCES[request["granularity"]]
+    extension = 'csv.gz' if request["format"] == 'csv' else 'parquet'
+    export_store.update(job_id, status="running")
+    start_time = time.perf_counter()
+    conn = None
+    try:
+        conn = export_connection()
+        for metric in request["metrics"]:
+            metric_id = get_metric_id(metric)
+            if metric_id is None:
+                continue
+            os.makedirs(os.path.join(export_store.job_dir(job_id), metric), exist_ok=True)
+            for part, users in enumerate(partition_users(request["user_ids"], settings.EXPORT_USERS_PER_PART)):
+                path = f"{metric}/part-{part:05d}.{extension}"
+                full_path = os.path.join(export_store.job_dir(job_id), path)
+                params = {"metric_id": metric_id, "start": request["start_date"], "end": request["end_date"], "users": users}
+                query = export_query(table, columns, users)
+                if request["format"] == 'csv':
+                    rows = write_csv_part(conn, query, params, full_path)
+                else:
+                    rows = write_parquet_part(conn, query, params, full_path, EXPORT_SCHEMAS[request["granularity"]])
+                conn.commit()
+                if rows:
+                    export_store.add_file(job_id, path, rows)
+                elif os.path.exists(full_path):
+                    os.remove(full_path)
+        export_store.update(job_id, status="finished", finished_at=datetime.now().isoformat(),
+                            duration_seconds=round(time.perf_counter() - start_time, 2))
+    except Exception as e:
+        export_store.update(job_id, status="failed", error=str(e), finished_at=datetime.now().isoformat())
+    finally:
+        if conn is not None:
+            conn.close()
@@ -1,5 +1,10 @@
+from sqlalchemy import func
+from sqlalchemy.dialects.postgresql import insert
 from sqlalchemy.orm import Session
 from app.models.raw_data import RawData
+from app.models.data_freshness import DataFreshness
+from app.db.catalog import get_metric_id, freshness_snapshot
+from app.services.live import notify_appended
 from datetime import datetime, timedelta
 import pandas as pd
 from typing import List
@@ -9,10 +14,15 @@ def impute_linear_interpolation(db: Session, user_id: int, metric_name: str, sta
     Performs linear interpolation for missing data points for a given user and metric.
     'frequency' determines the expected interval between data points (e.g., '1T' for 1 minute).
     """
+    metric_id = get_metric_id(metric_name)
+    if metric_id is None:
+        # Unknown metric, nothing to interpolate from
+        return 0
+
     # Fetch existing data
-    query = db.query(RawData).filter(
+    query = db.query(RawData).execution_options(query_name='imputation_source').filter(
         RawData.user_id == user_id,
-        RawData.metric_name == metric_name,
+        RawData.metric_id == metric_id,
         RawData.timestamp >= start_date,
         RawData.timestamp <= end_date
     ).order_by(RawData.timestamp)
@@ -45,7 +55,7 @@ def impute_linear_interpolation(db: Session, user_id: int, metric_name: str, sta
         new_data = RawData(
             user_id=user_id,
             timestamp=timestamp.to_pydatetime(),
-            metric_name=metric_name,
+            metric_id=metric_id,
             value=row['value'],
             is_imputed=True,
             imputation_method='linear_interpolation',
@@ -56,6 +66,21 @@ def impute_linear_interpolation(db: Session, user_id: int, metric_name: str, sta
         
     if new_data_points:
         db.add_all(new_data_points)
-        db.commit()
+        # Bump updated_at in the same transaction, so ETags built from data_freshness change
+        newest = max(point.timestamp for point in new_data_points)
+        stmt = insert(DataFreshness.__table__).values(user_id=user_id, metric_id=metric_id, last_seen_at=newest)
+        db.execute(stmt.on_conflict_do_update(
+            index_elements=['user_id', 'metric_id'],
+            set_={
+                'last_seen_at': func.greatest(DataFreshness.__table__.c.last_seen_at, stmt.excluded.last_seen_at),
+                'updated_at': func.now(),
+            }
+        ))
+        notify_appended(db, user_id, metric_id, [point.timestamp for point in new_data_points])
+        try:
+            db.commit()
+        finally:
+            # Also after a failed commit, which may still have been applied if the connection dropped after it
+            freshness_snapshot.invalidate()
 
     return imputed_count 
\ No newline at end of file
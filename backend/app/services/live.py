@@ -0,0 +1,214 @@
+import asyncio
+import json
+import logging
+from datetime import datetime, timezone
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+import psycopg2
+import psycopg2.extensions
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+from app.core.config import settings
+from app.core.metrics import api_live_subscribers, api_live_events_total
+from app.db.catalog import get_metric_id
+from app.db.database import db_manager
+from app.models.raw_data_minute import RawDataMinute
+
+logger = logging.getLogger(__name__)
+
+# Points written in the notified ranges, for every subscribed (user, metric) at once.
+# Epochs are UTC, so to_timestamp does not depend on the session time zone
+APPENDED_POINTS = """
+    SELECT r.user_id, r.metric_id, r.timestamp, r.value, r.is_imputed
+    FROM raw_data r
+    JOIN unnest(%s::int[], %s::int[], %s::bigint[], %s::bigint[]) AS k (user_id, metric_id, first_epoch, last_epoch)
+      ON r.user_id = k.user_id AND r.metric_id = k.metric_id
+     AND r.timestamp BETWEEN to_timestamp(k.first_epoch) AND to_timestamp(k.last_epoch)
+    ORDER BY r.user_id, r.metric_id, r.timestamp
+"""
+
+# In the wide layout ingestion writes these metrics to raw_data_minute instead; one query per
+# column, for the pairs of that metric. Imputed points still go to raw_data
+MINUTE_METRICS = [column.name for column in RawDataMinute.__table__.c if column.name not in ('user_id', 'timestamp')]
+APPENDED_MINUTE_POINTS = """
+    SELECT m.user_id, k.metric_id, m.timestamp, m.{column} AS value, false AS is_imputed
+    FROM raw_data_minute m
+    JOIN unnest(%s::int[], %s::int[], %s::bigint[], %s::bigint[]) AS k (user_id, metric_id, first_epoch, last_epoch)
+      ON m.user_id = k.user_id
+     AND m.timestamp BETWEEN to_timestamp(k.first_epoch) AND to_timestamp(k.last_epoch)
+    WHERE m.{column} IS NOT NULL
+    ORDER BY m.user_id, m.timestamp
+"""
+
+# Seconds between attempts to re-open a dropped LISTEN connection
+RECONNECT_SECONDS = 5
+
+class Subscription:
+    """
+    One client's (user_id, metric_id) pairs and its bounded event queue. If the client
+    falls QUEUE_SIZE events behind, its queue is emptied and replaced by a single
+    'resync' event, so a slow reader never holds up the others or grows without bound.
+    """
+
+    def __init__(self, keys: Set[Tuple[int, int]], queue_size: int):
+        self.keys = keys
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+
+    def offer(self, event: str, data: dict):
+        try:
+            self.queue.put_nowait((event, data))
+            api_live_events_total.labels('sent').inc()
+        except asyncio.QueueFull:
+            dropped = self.queue.qsize() + 1
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait(("resync", {"reason": "client too slow", "dropped": dropped}))
+            api_live_events_total.labels('dropped').inc(dropped)
+
+class MetricBroker:
+    """
+    Fans newly written points out to live subscribers. Ingestion and imputation
+    NOTIFY `channel` in the transaction that writes the points; a dedicated LISTEN
+    connection, read from the event loop, turns each notification into one query for
+    the subscribed pairs and one event per pair.
+    """
+
+    def __init__(self, channel: str, queue_size: int):
+        self.channel = channel
+        self.queue_size = queue_size
+        self._subscriptions: Dict[Tuple[int, int], Set[Subscription]] = {}
+        self._conn = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def subscribe(self, keys: Iterable[Tuple[int, int]]) -> Subscription:
+        subscription = Subscription(set(keys), self.queue_size)
+        for key in subscription.keys:
+            self._subscriptions.setdefault(key, set()).add(subscription)
+        api_live_subscribers.inc()
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        for key in subscription.keys:
+            subscribers = self._subscriptions.get(key)
+            if subscribers is not None:
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self._subscriptions[key]
+        api_live_subscribers.dec()
+
+    def publish(self, user_id: int, metric_id: int, points: List[dict]):
+        for subscription in list(self._subscriptions.get((user_id, metric_id), ())):
+            subscription.offer("points", {"user_id": user_id, "metric_id": metric_id, "points": points})
+
+    async def start(self):
+        """Open the LISTEN connection and read it from the running event loop"""
+        self._loop = asyncio.get_running_loop()
+        try:
+            # Connecting blocks, so it runs in the threadpool; only reading happens on the loop
+            self._conn = await run_in_threadpool(self._listen)
+            self._loop.add_reader(self._conn.fileno(), self._on_readable)
+            logger.info(f"Listening for appended points on '{self.channel}'")
+        except psycopg2.Error as e:
+            logger.error(f"Could not listen on '{self.channel}': {e}")
+            self._close()
+            self._loop.call_later(RECONNECT_SECONDS, lambda: asyncio.ensure_future(self.start()))
+
+    def _listen(self):
+        conn = psycopg2.connect(
+            host=settings.DB_HOST, port=settings.DB_PORT, database=settings.DB_NAME,
+            user=settings.DB_USER, password=settings.DB_PASS
+        )
+        try:
+            conn.set_isolation_level(psycopg2.extensions.ISOLATION_LEVEL_AUTOCOMMIT)
+            with conn.cursor() as cursor:
+                cursor.execute(f"LISTEN {self.channel}")
+        except psycopg2.Error:
+            conn.close()
+            raise
+        return conn
+
+    async def stop(self):
+        self._close()
+        self._loop = None
+
+    def _close(self):
+        if self._conn is not None:
+            try:
+                self._loop.remove_reader(self._conn.fileno())
+            except (ValueError, psycopg2.InterfaceError):
+                pass
+            self._conn.close()
+            self._conn = None
+
+    def _on_readable(self):
+        try:
+            self._conn.poll()
+        except psycopg2.Error as e:
+            logger.error(f"LISTEN connection lost: {e}")
+            self._close()
+            self._loop.call_later(RECONNECT_SECONDS, lambda: asyncio.ensure_future(self.start()))
+            return
+        entries = []
+        while self._conn.notifies:
+            notify = self._conn.notifies.pop(0)
+            try:
+                entries.extend(json.loads(notify.payload))
+            except ValueError:
+                logger.warning(f"Ignoring malformed notification: {notify.payload[:100]}")
+        # Only pairs someone is watching are read back
+        wanted = [entry for entry in entries if (entry[0], entry[1]) in self._subscriptions]
+        if wanted:
+            asyncio.ensure_future(self._fan_out(wanted))
+
+    async def _fan_out(self, entries: List[list]):
+        try:
+            rows = await run_in_threadpool(read_appended, entries)
+        except psycopg2.Error as e:
+            logger.error(f"Could not read appended points: {e}")
+            return
+        points: Dict[Tuple[int, int], List[dict]] = {}
+        for row in rows:
+            points.setdefault((row['user_id'], row['metric_id']), []).append({
+                "timestamp": row['timestamp'].isoformat(),
+                "value": row['value'],
+                "is_imputed": row['is_imputed'],
+            })
+        for (user_id, metric_id), key_points in points.items():
+            self.publish(user_id, metric_id, key_points)
+
+def read_appended(entries: List[list]) -> list:
+    """
+    The points in the notified [user_id, metric_id, first epoch, last epoch] ranges, ordered by
+    user, metric and time: from raw_data, and in the wide layout from raw_data_minute as well
+    """
+    rows = list(db_manager.execute_query(
+        APPENDED_POINTS, tuple(list(column) for column in zip(*entries)),
+        query_name='live_appended', table='raw_data'
+    ))
+    if settings.INGEST_LAYOUT != 'wide':
+        return rows
+    for metric in MINUTE_METRICS:
+        metric_id = get_metric_id(metric)
+        metric_entries = [entry for entry in entries if entry[1] == metric_id]
+        if metric_id is None or not metric_entries:
+            continue
+        rows += db_manager.execute_query(
+            APPENDED_MINUTE_POINTS.format(column=metric), tuple(list(column) for column in zip(*metric_entries)),
+            query_name='live_appended_minute', table='raw_data_minute'
+        )
+    rows.sort(key=lambda row: (row['user_id'], row['metric_id'], row['timestamp']))
+    return rows
+
+metric_broker = MetricBroker(settings.LIVE_CHANNEL, settings.LIVE_QUEUE_SIZE)
+
+def notify_appended(db: Session, user_id: int, metric_id: int, timestamps: List[datetime]):
+    """
+    NOTIFY live subscribers of points written in the session's current transaction,
+    in the same [user_id, metric_id, first epoch, last epoch] form ingestion uses.
+    Delivered when the transaction commits.
+    """
+    if not timestamps:
+        return
+    epochs = [int(ts.replace(tzinfo=ts.tzinfo or timezone.utc).timestamp()) for ts in timestamps]
+    payload = json.dumps([[user_id, metric_id, min(epochs), max(epochs)]], separators=(',', ':'))
+    db.execute(text("SELECT pg_notify(:channel, :payload)"), {"channel": settings.LIVE_CHANNEL, "payload": payload})
@@ -0,0 +1,115 @@
+import asyncio
+from datetime import date, timedelta
+from string import Template
+from typing import List, Optional
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import insert
+from sqlalchemy.orm import Session
+from app.core.mail import send_bulk_email
+from app.models.participant import Participant
+from app.models.communication_log import CommunicationLog
+from app.services import adherence
+from app.services.participants import filter_participants
+
+# Sends are written to communication_logs every this many results
+LOG_BATCH_SIZE = 200
+
+def select_targets(
+    db: Session,
+    participant_ids: Optional[List[int]] = None,
+    active: Optional[bool] = None,
+    stale_hours: Optional[int] = None,
+    overall_adherence_below: Optional[float] = None,
+    days: int = 30,
+) -> List[dict]:
+    """
+    Participants to contact: the listing filters narrow the query, then, if given,
+    overall adherence over the last `days` days is computed for each one left.
+    """
+    query = db.query(
+        Participant.id, Participant.name, Participant.email,
+        Participant.sleep_threshold, Participant.overall_threshold
+    ).execution_options(query_name='outreach_targets')
+    if participant_ids:
+        query = query.filter(Participant.id.in_(participant_ids))
+    rows = filter_participants(query, active, stale_hours).order_by(Participant.id).all()
+
+    targets = []
+    end_date = date.today()
+    start_date = end_date - timedelta(days=days-1)
+    for row in rows:
+        target = {"id": row.id, "name": row.name or "", "email": row.email, "overall_adherence": None}
+        if overall_adherence_below is not None:
+            overall = adherence.calculate_overall_adherence(
+                db, row.id, start_date, end_date,
+                wear_threshold=row.overall_threshold or 70, sleep_threshold=row.sleep_threshold or 7
+            )
+            if overall >= overall_adherence_below:
+                continue
+            target["overall_adherence"] = overall
+        targets.append(target)
+    return targets
+
+def log_communications(db: Session, entries: List[dict]):
+    """Insert communication_logs rows in one executemany and commit"""
+    if entries:
+        db.execute(insert(CommunicationLog.__table__), entries, execution_options={"query_name": "log_communications"})
+        db.commit()
+
+async def send_outreach(
+    db: Session,
+    targets: List[dict],
+    subject: str,
+    body: str,
+    email_type: str = "outreach",
+    threshold_triggered: Optional[str] = None,
+    concurrency: Optional[int] = None,
+    rate: Optional[float] = None,
+) -> List[dict]:
+    """
+    Email each target, filling $name, $email and $overall_adherence in the subject and body,
+    and record every attempt in communication_logs. Returns a result per target.
+    """
+    messages = []
+    for target in targets:
+        values = {key: "" if value is None else value for key, value in target.items()}
+        messages.append({
+            "subject": Template(subject).safe_substitute(values),
+            "recipients": [target["email"]],
+            "body": Template(body).safe_substitute(values),
+        })
+
+    pending, lock = [], asyncio.Lock()
+
+    async def flush(force: bool = False):
+        # One flush at a time: the session is not safe to share between threads
+        async with lock:
+            if pending and (force or len(pending) >= LOG_BATCH_SIZE):
+                batch = pending[:]
+                del pending[:]
+                await run_in_threadpool(log_communications, db, batch)
+
+    async def record(index: int, result: dict):
+        pending.append({
+            "participant_id": targets[index]["id"],
+            "email_type": email_type,
+            "message_content": messages[index]["body"],
+            "threshold_triggered": threshold_triggered,
+            "email_status": result["status"],
+            "recipient_email": targets[index]["email"],
+        })
+        await flush()
+
+    limits = {}
+    if concurrency is not None:
+        limits["concurrency"] = concurrency
+    if rate is not None:
+        limits["rate"] = rate
+    try:
+        results = await send_bulk_email(messages, on_result=record, **limits)
+    finally:
+        await flush(force=True)
+    return [
+        {"id": target["id"], "email": target["email"], **result}
+        for target, result in zip(targets, results)
+    ]
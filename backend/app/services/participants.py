@@ -0,0 +1,128 @@
+from datetime import date, datetime, timedelta
+from typing import Callable, List, Optional, Tuple
+from sqlalchemy import or_, and_, not_, func, literal_column
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Query, Session
+from app.models.participant import Participant
+from app.schemas.participant import ParticipantCreate
+
+# Columns /api/participants returns by default: the ParticipantOut shape without the OAuth token
+PARTICIPANT_FIELDS = [
+    'id', 'email', 'name', 'study_start_date', 'study_end_date', 'last_upload_date',
+    'adherence_percentage', 'sleep_threshold', 'overall_threshold', 'created_at', 'updated_at',
+]
+# Only sent when named in `fields`
+PARTICIPANT_OPT_IN_FIELDS = ['fitbit_token']
+MAX_PAGE_SIZE = 1000
+
+def parse_fields(fields: Optional[List[str]], allowed: List[str], opt_in: Optional[List[str]] = None) -> List[str]:
+    """
+    Validate a requested field list (repeated or comma-separated) against `allowed` and `opt_in`;
+    all of `allowed` if none given. Raises ValueError naming the unknown fields.
+    """
+    if not fields:
+        return list(allowed)
+    allowed = list(allowed) + list(opt_in or [])
+    requested = [name.strip() for value in fields for name in value.split(',') if name.strip()]
+    unknown = [name for name in requested if name not in allowed]
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(unknown)}")
+    # Keep the caller's order, without duplicates
+    return list(dict.fromkeys(requested))
+
+def filter_participants(
+    query: Query,
+    active: Optional[bool] = None,
+    stale_hours: Optional[int] = None,
+) -> Query:
+    """
+    Apply the listing filters: study currently running and no upload
+    (participants.last_upload_date) within N hours.
+    """
+    if active is not None:
+        today = date.today()
+        running = and_(
+            Participant.study_start_date <= today,
+            or_(Participant.study_end_date.is_(None), Participant.study_end_date >= today)
+        )
+        query = query.filter(running if active else not_(running))
+    if stale_hours is not None:
+        since = datetime.utcnow() - timedelta(hours=stale_hours)
+        query = query.filter(or_(Participant.last_upload_date.is_(None), Participant.last_upload_date < since))
+    return query
+
+def keyset_page(query: Query, cursor: Optional[int], limit: int) -> Tuple[list, Optional[int]]:
+    """
+    Fetch the page of rows after participant id `cursor`, ordered by id. Returns the rows and
+    the cursor of the next page, or None on the last page. The query must select Participant.id.
+    """
+    if cursor is not None:
+        query = query.filter(Participant.id > cursor)
+    # One extra row tells whether another page follows without a COUNT
+    rows = query.order_by(Participant.id).limit(limit + 1).all()
+    if len(rows) > limit:
+        rows = rows[:limit]
+        return rows, rows[-1].id
+    return rows, None
+
+def filtered_keyset_page(query: Query, cursor: Optional[int], limit: int, keep: Callable) -> Tuple[list, Optional[int]]:
+    """
+    keyset_page for a filter computed per row: keep(row) returns the row's entry, or None to
+    skip it. Further pages are read until `limit` entries are kept or the rows run out, so a
+    page is only short when it is the last. The next cursor is the last row examined.
+    """
+    entries = []
+    while True:
+        rows, next_cursor = keyset_page(query, cursor, limit - len(entries))
+        for row in rows:
+            entry = keep(row)
+            if entry is not None:
+                entries.append(entry)
+        if next_cursor is None or len(entries) == limit:
+            return entries, next_cursor
+        cursor = next_cursor
+
+# Rows per INSERT ... ON CONFLICT statement during bulk upserts
+UPSERT_CHUNK_SIZE = 1000
+
+def upsert_participants(db: Session, rows: List[dict]) -> List[dict]:
+    """
+    Insert or update participants keyed on email in one transaction, using one set-based
+    INSERT ... ON CONFLICT per group of rows that provide the same columns. Each row is a
+    validated ParticipantCreate payload (as `dict(exclude_unset=True)`); an existing
+    participant only has the provided columns updated. Returns one result per row, in order.
+    """
+    results = [{"row": index, "email": row["email"]} for index, row in enumerate(rows)]
+    # The last row for an email wins; ON CONFLICT cannot touch the same row twice in one statement
+    last_row = {}
+    for index, row in enumerate(rows):
+        if row["email"] in last_row:
+            results[last_row[row["email"]]].update(status="duplicate", error="Superseded by a later row with this email")
+        last_row[row["email"]] = index
+
+    groups = {}
+    for index in last_row.values():
+        groups.setdefault(frozenset(rows[index]), []).append(index)
+
+    defaults = ParticipantCreate(email="").dict()
+    table = Participant.__table__
+    try:
+        for provided, indexes in groups.items():
+            for start in range(0, len(indexes), UPSERT_CHUNK_SIZE):
+                chunk = indexes[start:start + UPSERT_CHUNK_SIZE]
+                statement = insert(table).values([{**defaults, **rows[index]} for index in chunk])
+                updates = {name: statement.excluded[name] for name in provided if name != "email"}
+                updates["updated_at"] = func.now()
+                # xmax is 0 only for a row this statement inserted
+                statement = statement.on_conflict_do_update(index_elements=[table.c.email], set_=updates).returning(
+                    table.c.id, table.c.email, literal_column("xmax = 0").label("inserted")
+                )
+                returned = {r.email: r for r in db.execute(statement, execution_options={"query_name": "bulk_upsert_participants"})}
+                for index in chunk:
+                    r = returned[rows[index]["email"]]
+                    results[index].update(id=r.id, status="created" if r.inserted else "updated")
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    return results
@@ -0,0 +1,274 @@
+#!/usr/bin/env python3
+"""
+Read-path load test for the backend API.
+
+Replays a weighted dashboard traffic mix against a running backend at a fixed
+concurrency and reports p50/p95/p99 latency and throughput per endpoint. DB
+query counts per request are measured in-process with one calibration call per
+endpoint. Results are written as JSON so runs can be compared with --compare.
+
+Usage (from the backend/ directory, DB_* environment variables point at the
+same disposable database the backend under test uses):
+
+    python -m scripts.bench_api --seed --users 50 --days 90 \\
+        --requests 2000 --concurrency 16 --output benchmarks/api_baseline.json
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import subprocess
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+
+from fastapi import Request, Response
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import sessionmaker
+
+from app.core.config import settings
+from app.db.database import db_manager
+from scripts.seed import seed_database
+
+# Relative weight of each endpoint in the replayed dashboard traffic
+TRAFFIC_MIX = {
+    'metrics': 60,
+    'participant_metrics': 20,
+    'stats': 15,
+    'adherence_overview': 5,
+}
+METRICS = ['heart_rate', 'spo2']
+WINDOWS = [timedelta(days=1), timedelta(days=7), timedelta(days=30), timedelta(days=90)]
+
+
+class QueryCounter:
+    """Counts statements sent through db_manager and any SQLAlchemy engine"""
+
+    def __init__(self):
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def increment(self, *args, **kwargs):
+        with self._lock:
+            self.count += 1
+
+    def install(self):
+        event.listen(Engine, "before_cursor_execute", self.increment)
+
+        def wrap(execute):
+            def counted(*args, **kwargs):
+                self.increment()
+                return execute(*args, **kwargs)
+            return counted
+        db_manager.execute_query = wrap(db_manager.execute_query)
+        db_manager.execute_query_single = wrap(db_manager.execute_query_single)
+
+    def measure(self, call):
+        before = self.count
+        call()
+        return self.count - before
+
+
+def build_request(rng, endpoint, users, end):
+    """Return (path, query params) for one request of the given endpoint"""
+    user_id = rng.randint(1, users)
+    window = rng.choice(WINDOWS)
+    start = end - window
+    if endpoint == 'metrics':
+        return '/api/metrics', [
+            ('user_id', user_id), ('metric', rng.choice(METRICS)),
+            ('start_date', start.isoformat()), ('end_date', end.isoformat()),
+        ]
+    if endpoint == 'participant_metrics':
+        # The per-participant view reads raw rows, so keep its windows short
+        start = end - rng.choice(WINDOWS[:2])
+        return f'/api/participants/{user_id}/metrics', [
+            ('metrics', m) for m in METRICS
+        ] + [('start_date', start.isoformat()), ('end_date', end.isoformat())]
+    if endpoint == 'adherence_overview':
+        return '/api/adherence/overview', [('days', 30)]
+    return '/api/stats', []
+
+
+async def _connected():
+    return {"type": "http.request", "body": b"", "more_body": False}
+
+
+def bare_request(path):
+    """A request without conditional headers, for calling endpoints in-process; never disconnects"""
+    return Request({
+        "type": "http", "method": "GET", "path": path, "query_string": b"",
+        "headers": [], "route": SimpleNamespace(path=path),
+    }, receive=_connected)
+
+
+def calibrate_query_counts(counter, end):
+    """Issue one in-process call per endpoint and count the DB statements it sends"""
+    from app import main
+    from app.api import adherence as adherence_api
+    from app.api import participants as participants_api
+    from app.db.catalog import freshness_snapshot
+
+    engine = create_engine(settings.DATABASE_URL)
+    db = sessionmaker(bind=engine)()
+    start = end - timedelta(days=7)
+    # Loaded once per FRESHNESS_CACHE_SECONDS, not per request, so keep it out of the counts
+    freshness_snapshot.participants()
+    try:
+        return {
+            'metrics': counter.measure(lambda: asyncio.run(main.get_metrics(
+                bare_request('/api/metrics'), Response(), start_date=start, end_date=end, user_id=1, metric='heart_rate', granularity=None))),
+            'participant_metrics': counter.measure(lambda: participants_api.get_participant_metrics(
+                1, db, metrics=METRICS, start_date=end - timedelta(days=1), end_date=end)),
+            'stats': counter.measure(lambda: asyncio.run(main.get_stats())),
+            'adherence_overview': counter.measure(lambda: asyncio.run(adherence_api.adherence_overview(
+                bare_request('/api/adherence/overview'), Response(), db=db, days=30, cursor=None, limit=100, fields=None,
+                active=None, adherence_below=None, stale_hours=None))),
+        }
+    finally:
+        db.close()
+
+
+def send(base_url, path, params, timeout):
+    url = base_url.rstrip('/') + path
+    if params:
+        url += '?' + urllib.parse.urlencode(params)
+    start = time.perf_counter()
+    try:
+        with urllib.request.urlopen(url, timeout=timeout) as response:
+            response.read()
+            ok = 200 <= response.status < 300
+    except (urllib.error.URLError, TimeoutError):
+        ok = False
+    return time.perf_counter() - start, ok
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, max(0, int(round(pct / 100.0 * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[index]
+
+
+def run_load(base_url, plan, concurrency, timeout):
+    latencies = {endpoint: [] for endpoint in TRAFFIC_MIX}
+    errors = {endpoint: 0 for endpoint in TRAFFIC_MIX}
+
+    def worker(item):
+        endpoint, path, params = item
+        return endpoint, send(base_url, path, params, timeout)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        for endpoint, (elapsed, ok) in executor.map(worker, plan):
+            latencies[endpoint].append(elapsed)
+            if not ok:
+                errors[endpoint] += 1
+    wall_seconds = time.perf_counter() - start
+    return latencies, errors, wall_seconds
+
+
+def summarize(latencies, errors, wall_seconds, query_counts):
+    def stats(values, error_count):
+        values = sorted(values)
+        to_ms = lambda v: round(v * 1000, 2) if v is not None else None
+        return {
+            'requests': len(values),
+            'errors': error_count,
+            'p50_ms': to_ms(percentile(values, 50)),
+            'p95_ms': to_ms(percentile(values, 95)),
+            'p99_ms': to_ms(percentile(values, 99)),
+            'throughput_rps': round(len(values) / wall_seconds, 2) if wall_seconds else None,
+        }
+
+    endpoints = {}
+    for endpoint, values in latencies.items():
+        endpoints[endpoint] = stats(values, errors[endpoint])
+        endpoints[endpoint]['queries_per_request'] = query_counts.get(endpoint)
+    overall = stats([v for values in latencies.values() for v in values], sum(errors.values()))
+    overall['wall_seconds'] = round(wall_seconds, 2)
+    return endpoints, overall
+
+
+def print_report(result, baseline):
+    print(f"{'endpoint':<22}{'reqs':>7}{'err':>6}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'rps':>9}{'queries':>9}{'p95 vs base':>13}")
+    rows = list(result['endpoints'].items()) + [('overall', result['overall'])]
+    for name, stats in rows:
+        change = ''
+        if baseline:
+            before = baseline['overall'] if name == 'overall' else baseline['endpoints'].get(name)
+            if before and before.get('p95_ms') and stats.get('p95_ms'):
+                change = f"{100.0 * (stats['p95_ms'] - before['p95_ms']) / before['p95_ms']:+.1f}%"
+        fmt = lambda v: '-' if v is None else v
+        print(f"{name:<22}{stats['requests']:>7}{stats['errors']:>6}{fmt(stats['p50_ms']):>10}{fmt(stats['p95_ms']):>10}"
+              f"{fmt(stats['p99_ms']):>10}{fmt(stats['throughput_rps']):>9}{fmt(stats.get('queries_per_request')):>9}{change:>13}")
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], text=True, stderr=subprocess.DEVNULL).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--base-url', default='http://localhost:8000')
+    parser.add_argument('--seed', action='store_true', help='Drop and reseed raw_data before the run')
+    parser.add_argument('--users', type=int, default=20)
+    parser.add_argument('--days', type=int, default=30)
+    parser.add_argument('--requests', type=int, default=1000)
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--timeout', type=float, default=60.0)
+    parser.add_argument('--random-seed', type=int, default=0)
+    parser.add_argument('--output', default=None, help='Write the results as JSON to this path')
+    parser.add_argument('--compare', default=None, help='Baseline JSON from an earlier run')
+    args = parser.parse_args()
+
+    end = datetime.now(timezone.utc).replace(second=0, microsecond=0)
+    if args.seed:
+        seed_database(args.users, args.days, end)
+
+    counter = QueryCounter()
+    counter.install()
+    query_counts = calibrate_query_counts(counter, end)
+
+    rng = random.Random(args.random_seed)
+    endpoints = rng.choices(list(TRAFFIC_MIX), weights=list(TRAFFIC_MIX.values()), k=args.requests)
+    plan = [(endpoint,) + build_request(rng, endpoint, args.users, end) for endpoint in endpoints]
+
+    latencies, errors, wall_seconds = run_load(args.base_url, plan, args.concurrency, args.timeout)
+    endpoint_stats, overall = summarize(latencies, errors, wall_seconds, query_counts)
+
+    result = {
+        'timestamp': datetime.now().isoformat(timespec='seconds'),
+        'revision': git_revision(),
+        'params': {
+            'users': args.users, 'days': args.days, 'requests': args.requests,
+            'concurrency': args.concurrency, 'mix': TRAFFIC_MIX,
+        },
+        'endpoints': endpoint_stats,
+        'overall': overall,
+    }
+    baseline = None
+    if args.compare:
+        with open(args.compare) as file:
+            baseline = json.load(file)
+    print_report(result, baseline)
+    if args.output:
+        os.makedirs(os.path.dirname(args.output) or '.', exist_ok=True)
+        with open(args.output, 'w') as file:
+            json.dump(result, file, indent=2)
+        print(f"Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
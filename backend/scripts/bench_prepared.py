@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+"""
+Prepared-statement benchmark for the hot read queries.
+
+Runs get_metrics_data against each source table (raw_data, data_1m, data_1h,
+data_1d) and the metric-id lookup through db_manager, first as plain queries and
+then as prepared statements, from several threads sharing the pool. Reports
+p50/p95 latency per query and the change from preparing. Windows are short, so
+parse and plan time is a visible share of each call.
+
+Usage (from the backend/ directory, DB_* environment variables point at a
+disposable database):
+
+    python -m scripts.bench_prepared --seed --users 20 --days 30 \\
+        --iterations 2000 --concurrency 8 --output benchmarks/prepared.json
+"""
+
+import argparse
+import json
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+
+from app.db.catalog import get_metric_id
+from app.db.database import db_manager
+from app.db.queries import get_metrics_data
+from scripts.bench_api import METRICS, git_revision, percentile
+from scripts.seed import seed_database
+
+# Query -> window per call, sized so each returns a dashboard-sized result
+WINDOWS = {
+    'raw': timedelta(minutes=30),
+    'minute': timedelta(hours=6),
+    'hour': timedelta(days=7),
+    'day': timedelta(days=30),
+}
+LOOKUP = 'metric_id_lookup'
+METRIC_ID_QUERY = "SELECT id FROM metrics WHERE name = %s"
+
+
+def build_plan(rng, iterations, users, days, end):
+    """(query, args) calls, shuffled, shared by both runs"""
+    plan = []
+    for _ in range(iterations):
+        granularity = rng.choice(list(WINDOWS) + [LOOKUP])
+        metric = rng.choice(METRICS)
+        if granularity == LOOKUP:
+            plan.append((LOOKUP, (metric,)))
+            continue
+        window = WINDOWS[granularity]
+        start = end - timedelta(days=days) + rng.random() * (timedelta(days=days) - window)
+        plan.append((granularity, (start, start + window, rng.randint(1, users), metric, granularity)))
+    return plan
+
+
+def call(query, args):
+    start = time.perf_counter()
+    if query == LOOKUP:
+        # get_metric_id caches; go through db_manager so every call reaches the database
+        db_manager.execute_query_single(METRIC_ID_QUERY, args, query_name='get_metric_id', table='metrics', prepare=True)
+    else:
+        get_metrics_data(*args)
+    return query, time.perf_counter() - start
+
+
+def run(plan, concurrency, prepare):
+    db_manager.prepare_statements = prepare
+    # Warm up every pooled connection (and, when preparing, its statements) before measuring
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        list(executor.map(lambda item: call(*item), plan[:concurrency * 10]))
+    latencies = {query: [] for query in list(WINDOWS) + [LOOKUP]}
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        for query, elapsed in executor.map(lambda item: call(*item), plan):
+            latencies[query].append(elapsed)
+    return latencies, time.perf_counter() - start
+
+
+def summarize(latencies, wall_seconds):
+    to_ms = lambda v: round(v * 1000, 3) if v is not None else None
+    result = {}
+    for query, values in latencies.items():
+        values = sorted(values)
+        result[query] = {
+            'calls': len(values),
+            'p50_ms': to_ms(percentile(values, 50)),
+            'p95_ms': to_ms(percentile(values, 95)),
+            'mean_ms': to_ms(sum(values) / len(values)) if values else None,
+        }
+    result['overall'] = {'calls': sum(len(v) for v in latencies.values()), 'wall_seconds': round(wall_seconds, 2)}
+    return result
+
+
+def print_report(plain, prepared):
+    print(f"{'query':<18}{'calls':>7}{'plain p50':>11}{'prep p50':>10}{'plain p95':>11}{'prep p95':>10}{'p50 change':>12}")
+    for query in list(WINDOWS) + [LOOKUP]:
+        before, after = plain[query], prepared[query]
+        change = ''
+        if before['p50_ms'] and after['p50_ms']:
+            change = f"{100.0 * (after['p50_ms'] - before['p50_ms']) / before['p50_ms']:+.1f}%"
+        print(f"{query:<18}{after['calls']:>7}{before['p50_ms']:>11}{after['p50_ms']:>10}"
+              f"{before['p95_ms']:>11}{after['p95_ms']:>10}{change:>12}")
+    print(f"wall seconds: plain {plain['overall']['wall_seconds']}, prepared {prepared['overall']['wall_seconds']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--seed', action='store_true', help='Drop and reseed raw_data before the run')
+    parser.add_argument('--users', type=int, default=20)
+    parser.add_argument('--days', type=int, default=30)
+    parser.add_argument('--iterations', type=int, default=2000)
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--random-seed', type=int, default=0)
+    parser.add_argument('--output', default=None, help='Write the results as JSON to this path')
+    args = parser.parse_args()
+
+    end = datetime.now(timezone.utc).replace(second=0, microsecond=0)
+    if args.seed:
+        seed_database(args.users, args.days, end)
+    for metric in METRICS:
+        get_metric_id(metric)
+
+    plan = build_plan(random.Random(args.random_seed), args.iterations, args.users, args.days, end)
+    plain = summarize(*run(plan, args.concurrency, prepare=False))
+    prepared = summarize(*run(plan, args.concurrency, prepare=True))
+    print_report(plain, prepared)
+
+    if args.output:
+        result = {
+            'timestamp': datetime.now().isoformat(timespec='seconds'),
+            'revision': git_revision(),
+            'params': {'users': args.users, 'days': args.days, 'iterations': args.iterations, 'concurrency': args.concurrency},
+            'plain': plain,
+            'prepared': prepared,
+        }
+        with open(args.output, 'w') as file:
+            json.dump(result, file, indent=2)
+        print(f"Results written to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
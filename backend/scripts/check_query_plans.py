@@ -0,0 +1,245 @@
+#!/usr/bin/env python3
+"""
+Query-plan regression check for the raw_data access paths.
+
+Runs the production query functions against a local TimescaleDB, captures the SQL
+they send, and EXPLAINs each statement the way production runs it. Statements that
+db_manager prepares are PREPAREd and checked with EXPLAIN EXECUTE, repeated past the
+point where Postgres may switch to a generic plan (bounds as parameters, so chunk
+exclusion happens at executor startup, if at all). The check fails (exit code 1) if a
+plan falls back to a sequential scan on raw_data or one of the continuous aggregates,
+or if it touches a chunk that lies outside the queried time range.
+
+Usage (from the backend/ directory, DB_* environment variables point at a
+disposable database):
+
+    python -m scripts.check_query_plans --seed --users 20 --days 14
+"""
+
+import argparse
+import sys
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+
+from app.core.config import settings
+from app.db.database import db_manager, to_positional
+from app.db import queries
+from app.services import adherence
+from app.api import participants as participants_api
+from scripts.seed import seed_database
+
+
+# Postgres plans the first five executions of a prepared statement with the actual
+# parameters, then may switch to a generic plan; check past that point
+PREPARED_RUNS = 6
+
+
+class Statement:
+    """One captured statement: its SQL, parameters, and whether db_manager prepares it"""
+
+    def __init__(self, query, params, prepared):
+        self.query = query
+        self.params = tuple(params) if params else ()
+        self.prepared = prepared
+
+    def key(self):
+        return (self.query, repr(self.params), self.prepared)
+
+
+class StatementRecorder:
+    """Collects the SQL sent by db_manager and by SQLAlchemy sessions"""
+
+    def __init__(self):
+        self.statements = []
+
+    def wrap_db_manager(self):
+        def wrap(execute):
+            def recorded(query, params=None, **kwargs):
+                prepared = kwargs.get('prepare', False) and db_manager.prepare_statements
+                self.statements.append(Statement(query, params, prepared))
+                return execute(query, params, **kwargs)
+            return recorded
+        db_manager.execute_query = wrap(db_manager.execute_query)
+        db_manager.execute_query_single = wrap(db_manager.execute_query_single)
+
+    def attach_engine(self, engine):
+        @event.listens_for(engine, "before_cursor_execute")
+        def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+            # Parameters inlined, as psycopg2 sends them
+            sql = cursor.mogrify(statement, parameters)
+            self.statements.append(Statement(sql.decode() if isinstance(sql, bytes) else sql, None, False))
+
+    def take(self):
+        statements, self.statements = self.statements, []
+        return statements
+
+
+def load_chunk_ranges():
+    """Map chunk table name -> (hypertable, range_start, range_end)"""
+    rows = db_manager.execute_query("""
+        SELECT chunk_name, hypertable_name, range_start, range_end
+        FROM timescaledb_information.chunks
+    """)
+    return {r['chunk_name']: (r['hypertable_name'], r['range_start'], r['range_end']) for r in rows}
+
+
+def load_watched_relations():
+    """raw_data, sleep_summary, data_freshness, cohort_1d and the materialization hypertables behind the continuous aggregates"""
+    rows = db_manager.execute_query("""
+        SELECT materialization_hypertable_name
+        FROM timescaledb_information.continuous_aggregates
+    """)
+    return {'raw_data', 'sleep_summary', 'data_freshness', 'cohort_1d'} | {r['materialization_hypertable_name'] for r in rows}
+
+
+def load_relation_sizes():
+    rows = db_manager.execute_query("SELECT relname, reltuples FROM pg_class WHERE relkind IN ('r', 'p')")
+    return {r['relname']: r['reltuples'] for r in rows}
+
+
+def iter_plan_nodes(node):
+    yield node
+    for child in node.get('Plans', []):
+        yield from iter_plan_nodes(child)
+
+
+def explain(statement: Statement):
+    """
+    Plans for a statement as production runs it: one EXPLAIN for plain SQL; for a prepared
+    statement, PREPARED_RUNS EXPLAIN EXECUTEs on one pooled connection (with its settings,
+    e.g. plan_cache_mode), each of which counts towards the switch to a generic plan.
+    """
+    # Goes straight to the pool so the EXPLAIN itself is not picked up by the recorder
+    with db_manager.get_connection() as conn:
+        with conn.cursor() as cursor:
+            if not statement.prepared:
+                cursor.execute(f"EXPLAIN (FORMAT JSON) {statement.query}", statement.params or None)
+                return [cursor.fetchone()['QUERY PLAN'][0]['Plan']]
+            cursor.execute(f"PREPARE plan_check AS {to_positional(statement.query)}")
+            try:
+                arguments = f" ({', '.join(['%s'] * len(statement.params))})" if statement.params else ""
+                plans = []
+                for _ in range(PREPARED_RUNS):
+                    cursor.execute(f"EXPLAIN (FORMAT JSON) EXECUTE plan_check{arguments}", statement.params or None)
+                    plans.append(cursor.fetchone()['QUERY PLAN'][0]['Plan'])
+                return plans
+            finally:
+                # DEALLOCATE fails in an aborted transaction; the prepared statement outlives the rollback
+                conn.rollback()
+                cursor.execute("DEALLOCATE plan_check")
+
+
+def check_plan(statement, start, end, chunks, watched, sizes, min_rows):
+    """Return a list of violations for one statement"""
+    violations = []
+    for run, plan in enumerate(explain(statement), 1):
+        suffix = f" (EXECUTE #{run})" if statement.prepared else ""
+        violations.extend(f"{violation}{suffix}" for violation in check_nodes(plan, start, end, chunks, watched, sizes, min_rows))
+    return violations
+
+
+def check_nodes(plan, start, end, chunks, watched, sizes, min_rows):
+    violations = []
+    for node in iter_plan_nodes(plan):
+        relation = node.get('Relation Name')
+        if not relation:
+            continue
+        chunk = chunks.get(relation)
+        if chunk is None and relation not in watched:
+            continue
+        if node['Node Type'] == 'Seq Scan' and sizes.get(relation, 0) >= min_rows:
+            violations.append(f"sequential scan on {relation}")
+        if chunk is not None:
+            _, range_start, range_end = chunk
+            # Chunk ranges are [start, end); one starting at the query's end is not needed
+            if range_end <= start or range_start >= end:
+                violations.append(f"chunk {relation} [{range_start} - {range_end}) not excluded")
+    return violations
+
+
+def build_cases(end: datetime):
+    """Each case is (name, start, end, callable running the production query path)"""
+    day = (end - timedelta(days=3)).date()
+    day_start = datetime.combine(day, datetime.min.time(), tzinfo=timezone.utc)
+    day_end = day_start + timedelta(days=1)
+    window_start = end - timedelta(days=4)
+    window_end = end - timedelta(days=2)
+    cases = []
+    for granularity in ['raw', 'minute', 'hour', 'day']:
+        cases.append((
+            f"get_metrics_data[{granularity}]", window_start, window_end,
+            lambda db, g=granularity: queries.get_metrics_data(window_start, window_end, 1, 'heart_rate', g)
+        ))
+    cases.extend([
+        ("get_cohort_metrics[rollup]", window_start, window_end,
+         lambda db: queries.get_cohort_metrics('heart_rate', window_start, window_end)),
+        ("get_cohort_metrics[hour]", window_start, window_end,
+         lambda db: queries.get_cohort_metrics('heart_rate', window_start, window_end, 'hour', [1, 2, 3])),
+        ("get_metric_summary", window_start, window_end,
+         lambda db: queries.get_metric_summary(1, 'heart_rate', window_start, window_end)),
+        ("adherence.calculate_wear_time", day_start, day_end,
+         lambda db: adherence.calculate_wear_time(db, 1, day, day)),
+        ("adherence.calculate_sleep_compliance", day_start, day_end,
+         lambda db: adherence.calculate_sleep_compliance(db, 1, day, day)),
+        ("adherence.calculate_overall_adherence", day_start, day_end,
+         lambda db: adherence.calculate_overall_adherence(db, 1, day, day)),
+        ("adherence.has_recent_upload", end - timedelta(hours=48), end,
+         lambda db: adherence.has_recent_upload(db, 1)),
+        ("adherence.get_recent_uploaders", end - timedelta(hours=48), end,
+         lambda db: adherence.get_recent_uploaders(db)),
+        ("participants.get_participant_metrics", window_start, window_end,
+         lambda db: participants_api.get_participant_metrics(
+             1, db, metrics=['heart_rate', 'spo2'], start_date=window_start, end_date=window_end)),
+    ])
+    return cases
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--seed', action='store_true', help='Drop and reseed raw_data before checking')
+    parser.add_argument('--users', type=int, default=20)
+    parser.add_argument('--days', type=int, default=14)
+    parser.add_argument('--min-rows', type=int, default=1000,
+                        help='Sequential scans over relations smaller than this are allowed')
+    args = parser.parse_args()
+
+    end = datetime.now(timezone.utc).replace(second=0, microsecond=0)
+    if args.seed:
+        seed_database(args.users, args.days, end)
+
+    chunks = load_chunk_ranges()
+    watched = load_watched_relations()
+    sizes = load_relation_sizes()
+
+    recorder = StatementRecorder()
+    recorder.wrap_db_manager()
+    engine = create_engine(settings.DATABASE_URL)
+    recorder.attach_engine(engine)
+    db = sessionmaker(bind=engine)()
+
+    failures = 0
+    try:
+        for name, start, stop, run in build_cases(end):
+            run(db)
+            statements = [s for s in recorder.take() if any(
+                name in s.query for name in ('raw_data', 'data_1', 'sleep_summary', 'data_freshness', 'cohort_1d'))]
+            violations = []
+            for statement in {s.key(): s for s in statements}.values():
+                violations.extend(check_plan(statement, start, stop, chunks, watched, sizes, args.min_rows))
+            if violations:
+                failures += 1
+                print(f"FAIL {name}")
+                for violation in dict.fromkeys(violations):
+                    print(f"     {violation}")
+            else:
+                print(f"ok   {name} ({len(statements)} statements)")
+    finally:
+        db.close()
+
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,155 @@
+"""
+Synthetic cohort seeding shared by the backend check and benchmark scripts.
+
+Drops and recreates raw_data, sleep_summary and data_freshness in the database the DB_* environment variables
+point at, so only run it against a disposable database.
+"""
+
+from datetime import datetime, timedelta
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.core.config import settings
+from app.db.database import db_manager
+from app.models.participant import Participant
+
+SEED_MINUTE_METRICS = ['heart_rate', 'spo2']
+SEED_DAILY_METRICS = ['hrv', 'activity']
+AGGREGATE_VIEWS = ['data_1m', 'data_1h', 'data_1d']
+
+
+def seed_database(users: int, days: int, end: datetime):
+    """Recreate raw_data, sleep_summary and data_freshness with a synthetic cohort and rebuild the continuous aggregates"""
+    start = end - timedelta(days=days)
+    with db_manager.get_connection() as conn:
+        conn.autocommit = True
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute("DROP TABLE IF EXISTS raw_data CASCADE")
+                cursor.execute("""
+                    CREATE TABLE IF NOT EXISTS metrics (
+                        id SMALLSERIAL PRIMARY KEY,
+                        name TEXT NOT NULL UNIQUE
+                    )
+                """)
+                cursor.execute("""
+                    INSERT INTO metrics (name) SELECT unnest(%s::text[])
+                    ON CONFLICT (name) DO NOTHING
+                """, (SEED_MINUTE_METRICS + SEED_DAILY_METRICS,))
+                cursor.execute("""
+                    CREATE TABLE raw_data (
+                        id SERIAL,
+                        user_id INTEGER NOT NULL,
+                        timestamp TIMESTAMPTZ NOT NULL,
+                        metric_id SMALLINT NOT NULL REFERENCES metrics(id),
+                        value DOUBLE PRECISION,
+                        is_imputed BOOLEAN DEFAULT FALSE,
+                        imputation_method VARCHAR(100),
+                        imputed_at TIMESTAMPTZ,
+                        created_at TIMESTAMPTZ DEFAULT NOW(),
+                        UNIQUE(user_id, timestamp, metric_id)
+                    )
+                """)
+                cursor.execute("""
+                    SELECT create_hypertable('raw_data', 'timestamp',
+                        chunk_time_interval => INTERVAL '1 day',
+                        create_default_indexes => FALSE)
+                """)
+                cursor.execute("""
+                    CREATE INDEX ix_raw_data_user_metric_ts
+                    ON raw_data (user_id, metric_id, timestamp DESC)
+                """)
+                print(f"Seeding {users} users x {days} days ...")
+                cursor.execute("""
+                    INSERT INTO raw_data (user_id, timestamp, metric_id, value)
+                    SELECT u, ts, m.id, 60 + random() * 40
+                    FROM generate_series(1, %s) u,
+                         (SELECT id FROM metrics WHERE name = ANY(%s)) m,
+                         generate_series(%s::timestamptz, %s::timestamptz, INTERVAL '1 minute') ts
+                """, (users, SEED_MINUTE_METRICS, start, end))
+                cursor.execute("""
+                    INSERT INTO raw_data (user_id, timestamp, metric_id, value)
+                    SELECT u, ts, m.id, random() * 100
+                    FROM generate_series(1, %s) u,
+                         (SELECT id FROM metrics WHERE name = ANY(%s)) m,
+                         generate_series(%s::timestamptz, %s::timestamptz, INTERVAL '1 day') ts
+                """, (users, SEED_DAILY_METRICS, start, end))
+                cursor.execute("ANALYZE raw_data")
+                cursor.execute("DROP TABLE IF EXISTS sleep_summary")
+                cursor.execute("""
+                    CREATE TABLE sleep_summary (
+                        user_id INTEGER NOT NULL,
+                        date_of_sleep DATE NOT NULL,
+                        log_id BIGINT,
+                        is_main_sleep BOOLEAN DEFAULT TRUE,
+                        start_time TIMESTAMPTZ NOT NULL,
+                        end_time TIMESTAMPTZ NOT NULL,
+                        minutes_in_bed INTEGER,
+                        minutes_asleep INTEGER,
+                        minutes_awake INTEGER,
+                        minutes_deep INTEGER,
+                        minutes_light INTEGER,
+                        minutes_rem INTEGER,
+                        minutes_wake INTEGER,
+                        efficiency SMALLINT,
+                        PRIMARY KEY (user_id, date_of_sleep)
+                    )
+                """)
+                # One main sleep per night of 6-9 hours in bed, ending the morning of date_of_sleep
+                cursor.execute("""
+                    INSERT INTO sleep_summary (user_id, date_of_sleep, start_time, end_time,
+                        minutes_in_bed, minutes_asleep, minutes_awake, efficiency)
+                    SELECT u, d::date, d + INTERVAL '7 hours' - make_interval(mins => in_bed),
+                           d + INTERVAL '7 hours', in_bed, in_bed - 40, 40, (100 * (in_bed - 40) / in_bed)
+                    FROM (
+                        SELECT u, d, 360 + (random() * 180)::int AS in_bed
+                        FROM generate_series(1, %s) u,
+                             generate_series(%s::date, %s::date, INTERVAL '1 day') d
+                    ) nights
+                """, (users, start, end))
+                cursor.execute("ANALYZE sleep_summary")
+                cursor.execute("DROP TABLE IF EXISTS data_freshness")
+                cursor.execute("""
+                    CREATE TABLE data_freshness (
+                        user_id INTEGER NOT NULL,
+                        metric_id SMALLINT NOT NULL REFERENCES metrics(id),
+                        last_seen_at TIMESTAMPTZ NOT NULL,
+                        updated_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+                        PRIMARY KEY (user_id, metric_id)
+                    )
+                """)
+                cursor.execute("CREATE INDEX ix_data_freshness_last_seen ON data_freshness (last_seen_at)")
+                cursor.execute("""
+                    INSERT INTO data_freshness (user_id, metric_id, last_seen_at)
+                    SELECT user_id, metric_id, max(timestamp) FROM raw_data GROUP BY user_id, metric_id
+                """)
+        finally:
+            conn.autocommit = False
+
+    db_manager.create_continuous_aggregates()
+    with db_manager.get_connection() as conn:
+        conn.autocommit = True
+        try:
+            with conn.cursor() as cursor:
+                for view_name in AGGREGATE_VIEWS:
+                    cursor.execute(f"CALL refresh_continuous_aggregate('{view_name}', NULL, NULL)")
+                    cursor.execute(f"ANALYZE {view_name}")
+                cursor.execute("TRUNCATE cohort_1d")
+        finally:
+            conn.autocommit = False
+    db_manager.refresh_cohort_rollup()
+
+    engine = create_engine(settings.DATABASE_URL)
+    Participant.__table__.create(engine, checkfirst=True)
+    Session = sessionmaker(bind=engine)
+    db = Session()
+    try:
+        existing = {p.id for p in db.query(Participant.id).all()}
+        for user_id in range(1, users + 1):
+            if user_id not in existing:
+                db.add(Participant(id=user_id, email=f"participant{user_id}@example.com", name=f"Participant {user_id}",
+                                   last_upload_date=end))
+        db.commit()
+    finally:
+        db.close()
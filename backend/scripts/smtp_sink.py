@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""
+Local SMTP stand-in for exercising outreach without sending real email.
+
+Accepts any sender, recipient and message (no TLS, no auth) and discards it,
+printing a line per message and, every few seconds, how many connections and
+messages it has seen, so connection reuse and the send rate are visible.
+
+Usage: run the sink, then start the backend with
+
+    MAIL_SERVER=localhost MAIL_PORT=1025 MAIL_STARTTLS=False USE_CREDENTIALS=False \\
+    MAIL_USERNAME=sink MAIL_PASSWORD=sink MAIL_FROM=study@example.com
+
+    python -m scripts.smtp_sink --port 1025
+"""
+
+import argparse
+import asyncio
+import time
+
+
+class SinkStats:
+    def __init__(self):
+        self.connections = 0
+        self.messages = 0
+        self.started = time.monotonic()
+
+    def line(self):
+        elapsed = time.monotonic() - self.started
+        rate = self.messages / elapsed if elapsed else 0.0
+        return f"{self.connections} connections, {self.messages} messages, {rate:.1f} msg/s"
+
+
+async def handle(reader, writer, stats, quiet):
+    stats.connections += 1
+
+    async def reply(line):
+        writer.write(f"{line}\r\n".encode())
+        await writer.drain()
+
+    await reply("220 smtp-sink ready")
+    recipients = []
+    while True:
+        line = await reader.readline()
+        if not line:
+            break
+        command = line.decode(errors="replace").strip()
+        verb = command.split(" ", 1)[0].upper()
+        if verb == "EHLO":
+            writer.write(b"250-smtp-sink\r\n250-8BITMIME\r\n250 SIZE 10485760\r\n")
+            await writer.drain()
+        elif verb in ("HELO", "NOOP", "MAIL"):
+            await reply("250 OK")
+        elif verb == "RCPT":
+            recipients.append(command.split(":", 1)[-1].strip())
+            await reply("250 OK")
+        elif verb == "RSET":
+            recipients = []
+            await reply("250 OK")
+        elif verb == "DATA":
+            await reply("354 End data with <CR><LF>.<CR><LF>")
+            while (await reader.readline()) not in (b".\r\n", b".\n", b""):
+                pass
+            stats.messages += 1
+            if not quiet:
+                print(f"message {stats.messages} to {', '.join(recipients)}")
+            recipients = []
+            await reply("250 OK queued")
+        elif verb == "QUIT":
+            await reply("221 Bye")
+            break
+        else:
+            await reply("502 Command not implemented")
+    writer.close()
+
+
+async def main(host, port, quiet, interval):
+    stats = SinkStats()
+    server = await asyncio.start_server(lambda r, w: handle(r, w, stats, quiet), host, port)
+    print(f"SMTP sink listening on {host}:{port}")
+    async with server:
+        while True:
+            await asyncio.sleep(interval)
+            print(stats.line())
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--host', default='localhost')
+    parser.add_argument('--port', type=int, default=1025)
+    parser.add_argument('--quiet', action='store_true', help='Only print the periodic totals')
+    parser.add_argument('--interval', type=float, default=5.0)
+    args = parser.parse_args()
+    try:
+        asyncio.run(main(args.host, args.port, args.quiet, args.interval))
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,7 @@
+import os
+import sys
+
+# The pool opens no connections up front, so the app imports without a database;
+# tests that reach the database replace db_manager's methods or the session
+os.environ.setdefault("DB_POOL_MIN", "0")
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
@@ -0,0 +1,59 @@
+from datetime import date, datetime, timedelta
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.core.config import settings
+from app.db import catalog
+from app.models.raw_data import RawData
+from app.models.raw_data_minute import RawDataMinute
+from app.models.sleep_summary import SleepSummary
+from app.services import adherence
+
+DAY = date(2024, 1, 10)
+HEART_RATE_ID = 7
+
+
+@pytest.fixture
+def db():
+    engine = create_engine("sqlite://")
+    for model in (RawData, RawDataMinute, SleepSummary):
+        model.__table__.create(engine)
+    session = sessionmaker(bind=engine)()
+    start = datetime.combine(DAY, datetime.min.time())
+    # A full night, and heart rate for 1200 of the day's 1440 minutes
+    session.add(SleepSummary(user_id=1, date_of_sleep=DAY, start_time=start, end_time=start + timedelta(hours=8),
+                             minutes_in_bed=480))
+    yield session, [start + timedelta(minutes=minute) for minute in range(1200)]
+    session.close()
+
+
+@pytest.fixture(autouse=True)
+def heart_rate_id(monkeypatch):
+    monkeypatch.setitem(catalog._metric_ids, 'heart_rate', HEART_RATE_ID)
+
+
+def test_wide_layout_counts_wear_from_minute_table(db, monkeypatch):
+    session, minutes = db
+    monkeypatch.setattr(settings, 'INGEST_LAYOUT', 'wide')
+    session.add_all(RawDataMinute(user_id=1, timestamp=minute, heart_rate=60.0) for minute in minutes)
+    # spo2-only minutes are not wear
+    session.add(RawDataMinute(user_id=1, timestamp=minutes[-1] + timedelta(minutes=1), spo2=97.0))
+    session.commit()
+
+    assert adherence.count_wear_minutes(session, 1, DAY) == 1200
+    assert adherence.calculate_wear_time(session, 1, DAY, DAY) == 83.33
+    assert adherence.calculate_overall_adherence(session, 1, DAY, DAY, wear_threshold=70) == 100.0
+
+
+def test_narrow_layout_counts_wear_from_raw_data(db, monkeypatch):
+    session, minutes = db
+    monkeypatch.setattr(settings, 'INGEST_LAYOUT', 'narrow')
+    session.add_all(RawData(id=i, user_id=1, timestamp=minute, metric_id=HEART_RATE_ID, value=60.0)
+                    for i, minute in enumerate(minutes, 1))
+    session.commit()
+
+    assert adherence.calculate_wear_time(session, 1, DAY, DAY) == 83.33
+    assert adherence.calculate_overall_adherence(session, 1, DAY, DAY, wear_threshold=70) == 100.0
+    assert adherence.calculate_overall_adherence(session, 1, DAY, DAY, wear_threshold=90) == 0.0
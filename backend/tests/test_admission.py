@@ -0,0 +1,78 @@
+import asyncio
+from datetime import datetime, timezone
+
+import pytest
+from fastapi import HTTPException
+from starlette.requests import Request
+from starlette.responses import Response
+
+from app.api import adherence as adherence_api
+from app.core import admission
+from app.core.admission import AdmissionLimiter
+
+VERSION = datetime(2024, 1, 1, tzinfo=timezone.utc)
+
+
+def test_requests_beyond_the_queue_are_rejected():
+    limiter = AdmissionLimiter("metrics", concurrency=1, queue_size=1, queue_timeout=5, timeout_ms=1000)
+
+    async def scenario():
+        await limiter.acquire()
+        waiting = asyncio.ensure_future(limiter.acquire())
+        await asyncio.sleep(0)
+        with pytest.raises(HTTPException) as rejected:
+            await limiter.acquire()
+        limiter.release()
+        await waiting
+        limiter.release()
+        return rejected.value
+
+    rejected = asyncio.run(scenario())
+
+    assert rejected.status_code == 503
+    assert rejected.headers == {"Retry-After": "1"}
+    assert limiter.waiting == 0
+
+
+def test_queued_requests_time_out():
+    limiter = AdmissionLimiter("metrics", concurrency=1, queue_size=5, queue_timeout=0.01, timeout_ms=1000)
+
+    async def scenario():
+        await limiter.acquire()
+        with pytest.raises(HTTPException) as rejected:
+            await limiter.acquire()
+        return rejected.value
+
+    rejected = asyncio.run(scenario())
+
+    assert rejected.status_code == 503
+    assert limiter.waiting == 0
+
+
+def test_revalidation_is_answered_without_a_slot(monkeypatch):
+    monkeypatch.setattr(adherence_api, "adherence_version", lambda participant_id=None: VERSION)
+    # Every adherence slot is taken, with no room to queue
+    limiter = AdmissionLimiter("adherence", concurrency=1, queue_size=0, queue_timeout=0.01, timeout_ms=1000)
+    monkeypatch.setitem(admission.limiters, "adherence", limiter)
+
+    def request(**headers):
+        return Request({
+            "type": "http", "method": "GET", "path": "/api/adherence/1", "query_string": b"",
+            "headers": [(name.replace("_", "-").encode(), value.encode()) for name, value in headers.items()],
+            "route": type("Route", (), {"path": "/api/adherence/{participant_id}"})(),
+        })
+
+    async def scenario():
+        await limiter.acquire()
+        first = Response()
+        with pytest.raises(HTTPException) as rejected:
+            await adherence_api.participant_adherence(1, request(), first, db=None, days=30)
+        revalidated = await adherence_api.participant_adherence(
+            1, request(if_none_match=first.headers["etag"]), Response(), db=None, days=30
+        )
+        return rejected.value, revalidated
+
+    rejected, revalidated = asyncio.run(scenario())
+
+    assert rejected.status_code == 503
+    assert revalidated.status_code == 304
@@ -0,0 +1,91 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+from fastapi import HTTPException
+from sqlalchemy import MetaData, create_engine, insert
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from app.api import alerts as alerts_api
+from app.models.communication_log import CommunicationLog
+from app.models.participant import Participant
+
+
+@pytest.fixture
+def db():
+    # One connection, shared with the threadpool
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    # One metadata so the communication_logs foreign key finds participants
+    metadata = MetaData()
+    for model in (Participant, CommunicationLog):
+        model.__table__.to_metadata(metadata)
+    metadata.create_all(engine)
+    session = sessionmaker(bind=engine)()
+    session.execute(insert(CommunicationLog.__table__), [
+        {"participant_id": index, "email_type": "alert", "email_status": "queued",
+         "recipient_email": f"p{index}@example.com", "message_content": "Please sync"}
+        for index in range(1, 6)
+    ])
+    session.commit()
+    yield session
+    session.close()
+
+
+def statuses(db):
+    return dict(db.query(CommunicationLog.id, CommunicationLog.email_status).order_by(CommunicationLog.id).all())
+
+
+def test_claim_skips_rows_locked_by_another_dispatch(db):
+    captured = []
+    db.execute = lambda statement, *args, **kwargs: captured.append(statement) or SimpleNamespace(all=list)
+    alerts_api.claim_alerts(db, 10)
+    sql = str(captured[0].compile(dialect=postgresql.dialect()))
+
+    assert sql.startswith("UPDATE communication_logs SET email_status=")
+    assert "FOR UPDATE SKIP LOCKED" in sql
+    assert "RETURNING" in sql
+
+
+def test_claimed_alerts_are_not_claimed_again(db):
+    first = alerts_api.claim_alerts(db, 3)
+    second = alerts_api.claim_alerts(db, 10)
+
+    assert [alert.id for alert in first] == [1, 2, 3]
+    assert [alert.id for alert in second] == [4, 5]
+    assert set(statuses(db).values()) == {"sending"}
+
+
+def test_overlapping_dispatches_send_each_alert_once(db, monkeypatch):
+    sent = []
+
+    async def send_bulk_email(messages):
+        # Yield so the other dispatch runs while this one is sending
+        await asyncio.sleep(0.01)
+        sent.extend(message["recipients"][0] for message in messages)
+        return [{"status": "sent", "error": None} for _ in messages]
+
+    monkeypatch.setattr(alerts_api, "send_bulk_email", send_bulk_email)
+
+    async def dispatch_twice():
+        return await asyncio.gather(alerts_api.dispatch_alerts(db, 3), alerts_api.dispatch_alerts(db, 3))
+
+    summaries = asyncio.run(dispatch_twice())
+
+    assert sorted(sent) == sorted(f"p{index}@example.com" for index in range(1, 6))
+    assert sum(summary["sent"] for summary in summaries) == 5
+    assert set(statuses(db).values()) == {"sent"}
+
+
+def test_unconfigured_mail_requeues_claimed_alerts(db, monkeypatch):
+    async def send_bulk_email(messages):
+        raise ConnectionError("Mail service is not configured")
+
+    monkeypatch.setattr(alerts_api, "send_bulk_email", send_bulk_email)
+
+    with pytest.raises(HTTPException) as error:
+        asyncio.run(alerts_api.dispatch_alerts(db, 10))
+
+    assert error.value.status_code == 503
+    assert set(statuses(db).values()) == {"queued"}
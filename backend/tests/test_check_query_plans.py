@@ -0,0 +1,89 @@
+from datetime import datetime, timedelta, timezone
+
+from scripts import check_query_plans
+from scripts.check_query_plans import Statement, StatementRecorder, check_nodes
+
+START = datetime(2024, 1, 8, tzinfo=timezone.utc)
+END = START + timedelta(days=1)
+
+
+def chunk_plan(name):
+    return {"Node Type": "Custom Scan", "Plans": [{"Node Type": "Index Scan", "Relation Name": name}]}
+
+
+def test_chunk_starting_at_query_end_is_flagged():
+    chunks = {"_hyper_1_2_chunk": ("raw_data", END, END + timedelta(days=7))}
+    violations = check_nodes(chunk_plan("_hyper_1_2_chunk"), START, END, chunks, {"raw_data"}, {}, 1000)
+    assert violations == [f"chunk _hyper_1_2_chunk [{END} - {END + timedelta(days=7)}) not excluded"]
+
+
+def test_overlapping_chunk_is_allowed():
+    chunks = {"_hyper_1_1_chunk": ("raw_data", START - timedelta(days=7), START + timedelta(hours=1))}
+    assert check_nodes(chunk_plan("_hyper_1_1_chunk"), START, END, chunks, {"raw_data"}, {}, 1000) == []
+
+
+def test_prepared_statements_are_explained_past_the_generic_plan_threshold(monkeypatch):
+    executed = []
+
+    class Cursor:
+        def __enter__(self):
+            return self
+
+        def __exit__(self, *exc):
+            return False
+
+        def execute(self, sql, params=None):
+            executed.append(sql)
+
+        def fetchone(self):
+            return {"QUERY PLAN": [{"Plan": {"Node Type": "Result"}}]}
+
+    class Connection:
+        def cursor(self):
+            return Cursor()
+
+        def rollback(self):
+            pass
+
+    class Manager:
+        def get_connection(self):
+            return Context()
+
+    class Context:
+        def __enter__(self):
+            return Connection()
+
+        def __exit__(self, *exc):
+            return False
+
+    monkeypatch.setattr(check_query_plans, "db_manager", Manager())
+    statement = Statement("SELECT * FROM raw_data WHERE user_id = %s AND timestamp BETWEEN %s AND %s", (1, START, END), True)
+    plans = check_query_plans.explain(statement)
+
+    assert len(plans) == check_query_plans.PREPARED_RUNS > 5
+    assert executed[0] == "PREPARE plan_check AS SELECT * FROM raw_data WHERE user_id = $1 AND timestamp BETWEEN $2 AND $3"
+    assert executed[1:-1] == ["EXPLAIN (FORMAT JSON) EXECUTE plan_check (%s, %s, %s)"] * check_query_plans.PREPARED_RUNS
+    assert executed[-1] == "DEALLOCATE plan_check"
+
+
+def test_recorder_keeps_db_manager_keyword_arguments(monkeypatch):
+    calls = []
+
+    class Manager:
+        prepare_statements = True
+
+        def execute_query(self, query, params=None, **kwargs):
+            calls.append(kwargs)
+            return []
+
+        execute_query_single = execute_query
+
+    manager = Manager()
+    monkeypatch.setattr(check_query_plans, "db_manager", manager)
+    recorder = StatementRecorder()
+    recorder.wrap_db_manager()
+    manager.execute_query("SELECT 1 FROM raw_data", (), query_name="q", prepare=True)
+
+    assert calls == [{"query_name": "q", "prepare": True}]
+    [statement] = recorder.take()
+    assert statement.prepared
@@ -0,0 +1,77 @@
+import psycopg2.errors
+
+from app.core.config import settings
+from app.db.database import DatabaseManager
+
+
+def test_pooled_sessions_force_custom_plans(monkeypatch):
+    monkeypatch.setattr(settings, "DB_PLAN_CACHE_MODE", "force_custom_plan")
+
+    pool = DatabaseManager().connection_pool
+
+    assert pool._connect_kwargs["options"] == "-c plan_cache_mode=force_custom_plan"
+
+
+def test_empty_plan_cache_mode_keeps_the_server_setting(monkeypatch):
+    monkeypatch.setattr(settings, "DB_PLAN_CACHE_MODE", "")
+
+    pool = DatabaseManager().connection_pool
+
+    assert "options" not in pool._connect_kwargs
+
+
+class FakeConnection:
+    def __init__(self):
+        self.prepared = {}
+        self.rollbacks = 0
+
+    def rollback(self):
+        self.rollbacks += 1
+
+
+class FakeCursor:
+    """Records statements; raises `fail` for the next EXECUTE"""
+
+    def __init__(self):
+        self.executed = []
+        self.fail = None
+
+    def execute(self, sql, params=None):
+        self.executed.append((sql, params))
+        if self.fail is not None and sql.startswith("EXECUTE"):
+            error, self.fail = self.fail, None
+            raise error
+
+
+QUERY = "SELECT value FROM raw_data WHERE user_id = %s AND timestamp >= %s"
+
+
+def test_statement_is_prepared_once_per_connection():
+    manager = DatabaseManager()
+    conn, cursor = FakeConnection(), FakeCursor()
+
+    manager.execute_prepared(conn, cursor, QUERY, (1, "2024-01-01"))
+    manager.execute_prepared(conn, cursor, QUERY, (2, "2024-01-02"))
+
+    assert cursor.executed == [
+        ("PREPARE stmt_1 AS SELECT value FROM raw_data WHERE user_id = $1 AND timestamp >= $2", None),
+        ("EXECUTE stmt_1 (%s, %s)", (1, "2024-01-01")),
+        ("EXECUTE stmt_1 (%s, %s)", (2, "2024-01-02")),
+    ]
+
+
+def test_statement_the_server_lost_is_prepared_again():
+    manager = DatabaseManager()
+    conn, cursor = FakeConnection(), FakeCursor()
+    manager.execute_prepared(conn, cursor, QUERY, (1, "2024-01-01"))
+    cursor.executed.clear()
+    cursor.fail = psycopg2.errors.InvalidSqlStatementName()
+
+    manager.execute_prepared(conn, cursor, QUERY, (1, "2024-01-01"))
+
+    assert [sql for sql, _ in cursor.executed] == [
+        "EXECUTE stmt_1 (%s, %s)", "DEALLOCATE ALL",
+        "PREPARE stmt_1 AS SELECT value FROM raw_data WHERE user_id = $1 AND timestamp >= $2",
+        "EXECUTE stmt_1 (%s, %s)",
+    ]
+    assert conn.rollbacks == 1
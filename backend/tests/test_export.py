@@ -0,0 +1,65 @@
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+import pyarrow.parquet as pq
+
+from app.core.config import settings
+from app.services.export import EXPORT_SCHEMAS, ExportStore, write_parquet_part
+
+
+class FakeConnection:
+    """Serves `batches` through fetchmany, as the server-side cursor would"""
+
+    def __init__(self, batches):
+        self.batches = list(batches)
+
+    @contextmanager
+    def cursor(self, name=None):
+        batches = self.batches
+        yield type("Cursor", (), {
+            "itersize": None,
+            "execute": lambda self, query, params: None,
+            "fetchmany": lambda self, size: batches.pop(0) if batches else [],
+        })()
+
+
+def test_parquet_schema_is_fixed_across_batches(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "EXPORT_BATCH_ROWS", 2)
+    at = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    batches = [
+        # Every avg/min/max null, then whole numbers, then fractions
+        [(1, at, None, None, None, 0)],
+        [(1, at, 60, 60, 60, 1)],
+        [(2, at, 61.5, 60.0, 63.0, 2)],
+    ]
+    path = str(tmp_path / "part.parquet")
+
+    rows = write_parquet_part(FakeConnection(batches), "SELECT", {}, path, EXPORT_SCHEMAS["minute"])
+    table = pq.read_table(path)
+
+    assert rows == 3
+    assert table.schema == EXPORT_SCHEMAS["minute"]
+    assert table.column("avg_value").to_pylist() == [None, 60.0, 61.5]
+
+
+def test_retention_never_deletes_running_jobs(tmp_path):
+    store = ExportStore(str(tmp_path), retention=2)
+    running = store.create({})
+    store.update(running["id"], status="running")
+    finished = store.create({})
+    store.update(finished["id"], status="finished")
+    (tmp_path / running["id"]).mkdir()
+
+    newest = store.create({})
+
+    # The running job is older, but the finished one goes
+    assert [job["id"] for job in store.list()] == [newest["id"], running["id"]]
+    assert (tmp_path / running["id"]).exists()
+
+    store.create({})
+    assert store.get(running["id"]) is not None
+
+    # Once it finishes, the store is trimmed back to retention
+    store.update(running["id"], status="finished")
+    assert store.get(running["id"]) is None
+    assert len(store.list()) == 2
@@ -0,0 +1,62 @@
+from datetime import datetime, timezone
+
+from starlette.requests import Request
+from starlette.responses import Response
+
+from app.core.http_cache import conditional_response, negotiate_encoding
+
+VERSION = datetime(2024, 1, 1, 12, 0, 30, 500000, tzinfo=timezone.utc)
+
+
+def make_request(**headers):
+    return Request({
+        "type": "http", "method": "GET", "path": "/api/metrics", "query_string": b"user_id=1",
+        "headers": [(name.replace("_", "-").encode(), value.encode()) for name, value in headers.items()],
+        "route": type("Route", (), {"path": "/api/metrics"})(),
+    })
+
+
+def test_first_request_gets_validators_and_a_normal_answer():
+    response = Response()
+
+    assert conditional_response(make_request(), response, VERSION) is None
+    assert response.headers["etag"].startswith('W/"')
+    assert response.headers["last-modified"] == "Mon, 01 Jan 2024 12:00:30 GMT"
+
+
+def test_matching_etag_is_not_modified():
+    first = Response()
+    conditional_response(make_request(), first, VERSION)
+
+    not_modified = conditional_response(make_request(if_none_match=first.headers["etag"]), Response(), VERSION)
+
+    assert not_modified.status_code == 304
+    assert not_modified.headers["etag"] == first.headers["etag"]
+
+
+def test_new_data_changes_the_etag():
+    first = Response()
+    conditional_response(make_request(), first, VERSION)
+    later = VERSION.replace(minute=5)
+
+    assert conditional_response(make_request(if_none_match=first.headers["etag"]), Response(), later) is None
+
+
+def test_if_modified_since_has_whole_second_precision():
+    since = "Mon, 01 Jan 2024 12:00:30 GMT"
+
+    assert conditional_response(make_request(if_modified_since=since), Response(), VERSION).status_code == 304
+    assert conditional_response(make_request(if_modified_since=since), Response(), VERSION.replace(second=31)) is None
+
+
+def test_unknown_version_sets_nothing():
+    response = Response()
+
+    assert conditional_response(make_request(if_none_match="*"), response, None) is None
+    assert "etag" not in response.headers
+
+
+def test_encoding_follows_q_values_then_preference():
+    assert negotiate_encoding("gzip, br, zstd") == "zstd"
+    assert negotiate_encoding("gzip;q=1, zstd;q=0.5") == "gzip"
+    assert negotiate_encoding("identity") is None
@@ -0,0 +1,47 @@
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+import pytest
+
+from app.db import catalog
+from app.services import imputation
+
+
+class FailingCommitSession:
+    """Returns two points a gap apart, then fails the commit"""
+
+    def __init__(self, points):
+        self.points = points
+        self.executed = []
+
+    def query(self, *entities):
+        points = self.points
+        chain = SimpleNamespace(all=lambda: points)
+        chain.execution_options = chain.filter = chain.order_by = lambda *args, **kwargs: chain
+        return chain
+
+    def add_all(self, rows):
+        self.added = rows
+
+    def execute(self, statement, *args, **kwargs):
+        self.executed.append(statement)
+
+    def commit(self):
+        raise ConnectionError("connection lost during COMMIT")
+
+
+def test_failed_commit_still_invalidates_the_freshness_snapshot(monkeypatch):
+    monkeypatch.setitem(catalog._metric_ids, 'heart_rate', 7)
+    monkeypatch.setattr(imputation, 'notify_appended', lambda *args: None)
+    monkeypatch.setattr(imputation.freshness_snapshot, '_loaded_at', 1.0)
+    start = datetime(2024, 1, 1)
+    db = FailingCommitSession([
+        SimpleNamespace(timestamp=start, value=60.0),
+        SimpleNamespace(timestamp=start + timedelta(minutes=3), value=63.0),
+    ])
+
+    with pytest.raises(ConnectionError):
+        imputation.impute_linear_interpolation(db, 1, 'heart_rate', start, start + timedelta(hours=1), frequency='1min')
+
+    assert [point.value for point in db.added] == [61.0, 62.0]
+    assert imputation.freshness_snapshot._loaded_at is None
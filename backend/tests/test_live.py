@@ -0,0 +1,112 @@
+import asyncio
+import socket
+import threading
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from app.core.config import settings
+from app.db import catalog
+from app.services import live
+
+HEART_RATE_ID = 7
+SPO2_ID = 8
+STEPS_ID = 3
+
+
+class FakeListenConnection:
+    def __init__(self, sock):
+        self.sock = sock
+        self.thread = threading.get_ident()
+        self.executed = []
+
+    def set_isolation_level(self, level):
+        pass
+
+    def cursor(self):
+        executed = self.executed
+
+        class Cursor:
+            def __enter__(self):
+                return self
+
+            def __exit__(self, *args):
+                pass
+
+            def execute(self, sql):
+                executed.append(sql)
+
+        return Cursor()
+
+    def fileno(self):
+        return self.sock.fileno()
+
+    def close(self):
+        pass
+
+
+def test_start_connects_off_the_event_loop(monkeypatch):
+    reader, writer = socket.socketpair()
+    monkeypatch.setattr(live.psycopg2, "connect", lambda **kwargs: FakeListenConnection(reader))
+    broker = live.MetricBroker("metric_appended", 10)
+
+    async def start():
+        await broker.start()
+        conn = broker._conn
+        await broker.stop()
+        return threading.get_ident(), conn
+
+    try:
+        loop_thread, conn = asyncio.run(start())
+    finally:
+        reader.close()
+        writer.close()
+
+    assert conn.thread != loop_thread
+    assert conn.executed == ["LISTEN metric_appended"]
+
+
+@pytest.fixture
+def queries(monkeypatch):
+    monkeypatch.setitem(catalog._metric_ids, "heart_rate", HEART_RATE_ID)
+    monkeypatch.setitem(catalog._metric_ids, "spo2", SPO2_ID)
+    start = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    executed = []
+
+    def execute_query(sql, params, query_name, table):
+        executed.append((table, sql, params))
+        if table == "raw_data_minute":
+            return [{"user_id": 1, "metric_id": HEART_RATE_ID, "timestamp": start + timedelta(minutes=minute),
+                     "value": 60.0 + minute, "is_imputed": False} for minute in (0, 2)]
+        # An imputed heart rate point, which still goes to raw_data, and a narrow metric
+        return [
+            {"user_id": 1, "metric_id": HEART_RATE_ID, "timestamp": start + timedelta(minutes=1), "value": 61.0, "is_imputed": True},
+            {"user_id": 1, "metric_id": STEPS_ID, "timestamp": start, "value": 12.0, "is_imputed": False},
+        ]
+
+    monkeypatch.setattr(live.db_manager, "execute_query", execute_query)
+    return executed
+
+
+def test_wide_layout_reads_minute_metrics_from_raw_data_minute(queries, monkeypatch):
+    monkeypatch.setattr(settings, "INGEST_LAYOUT", "wide")
+    entries = [[1, HEART_RATE_ID, 1704067200, 1704067320], [1, STEPS_ID, 1704067200, 1704067200]]
+
+    rows = live.read_appended(entries)
+
+    assert [table for table, _, _ in queries] == ["raw_data", "raw_data_minute"]
+    _, sql, params = queries[1]
+    assert "m.heart_rate AS value" in sql
+    # Only the heart rate pair is looked up in the wide table
+    assert params == ([1], [HEART_RATE_ID], [1704067200], [1704067320])
+    assert [(row["metric_id"], row["value"]) for row in rows] == [
+        (STEPS_ID, 12.0), (HEART_RATE_ID, 60.0), (HEART_RATE_ID, 61.0), (HEART_RATE_ID, 62.0),
+    ]
+
+
+def test_narrow_layout_reads_raw_data_only(queries, monkeypatch):
+    monkeypatch.setattr(settings, "INGEST_LAYOUT", "narrow")
+
+    live.read_appended([[1, HEART_RATE_ID, 1704067200, 1704067320]])
+
+    assert [table for table, _, _ in queries] == ["raw_data"]
@@ -0,0 +1,51 @@
+import asyncio
+import threading
+
+import pytest
+from sqlalchemy import MetaData, create_engine, event
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from app.api import participants as participants_api
+from app.models.communication_log import CommunicationLog
+from app.models.participant import Participant
+
+
+@pytest.fixture
+def db():
+    # One connection, shared with the threadpool
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    # One metadata so the communication_logs foreign key finds participants
+    metadata = MetaData()
+    for model in (Participant, CommunicationLog):
+        model.__table__.to_metadata(metadata)
+    metadata.create_all(engine)
+    session = sessionmaker(bind=engine)()
+    session.add(Participant(id=1, email="p1@example.com"))
+    session.commit()
+    threads = []
+    event.listen(engine, "before_cursor_execute", lambda *args: threads.append(threading.get_ident()))
+    yield session, threads
+    session.close()
+
+
+def test_contact_keeps_database_work_off_the_event_loop(db, monkeypatch):
+    session, threads = db
+    sent = []
+
+    async def send_email(subject, recipients, body):
+        sent.append((threading.get_ident(), recipients))
+
+    monkeypatch.setattr(participants_api, "send_email", send_email)
+
+    async def contact():
+        loop_thread = threading.get_ident()
+        email = participants_api.EmailSchema(subject="Hi", body="Please sync")
+        return loop_thread, await participants_api.contact_participant(1, email, session)
+
+    loop_thread, response = asyncio.run(contact())
+
+    assert response == {"message": "Email sent successfully"}
+    assert sent == [(loop_thread, ["p1@example.com"])]
+    assert threads and loop_thread not in threads
+    assert session.query(CommunicationLog.email_status).all() == [("sent",)]
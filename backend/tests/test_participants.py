@@ -0,0 +1,41 @@
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.models.participant import Participant
+from app.services.participants import filtered_keyset_page
+
+
+@pytest.fixture
+def db():
+    engine = create_engine("sqlite://")
+    Participant.__table__.create(engine)
+    session = sessionmaker(bind=engine)()
+    session.add_all(Participant(id=index, email=f"p{index}@example.com") for index in range(1, 11))
+    session.commit()
+    yield session
+    session.close()
+
+
+def every_page(db, limit, keep):
+    pages, cursor = [], None
+    while True:
+        entries, cursor = filtered_keyset_page(db.query(Participant.id), cursor, limit, keep)
+        pages.append(entries)
+        if cursor is None:
+            return pages
+
+
+def test_filtered_pages_are_full_until_the_last(db):
+    # Only even ids pass, as a computed filter such as adherence_below would
+    pages = every_page(db, 2, lambda row: row.id if row.id % 2 == 0 else None)
+
+    assert pages == [[2, 4], [6, 8], [10]]
+
+
+def test_no_rows_passing_ends_on_one_empty_page(db):
+    assert every_page(db, 3, lambda row: None) == [[]]
+
+
+def test_unfiltered_pages_match_keyset_page(db):
+    assert every_page(db, 4, lambda row: row.id) == [[1, 2, 3, 4], [5, 6, 7, 8], [9, 10]]
@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+"""
+Backfill raw_data from the Arrow staging area.
+
+Stages any exports that changed since they were last converted (unless
+--no-stage), then writes the staged points for the selected participants,
+metrics and date range through the same bulk path as a normal ingestion run.
+Already stored points are skipped, so a range can be replayed safely.
+
+Usage (from the repository root, DB_* environment variables point at the
+target database):
+
+    python -m ingest.backfill --start 2024-01-01 --end 2024-01-31 --users 1 2 --metrics heart_rate
+"""
+
+import argparse
+import time
+from datetime import date
+
+from ingest import ingest
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--data-dir', default=ingest.DATA_DIR)
+    parser.add_argument('--staging-dir', default=ingest.STAGING_DIR)
+    parser.add_argument('--start', type=date.fromisoformat, default=None, help='First day to write (inclusive)')
+    parser.add_argument('--end', type=date.fromisoformat, default=None, help='Last day to write (inclusive)')
+    parser.add_argument('--users', type=int, nargs='*', default=None)
+    parser.add_argument('--metrics', nargs='*', default=None)
+    parser.add_argument('--no-stage', action='store_true', help='Use the staging area as is, without converting changed exports')
+    parser.add_argument('--stage-only', action='store_true', help='Convert changed exports and stop')
+    args = parser.parse_args()
+
+    report = ingest.RunReport(args.data_dir)
+    if not args.no_stage:
+        ingest.stage_exports(args.data_dir, args.staging_dir, report)
+    if args.stage_only:
+        return
+
+    start = time.perf_counter()
+    batches = ingest.load_staged(args.staging_dir, args.users, args.metrics, args.start, args.end, report)
+    conn = ingest.get_db_connection()
+    cursor = ingest.ensure_schema(conn)
+    inserted = 0
+    for stats, batch in batches:
+        inserted += ingest.write_batch(cursor, batch, stats)
+    conn.commit()
+    cursor.close()
+    conn.close()
+
+    points = sum(len(batch) for _, batch in batches)
+    report.finish('success')
+    print(f"Backfilled {inserted} new of {points} staged points in {time.perf_counter() - start:.2f}s")
+    print(f"Run report saved to {report.save()}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+"""
+End-to-end ingestion benchmark.
+
+Generates a synthetic cohort (or uses an existing export directory), then
+measures parse rows/sec, write rows/sec, end-to-end time of run_ingestion_job
+and peak RSS. Each run is appended to a JSON-lines results file and compared
+with the previous run for the same cohort size, so regressions are visible.
+
+Usage (from the repository root, DB_* environment variables point at a
+disposable database; --truncate empties raw_data before each write phase;
+INGEST_LAYOUT selects the storage layout being measured):
+
+    python -m ingest.benchmark --participants 10 --days 30 --truncate
+"""
+
+import argparse
+import json
+import os
+import resource
+import subprocess
+import tempfile
+import time
+from datetime import datetime
+
+from ingest import ingest
+from ingest.generate_data import generate
+
+RESULTS_FILE = 'ingest/benchmarks/results.jsonl'
+COMPARED_METRICS = ['parse_rows_per_sec', 'write_rows_per_sec', 'end_to_end_seconds', 'peak_rss_mb']
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], text=True, stderr=subprocess.DEVNULL).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def peak_rss_mb():
+    # ru_maxrss is reported in kilobytes on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def truncate_raw_data():
+    conn = ingest.get_db_connection()
+    cursor = ingest.ensure_schema(conn)
+    cursor.execute("TRUNCATE raw_data")
+    if ingest.INGEST_LAYOUT != 'narrow':
+        cursor.execute("TRUNCATE raw_data_minute")
+    conn.commit()
+    cursor.close()
+    conn.close()
+
+
+def run_benchmark(data_dir, truncate):
+    result = {}
+
+    start = time.perf_counter()
+    batches = ingest.parse_batches(data_dir)
+    parse_seconds = time.perf_counter() - start
+    rows = sum(len(batch) for _, batch in batches)
+    result['rows'] = rows
+    result['parse_seconds'] = round(parse_seconds, 3)
+    result['parse_rows_per_sec'] = round(rows / parse_seconds, 1) if parse_seconds else None
+
+    if truncate:
+        truncate_raw_data()
+    conn = ingest.get_db_connection()
+    cursor = ingest.ensure_schema(conn)
+    start = time.perf_counter()
+    for _, batch in batches:
+        ingest.write_batch(cursor, batch)
+    conn.commit()
+    write_seconds = time.perf_counter() - start
+    cursor.close()
+    conn.close()
+    result['write_seconds'] = round(write_seconds, 3)
+    result['write_rows_per_sec'] = round(rows / write_seconds, 1) if write_seconds else None
+    del batches
+
+    if truncate:
+        truncate_raw_data()
+    start = time.perf_counter()
+    outcome = ingest.run_ingestion_job(data_dir)
+    result['end_to_end_seconds'] = round(time.perf_counter() - start, 3)
+    result['end_to_end_result'] = outcome
+
+    result['peak_rss_mb'] = round(peak_rss_mb(), 1)
+    return result
+
+
+def previous_run(results_file, params):
+    if not os.path.exists(results_file):
+        return None
+    previous = None
+    with open(results_file) as file:
+        for line in file:
+            entry = json.loads(line)
+            if entry.get('params') == params:
+                previous = entry
+    return previous
+
+
+def print_report(entry, previous):
+    print(f"{'metric':<22}{'this run':>14}{'previous':>14}{'change':>10}")
+    for metric in COMPARED_METRICS:
+        current = entry['metrics'].get(metric)
+        before = previous['metrics'].get(metric) if previous else None
+        change = f"{100.0 * (current - before) / before:+.1f}%" if current and before else ''
+        print(f"{metric:<22}{current if current is not None else '-':>14}{before if before is not None else '-':>14}{change:>10}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--participants', type=int, default=5)
+    parser.add_argument('--days', type=int, default=14)
+    parser.add_argument('--data-dir', default=None, help='Benchmark an existing export directory instead of generating one')
+    parser.add_argument('--truncate', action='store_true', help='Empty raw_data before each write phase')
+    parser.add_argument('--results', default=RESULTS_FILE)
+    parser.add_argument('--label', default=None, help='Free-form note stored with the run')
+    args = parser.parse_args()
+
+    if args.data_dir:
+        params = {'data_dir': args.data_dir, 'layout': ingest.INGEST_LAYOUT}
+        metrics = run_benchmark(args.data_dir, args.truncate)
+    else:
+        params = {'participants': args.participants, 'days': args.days, 'layout': ingest.INGEST_LAYOUT}
+        with tempfile.TemporaryDirectory() as data_dir:
+            generate(data_dir, args.participants, args.days)
+            metrics = run_benchmark(data_dir, args.truncate)
+
+    entry = {
+        'timestamp': datetime.now().isoformat(timespec='seconds'),
+        'revision': git_revision(),
+        'label': args.label,
+        'params': params,
+        'metrics': metrics,
+    }
+    previous = previous_run(args.results, params)
+    os.makedirs(os.path.dirname(args.results) or '.', exist_ok=True)
+    with open(args.results, 'a') as file:
+        file.write(json.dumps(entry) + '\n')
+
+    print_report(entry, previous)
+    print(f"Results appended to {args.results}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+"""
+Synthetic Fitbit export generator.
+
+Writes heart_rate.csv, spo2.csv, breathing_rate.csv, hrv.csv,
+active_zone_minutes.csv, activity.csv and sleep.csv for N participants x M days, in the
+same shape as the real exports (stringified lists of dicts with np.float64(...)
+wrapped values), one user_<id>/ directory per participant.
+
+Usage (from the repository root):
+
+    python -m ingest.generate_data --participants 10 --days 30 --out ingest/data
+"""
+
+import argparse
+import csv
+import math
+import os
+import random
+from datetime import date, datetime, timedelta
+
+csv.field_size_limit(2147483647)
+
+BREATHING_STAGES = ['deepSleepSummary', 'remSleepSummary', 'fullSleepSummary', 'lightSleepSummary']
+ZONES = ['activeZoneMinutes', 'fatBurnActiveZoneMinutes', 'cardioActiveZoneMinutes', 'peakActiveZoneMinutes']
+
+
+class NpFloat(float):
+    """float whose repr matches numpy>=2 scalars, reproducing the np.float64(...) quirk in the exports"""
+
+    def __repr__(self):
+        return f"np.float64({float.__repr__(self)})"
+
+
+def wear_mask(rng, minutes=1440, wear_ratio=0.85):
+    """Per-minute worn/not-worn flags with a few contiguous off-wrist gaps"""
+    mask = [True] * minutes
+    missing = int(minutes * (1 - wear_ratio))
+    while missing > 0:
+        length = min(missing, rng.randint(15, 180))
+        start = rng.randrange(0, minutes - length)
+        for i in range(start, start + length):
+            mask[i] = False
+        missing -= length
+    return mask
+
+
+def heart_rate_row(rng, day, resting):
+    dataset = []
+    for minute, worn in enumerate(wear_mask(rng)):
+        if not worn:
+            continue
+        # Lower overnight, peaking in the afternoon
+        circadian = 12 * math.sin((minute / 1440 - 0.3) * 2 * math.pi)
+        value = int(resting + 10 + circadian + rng.gauss(0, 4))
+        dataset.append({'time': f"{minute // 60:02d}:{minute % 60:02d}:00", 'value': value})
+    intraday = [{'dataset': dataset, 'datasetInterval': 1, 'datasetType': 'minute'}]
+    return {'dateTime': day.isoformat(), 'activities-heart-intraday': repr(intraday)}
+
+
+def spo2_row(rng, day):
+    minutes = []
+    # SpO2 is only sampled while asleep, roughly midnight to 7am
+    for minute in range(0, 7 * 60):
+        if rng.random() < 0.1:
+            continue
+        ts = datetime.combine(day, datetime.min.time()) + timedelta(minutes=minute)
+        minutes.append({'value': NpFloat(round(rng.gauss(96, 1.2), 1)), 'minute': ts.isoformat()})
+    return {'dateTime': day.isoformat(), 'minutes': repr(minutes)}
+
+
+def breathing_rate_row(rng, day):
+    value = {stage: {'breathingRate': NpFloat(round(rng.gauss(15, 1.5), 1))} for stage in BREATHING_STAGES}
+    return {'br': repr([{'dateTime': day.isoformat(), 'value': value}])}
+
+
+def hrv_row(rng, day):
+    return {'dateTime': day.isoformat(), 'hrv': repr([{'dateTime': day.isoformat(), 'value': NpFloat(round(rng.gauss(40, 8), 2))}])}
+
+
+def active_zone_minutes_row(rng, day):
+    fat_burn = rng.randint(0, 60)
+    cardio = rng.randint(0, 30)
+    peak = rng.randint(0, 10)
+    value = {
+        'activeZoneMinutes': fat_burn + 2 * (cardio + peak),
+        'fatBurnActiveZoneMinutes': fat_burn,
+        'cardioActiveZoneMinutes': cardio,
+        'peakActiveZoneMinutes': peak,
+    }
+    return {'dateTime': day.isoformat(), 'activities-active-zone-minutes': repr([{'dateTime': day.isoformat(), 'value': value}])}
+
+
+def sleep_row(rng, day):
+    # Stage minutes of one main sleep ending on `day`, in the Fitbit sleep log shape
+    stages = {'deep': rng.randint(40, 110), 'light': rng.randint(180, 280), 'rem': rng.randint(60, 120), 'wake': rng.randint(20, 70)}
+    asleep = stages['deep'] + stages['light'] + stages['rem']
+    in_bed = asleep + stages['wake']
+    end = datetime.combine(day, datetime.min.time()) + timedelta(hours=6, minutes=rng.randint(0, 120))
+    start = end - timedelta(minutes=in_bed)
+    log = {
+        'dateOfSleep': day.isoformat(),
+        'logId': int(end.timestamp()),
+        'isMainSleep': True,
+        'type': 'stages',
+        'startTime': start.isoformat(timespec='milliseconds'),
+        'endTime': end.isoformat(timespec='milliseconds'),
+        'timeInBed': in_bed,
+        'minutesAsleep': asleep,
+        'minutesAwake': stages['wake'],
+        'efficiency': NpFloat(round(100.0 * asleep / in_bed)),
+        'levels': {'summary': {stage: {'count': rng.randint(1, 30), 'minutes': minutes} for stage, minutes in stages.items()}},
+    }
+    return {'dateTime': day.isoformat(), 'sleep': repr([log])}
+
+
+def activity_row(rng, day):
+    return {'dateTime': day.isoformat(), 'value': max(0, int(rng.gauss(8000, 3000)))}
+
+
+FILES = {
+    'heart_rate.csv': (['dateTime', 'activities-heart-intraday'], lambda rng, day, p: heart_rate_row(rng, day, p['resting'])),
+    'spo2.csv': (['dateTime', 'minutes'], lambda rng, day, p: spo2_row(rng, day)),
+    'breathing_rate.csv': (['br'], lambda rng, day, p: breathing_rate_row(rng, day)),
+    'hrv.csv': (['dateTime', 'hrv'], lambda rng, day, p: hrv_row(rng, day)),
+    'active_zone_minutes.csv': (['dateTime', 'activities-active-zone-minutes'], lambda rng, day, p: active_zone_minutes_row(rng, day)),
+    'activity.csv': (['dateTime', 'value'], lambda rng, day, p: activity_row(rng, day)),
+    'sleep.csv': (['dateTime', 'sleep'], lambda rng, day, p: sleep_row(rng, day)),
+}
+
+
+def generate(out_dir, participants, days, start=None, seed=0):
+    """Write the export files for every participant; returns the number of CSV rows written"""
+    start = start or date.today() - timedelta(days=days)
+    written = 0
+    for user_id in range(1, participants + 1):
+        rng = random.Random(seed * 100003 + user_id)
+        profile = {'resting': rng.randint(52, 75)}
+        user_dir = os.path.join(out_dir, f"user_{user_id}")
+        os.makedirs(user_dir, exist_ok=True)
+        for filename, (columns, make_row) in FILES.items():
+            with open(os.path.join(user_dir, filename), 'w', newline='') as file:
+                writer = csv.DictWriter(file, fieldnames=columns)
+                writer.writeheader()
+                for offset in range(days):
+                    writer.writerow(make_row(rng, start + timedelta(days=offset), profile))
+                    written += 1
+    return written
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--participants', type=int, default=1)
+    parser.add_argument('--days', type=int, default=30)
+    parser.add_argument('--out', default='ingest/data')
+    parser.add_argument('--start', type=date.fromisoformat, default=None, help='First day (default: DAYS ago)')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    written = generate(args.out, args.participants, args.days, args.start, args.seed)
+    print(f"Wrote {written} CSV rows for {args.participants} participants x {args.days} days to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
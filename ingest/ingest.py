@@ -1,20 +1,33 @@
-import csv
+import hashlib
 import json
+import mmap
 import psycopg2
+from psycopg2.extras import execute_values
 import os
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
 import ast
 import re
 import threading
+import cProfile
+import io
+import marshal
+import pstats
+import sys
+import uuid
+import warnings
+import zlib
+import shutil
+import numpy as np
+import pyarrow as pa
+from collections import Counter as StackCounter, OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Optional
 from prometheus_client import Counter, Histogram, Gauge, start_http_server
 import time
-from fastapi import FastAPI
-from fastapi.responses import PlainTextResponse
+from fastapi import FastAPI, Header, HTTPException, Query
+from fastapi.responses import PlainTextResponse, Response
 import uvicorn
 
-# Increase CSV field size limit for large files
-csv.field_size_limit(2147483647)
-
 # Prometheus metrics
 ingestion_error_count = Counter(
     'ingestion_error_count', 'Number of ingestion errors encountered by the ingestion script')
@@ -22,6 +35,69 @@ ingestion_latency_seconds = Histogram(
     'ingestion_latency_seconds', 'Latency of ingestion process in seconds')
 ingestion_rows_total = Gauge(
     'ingestion_rows_total', 'Total number of rows ingested in the last run')
+ingestion_phase_seconds = Histogram(
+    'ingestion_phase_seconds', 'Time spent per file in each ingestion phase (parse, eval, timestamp, write)',
+    ['file', 'phase'])
+ingestion_file_bytes_total = Counter(
+    'ingestion_file_bytes_total', 'Bytes read from each export file', ['file'])
+ingestion_file_rows_parsed_total = Counter(
+    'ingestion_file_rows_parsed_total', 'Data points parsed from each export file', ['file'])
+ingestion_rows_rejected_total = Counter(
+    'ingestion_rows_rejected_total', 'Rows or data points rejected while parsing, by reason', ['file', 'reason'])
+ingestion_rows_written_total = Counter(
+    'ingestion_rows_written_total', 'Rows written to raw_data, by outcome (inserted or duplicate)', ['file', 'outcome'])
+
+# Directory holding the Fitbit CSV exports. Either a flat directory (single participant,
+# user_id 1) or one user_<id>/ subdirectory per participant.
+DATA_DIR = os.environ.get('INGEST_DATA_DIR', 'ingest/data')
+
+# Directory where a structured JSON report is saved for every ingestion run
+REPORT_DIR = os.environ.get('INGEST_REPORT_DIR', 'ingest/reports')
+
+# On-demand profiling of ingestion runs (X-Profile header on /run_ingestion); off by default
+PROFILING_ENABLED = os.environ.get('PROFILING_ENABLED', 'False').lower() == 'true'
+PROFILE_RETENTION = int(os.environ.get('PROFILE_RETENTION', '20'))
+PROFILE_SAMPLE_INTERVAL = float(os.environ.get('PROFILE_SAMPLE_INTERVAL', '0.005'))
+
+# Arrow IPC staging area: each raw export is converted once into per user/metric/day
+# files, and runs with INGEST_USE_STAGING read those instead of re-parsing the CSVs
+STAGING_DIR = os.environ.get('INGEST_STAGING_DIR', 'ingest/staging')
+USE_STAGING = os.environ.get('INGEST_USE_STAGING', 'False').lower() == 'true'
+STAGING_SCHEMA = pa.schema([('epoch', pa.int64()), ('value', pa.float64())])
+
+# Parser processes used by parse_batches; 1 parses every file in-process
+INGEST_WORKERS = int(os.environ.get('INGEST_WORKERS', '1'))
+
+# With several workers, files larger than this are split at row boundaries across them
+INGEST_SPLIT_BYTES = int(os.environ.get('INGEST_SPLIT_BYTES', str(64 * 1024 * 1024)))
+
+# Rows that lose data to a reject are kept in ingest_dead_letters for replay, up to this
+# many per file and run. Empty days are normal in the exports and are not dead-lettered.
+DEAD_LETTER_LIMIT = int(os.environ.get('INGEST_DEAD_LETTER_LIMIT', '10000'))
+DEAD_LETTER_IGNORED_REASONS = {'empty_payload'}
+
+# NOTIFY channel the backend listens on to push newly written points to live subscribers
+APPEND_CHANNEL = os.environ.get('INGEST_APPEND_CHANNEL', 'metric_appended')
+
+# Evaluate the adherence alert rules for the participant-days touched by each run
+ALERTS_ENABLED = os.environ.get('INGEST_ALERTS_ENABLED', 'True').lower() == 'true'
+
+# Intraday metrics sampled per minute, stored one column each in the wide raw_data_minute table
+MINUTE_METRICS = ['heart_rate', 'spo2']
+
+# Where MINUTE_METRICS are written: 'narrow' (raw_data only), 'wide' (raw_data_minute
+# only) or 'both'. Every other metric always goes to raw_data.
+INGEST_LAYOUT = os.environ.get('INGEST_LAYOUT', 'narrow')
+
+# Single-column indexes created by earlier deployments (SQLAlchemy defaults and the
+# hypertable's default time index), superseded by ix_raw_data_user_metric_ts
+RAW_DATA_LEGACY_INDEXES = [
+    'ix_raw_data_user_id',
+    'ix_raw_data_timestamp',
+    'ix_raw_data_metric_name',
+    'ix_raw_data_is_imputed',
+    'raw_data_timestamp_idx',
+]
 
 def convert_np_float64(value_str):
     """Convert np.float64 string to float"""
@@ -45,267 +121,644 @@ def safe_eval_list(value_str):
     except (ValueError, SyntaxError):
         return []
 
-def process_activity():
-    """Process activity.csv file"""
-    rows = []
-    try:
-        with open('ingest/data/activity.csv', 'r') as file:
-            reader = csv.DictReader(file)
-            for row in reader:
-                timestamp = datetime.fromisoformat(row['dateTime'].replace('Z', '+00:00'))
-                value = float(row['value'])
-                rows.append({
-                    'user_id': 1,
-                    'timestamp': timestamp,
-                    'metric_name': 'activity',
-                    'value': value
-                })
-    except Exception as e:
-        print(f"Error processing activity.csv: {e}")
-    return rows
+class FileStats:
+    """Per-file counters and phase timings for one ingestion run"""
 
-def process_breathing_rate():
-    """Process breathing_rate.csv file"""
-    rows = []
-    try:
-        with open('ingest/data/breathing_rate.csv', 'r') as file:
-            reader = csv.DictReader(file)
-            for row in reader:
-                try:
-                    # Parse the stringified list of dictionaries
-                    br_data = safe_eval_list(row['br'])
-                    if not br_data:
-                        continue
-                    
-                    # Extract timestamp from the first item
-                    timestamp_str = br_data[0].get('dateTime', '')
-                    if not timestamp_str:
-                        continue
-                    
-                    timestamp = datetime.fromisoformat(timestamp_str.replace('Z', '+00:00'))
-                    
-                    # Extract breathing rate values from different sleep stages
-                    for item in br_data:
-                        if 'value' in item and isinstance(item['value'], dict):
-                            for stage, rate_data in item['value'].items():
-                                if isinstance(rate_data, dict) and 'breathingRate' in rate_data:
-                                    rate = convert_np_float64(rate_data['breathingRate'])
-                                    if isinstance(rate, (int, float)):
-                                        rows.append({
-                                            'user_id': 1,
-                                            'timestamp': timestamp,
-                                            'metric_name': f'breathing_rate_{stage}',
-                                            'value': float(rate)
-                                        })
-                                elif isinstance(rate_data, (int, float)):
-                                    # Handle case where breathingRate is directly a number
-                                    rate = convert_np_float64(rate_data)
-                                    if isinstance(rate, (int, float)):
-                                        rows.append({
-                                            'user_id': 1,
-                                            'timestamp': timestamp,
-                                            'metric_name': f'breathing_rate_{stage}',
-                                            'value': float(rate)
-                                        })
-                except Exception as e:
-                    print(f"Error processing breathing rate row: {e}")
-                    continue
-    except Exception as e:
-        print(f"Error processing breathing_rate.csv: {e}")
-    return rows
+    def __init__(self, filename):
+        self.filename = filename
+        self.files_read = 0
+        self.read_bytes = 0
+        self.rows_read = 0
+        self.rows_parsed = 0
+        self.rejected = {}
+        self.parse_seconds = 0.0
+        self.eval_seconds = 0.0
+        self.timestamp_seconds = 0.0
+        self.write_seconds = 0.0
+        self.rows_inserted = 0
+        self.rows_duplicate = 0
+        self.minute_rows_written = 0
+        self.staged_rows = 0
+        self.dead_letters = []
+        self.dead_letters_dropped = 0
+        self.row_reasons = set()
+        self.row_error = None
+        self.errors = []
+
+    def reject(self, reason, error=None, count=1):
+        self.rejected[reason] = self.rejected.get(reason, 0) + count
+        self.row_reasons.add(reason)
+        if error is not None:
+            self.row_error = error
+            print(f"Error processing {self.filename} row: {error}")
+
+    def merge(self, other):
+        """Add the counters and timings of another FileStats (e.g. from a parser process)"""
+        for key, value in vars(other).items():
+            if isinstance(value, (int, float)) and not isinstance(value, bool):
+                setattr(self, key, getattr(self, key) + value)
+        for reason, count in other.rejected.items():
+            self.rejected[reason] = self.rejected.get(reason, 0) + count
+        self.errors.extend(other.errors)
+        self.dead_letters.extend(other.dead_letters)
+
+    def capture_dead_letter(self, user_id, row, error=None):
+        """Keep a CSV row that lost data to a reject, with its reasons, for the dead-letter store"""
+        reasons = self.row_reasons - DEAD_LETTER_IGNORED_REASONS
+        error = error if error is not None else self.row_error
+        self.row_reasons, self.row_error = set(), None
+        if not reasons:
+            return
+        if len(self.dead_letters) >= DEAD_LETTER_LIMIT:
+            self.dead_letters_dropped += 1
+            return
+        self.dead_letters.append({
+            'user_id': user_id,
+            'reason': ','.join(sorted(reasons)),
+            'error': str(error)[:500] if error is not None else None,
+            'row': row,
+        })
+
+    def to_dict(self):
+        return {
+            'filename': self.filename,
+            'files_read': self.files_read,
+            'read_bytes': self.read_bytes,
+            'rows_read': self.rows_read,
+            'rows_parsed': self.rows_parsed,
+            'rows_rejected': sum(self.rejected.values()),
+            'rejected_by_reason': dict(self.rejected),
+            'parse_seconds': round(self.parse_seconds, 4),
+            'eval_seconds': round(self.eval_seconds, 4),
+            'timestamp_seconds': round(self.timestamp_seconds, 4),
+            'write_seconds': round(self.write_seconds, 4),
+            'rows_inserted': self.rows_inserted,
+            'rows_duplicate': self.rows_duplicate,
+            'minute_rows_written': self.minute_rows_written,
+            'staged_rows': self.staged_rows,
+            'dead_lettered': len(self.dead_letters),
+            'dead_letters_dropped': self.dead_letters_dropped,
+            'errors': self.errors,
+        }
 
-def process_spo2():
-    """Process spo2.csv file"""
-    rows = []
+class RunReport:
+    """Structured report of one ingestion run, saved as JSON under REPORT_DIR"""
+
+    def __init__(self, data_dir):
+        self.data_dir = data_dir
+        self.started_at = datetime.now()
+        self.finished_at = None
+        self.status = 'running'
+        self.error = None
+        self.files = {}
+
+    def file_stats(self, filename):
+        if filename not in self.files:
+            self.files[filename] = FileStats(filename)
+        return self.files[filename]
+
+    def finish(self, status, error=None):
+        self.finished_at = datetime.now()
+        self.status = status
+        self.error = error
+        for stats in self.files.values():
+            publish_file_stats(stats)
+
+    def to_dict(self):
+        files = [stats.to_dict() for stats in self.files.values()]
+        totals = {}
+        for key in ['read_bytes', 'rows_read', 'rows_parsed', 'rows_rejected', 'parse_seconds',
+                    'eval_seconds', 'timestamp_seconds', 'write_seconds', 'rows_inserted', 'rows_duplicate', 'minute_rows_written', 'staged_rows', 'dead_lettered', 'dead_letters_dropped']:
+            totals[key] = round(sum(f[key] for f in files), 4)
+        finished_at = self.finished_at or datetime.now()
+        return {
+            'started_at': self.started_at.isoformat(),
+            'finished_at': finished_at.isoformat(),
+            'duration_seconds': round((finished_at - self.started_at).total_seconds(), 3),
+            'data_dir': self.data_dir,
+            'status': self.status,
+            'error': self.error,
+            'totals': totals,
+            'files': files,
+        }
+
+    def save(self, report_dir=None):
+        report_dir = report_dir or REPORT_DIR
+        os.makedirs(report_dir, exist_ok=True)
+        path = os.path.join(report_dir, f"run_{self.started_at.strftime('%Y%m%dT%H%M%S')}.json")
+        with open(path, 'w') as file:
+            json.dump(self.to_dict(), file, indent=2)
+        return path
+
+def publish_file_stats(stats):
+    """Export one file's counters and phase timings to Prometheus"""
+    name = stats.filename
+    ingestion_file_bytes_total.labels(name).inc(stats.read_bytes)
+    ingestion_file_rows_parsed_total.labels(name).inc(stats.rows_parsed)
+    for reason, count in stats.rejected.items():
+        ingestion_rows_rejected_total.labels(name, reason).inc(count)
+    ingestion_rows_written_total.labels(name, 'inserted').inc(stats.rows_inserted)
+    ingestion_rows_written_total.labels(name, 'duplicate').inc(stats.rows_duplicate)
+    for phase in ['parse', 'eval', 'timestamp', 'write']:
+        ingestion_phase_seconds.labels(name, phase).observe(getattr(stats, f'{phase}_seconds'))
+
+def parse_payload(value_str, stats):
+    """safe_eval_list with timing; rejects the row (returns None) if nothing usable comes back"""
+    start_time = time.perf_counter()
+    payload = safe_eval_list(value_str)
+    stats.eval_seconds += time.perf_counter() - start_time
+    if not payload:
+        empty = not value_str or value_str.strip() in ('', '[]')
+        stats.reject('empty_payload' if empty else 'unparseable_payload')
+        return None
+    return payload
+
+def fromisoformat(timestamp_str):
+    """datetime.fromisoformat; Fitbit's trailing Z is mapped to +00:00"""
+    return datetime.fromisoformat(timestamp_str.replace('Z', '+00:00'))
+
+def parse_timestamp(timestamp_str, stats):
+    """fromisoformat, timed into stats.timestamp_seconds"""
+    start_time = time.perf_counter()
     try:
-        with open('ingest/data/spo2.csv', 'r') as file:
-            reader = csv.DictReader(file)
-            for row in reader:
-                try:
-                    # Parse the stringified list of dictionaries
-                    minutes_data = safe_eval_list(row['minutes'])
-                    if not minutes_data:
-                        continue
-                    
-                    # Extract timestamp from dateTime column
-                    timestamp_str = row.get('dateTime', '')
-                    if not timestamp_str:
-                        continue
-                    
-                    base_timestamp = datetime.fromisoformat(timestamp_str.replace('Z', '+00:00'))
-                    
-                    # Process each minute's data
-                    for item in minutes_data:
-                        if 'value' in item and 'minute' in item:
-                            value = convert_np_float64(item['value'])
-                            if isinstance(value, (int, float)):
-                                # Create timestamp for this minute
-                                minute_str = item['minute']
-                                try:
-                                    # Parse the full timestamp from minute field
-                                    timestamp = datetime.fromisoformat(minute_str.replace('Z', '+00:00'))
-                                    
-                                    rows.append({
-                                        'user_id': 1,
-                                        'timestamp': timestamp,
-                                        'metric_name': 'spo2',
-                                        'value': float(value)
-                                    })
-                                except (ValueError, AttributeError):
-                                    continue
-                except Exception as e:
-                    print(f"Error processing SPO2 row: {e}")
-                    continue
-    except Exception as e:
-        print(f"Error processing spo2.csv: {e}")
-    return rows
+        return fromisoformat(timestamp_str)
+    finally:
+        stats.timestamp_seconds += time.perf_counter() - start_time
+
+class MappedCSV:
+    """
+    CSV reader over a memory-mapped export. Rows and fields are located as byte offsets
+    with find(), and only the requested columns of a row are decoded, so huge payload
+    cells in other columns are never copied. split() yields row-aligned byte ranges
+    so several workers can parse one file.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.size = os.path.getsize(path)
+        self._file = open(path, 'rb')
+        self.data = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) if self.size else b''
+        header, self.data_start = self._next_row(self._skip_blank(0))
+        self.columns = [self._decode(span) for span in header]
+        if self.columns:
+            self.columns[0] = self.columns[0].lstrip('\ufeff')
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        if self.size:
+            self.data.close()
+        self._file.close()
+
+    def _skip_blank(self, pos):
+        data = self.data
+        while pos < self.size and data[pos] in (0x0A, 0x0D):
+            pos += 1
+        return pos
+
+    def _next_row(self, pos):
+        """(start, end, has_escaped_quotes) spans of the row at pos, and the offset after it"""
+        data, size = self.data, self.size
+        fields = []
+        if pos >= size:
+            return fields, size
+        while True:
+            if data[pos] == 0x22:
+                # Quoted field: jump from quote to quote; "" is an escaped quote
+                end = data.find(b'"', pos + 1)
+                escaped = False
+                while end != -1 and data[end + 1:end + 2] == b'"':
+                    escaped = True
+                    end = data.find(b'"', end + 2)
+                end = size if end == -1 else end
+                fields.append((pos + 1, end, escaped))
+                pos = min(end + 1, size)
+            else:
+                newline = data.find(b'\n', pos)
+                newline = size if newline == -1 else newline
+                comma = data.find(b',', pos, newline)
+                stop = newline if comma == -1 else comma
+                end = stop - 1 if stop > pos and data[stop - 1] == 0x0D else stop
+                fields.append((pos, end, False))
+                pos = stop
+            if pos >= size:
+                return fields, size
+            if data[pos] == 0x2C:
+                pos += 1
+                if pos >= size:
+                    fields.append((size, size, False))
+                    return fields, size
+                continue
+            if data[pos] == 0x0D:
+                pos += 1
+            return fields, self._skip_blank(pos)
+
+    def _decode(self, span):
+        start, end, escaped = span
+        value = self.data[start:end].decode('utf-8')
+        return value.replace('""', '"') if escaped else value
 
-def process_heart_rate():
-    """Process heart_rate.csv file"""
-    rows = []
+    def rows(self, columns=None, byte_range=None):
+        """Yield {column: str} for each data row, decoding only the given columns"""
+        wanted = [(name, self.columns.index(name)) for name in (columns or self.columns) if name in self.columns]
+        pos, stop = byte_range or (self.data_start, self.size)
+        while pos < stop:
+            fields, pos = self._next_row(pos)
+            yield {name: self._decode(fields[index]) for name, index in wanted if index < len(fields)}
+
+    def split(self, parts):
+        """Split the data rows into at most `parts` byte ranges that start and end on row boundaries"""
+        bounds = [self.data_start]
+        pos = self.data_start
+        for part in range(1, parts):
+            target = self.data_start + (self.size - self.data_start) * part // parts
+            while pos < target:
+                _, pos = self._next_row(pos)
+            if bounds[-1] < pos < self.size:
+                bounds.append(pos)
+        bounds.append(self.size)
+        return list(zip(bounds, bounds[1:]))
+
+def open_export(data_dir, filename, stats, byte_range=None):
+    """MappedCSV over an export file; a byte range after the first counts only its own bytes"""
+    reader = MappedCSV(os.path.join(data_dir, filename))
+    first = byte_range is None or byte_range[0] <= reader.data_start
+    stats.files_read += 1 if first else 0
+    stats.read_bytes += (byte_range[1] if byte_range else reader.size) - (0 if first else byte_range[0])
+    return reader
+
+UNIX_EPOCH = datetime(1970, 1, 1)
+
+class PointBatch:
+    """
+    Data points of one metric for one participant as parallel int64 epoch-second and
+    float64 value arrays. Epochs are wall-clock seconds (naive datetimes), so the
+    database reads them in its session time zone, which get_db_connection pins to UTC.
+    """
+
+    def __init__(self, user_id, metric_name, epochs, values):
+        self.user_id = user_id
+        self.metric_name = metric_name
+        self.epochs = epochs
+        self.values = values
+
+    def __len__(self):
+        return len(self.values)
+
+    def __iter__(self):
+        # Row dicts for the row-oriented callers (parse_all); allocates a datetime per point
+        for epoch, value in zip(self.epochs.tolist(), self.values.tolist()):
+            yield {
+                'user_id': self.user_id,
+                'timestamp': UNIX_EPOCH + timedelta(seconds=epoch),
+                'metric_name': self.metric_name,
+                'value': value
+            }
+
+def point_batch(user_id, metric_name, epoch_chunks, value_chunks):
+    """Concatenate per-day arrays into one PointBatch"""
+    if not epoch_chunks:
+        return PointBatch(user_id, metric_name, np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float64))
+    return PointBatch(user_id, metric_name, np.concatenate(epoch_chunks), np.concatenate(value_chunks))
+
+def wall_clock_epoch(timestamp):
+    """Seconds since 1970-01-01 of a datetime's wall-clock time; aware datetimes are taken in UTC"""
+    if timestamp.tzinfo is not None:
+        timestamp = timestamp.astimezone(timezone.utc).replace(tzinfo=None)
+    return (timestamp - UNIX_EPOCH) // timedelta(seconds=1)
+
+def seconds_of_day(times):
+    """Vectorized 'HH:MM:SS' -> seconds since midnight; returns (seconds, valid mask)"""
+    # One extra character so longer strings are caught instead of silently truncated
+    chars = np.array(times, dtype='U9')
+    digits = chars.view(np.uint32).reshape(-1, 9)[:, :8].astype(np.int64) - ord('0')
+    hours = digits[:, 0] * 10 + digits[:, 1]
+    minutes = digits[:, 3] * 10 + digits[:, 4]
+    seconds = digits[:, 6] * 10 + digits[:, 7]
+    numeric = digits[:, [0, 1, 3, 4, 6, 7]]
+    valid = (
+        (np.char.str_len(chars) == 8)
+        & (digits[:, 2] == ord(':') - ord('0')) & (digits[:, 5] == ord(':') - ord('0'))
+        & ((numeric >= 0) & (numeric <= 9)).all(axis=1)
+        & (hours < 24) & (minutes < 60) & (seconds < 60)
+    )
+    return hours * 3600 + minutes * 60 + seconds, valid
+
+def iso_epochs(timestamps):
+    """
+    Vectorized ISO timestamp strings -> int64 wall-clock epochs; returns (epochs, valid mask).
+    Empty, 'NaT' and unparseable strings are invalid. Epochs are whole seconds: fractional
+    seconds are floored, as wall_clock_epoch does. Not timed here: the caller adds the
+    whole call to timestamp_seconds.
+    """
     try:
-        with open('ingest/data/heart_rate.csv', 'r') as file:
-            reader = csv.DictReader(file)
-            for row in reader:
-                try:
-                    # Parse the stringified list of dictionaries
-                    activities_data = safe_eval_list(row.get('activities-heart-intraday', '[]'))
-                    if not activities_data:
-                        continue
-                    
-                    # Extract timestamp from dateTime column
-                    timestamp_str = row.get('dateTime', '')
-                    if not timestamp_str:
-                        continue
-                    
-                    base_timestamp = datetime.fromisoformat(timestamp_str.replace('Z', '+00:00'))
-                    
-                    # Process each activity's data
-                    for activity in activities_data:
-                        if 'dataset' in activity and isinstance(activity['dataset'], list):
-                            for data_point in activity['dataset']:
-                                if 'time' in data_point and 'value' in data_point:
-                                    value = convert_np_float64(data_point['value'])
-                                    if isinstance(value, (int, float)):
-                                        # Create timestamp for this data point
-                                        time_str = data_point['time']
-                                        try:
-                                            hour, minute, second = map(int, time_str.split(':'))
-                                            timestamp = base_timestamp.replace(hour=hour, minute=minute, second=second, microsecond=0)
-                                            
-                                            rows.append({
-                                                'user_id': 1,
-                                                'timestamp': timestamp,
-                                                'metric_name': 'heart_rate',
-                                                'value': float(value)
-                                            })
-                                        except (ValueError, AttributeError):
-                                            continue
-                except Exception as e:
-                    print(f"Error processing heart rate row: {e}")
+        # numpy only warns on UTC offsets; treat that as a miss and take the exact path
+        with warnings.catch_warnings():
+            warnings.simplefilter('error')
+            # Parsed at microseconds so a fractional second is floored here, not truncated by the cast
+            parsed = np.array(timestamps, dtype='datetime64[us]')
+        # numpy reads '' and 'NaT' as NaT (INT64_MIN), which must never reach the database
+        valid = ~np.isnat(parsed) & (np.char.str_len(np.array(timestamps, dtype=str)) > 0)
+        epochs = np.where(valid, parsed.astype(np.int64) // 1_000_000, 0)
+        return epochs, valid
+    except (ValueError, TypeError, DeprecationWarning, UserWarning):
+        pass
+    epochs = np.zeros(len(timestamps), dtype=np.int64)
+    valid = np.zeros(len(timestamps), dtype=bool)
+    for i, timestamp_str in enumerate(timestamps):
+        try:
+            epochs[i] = wall_clock_epoch(fromisoformat(timestamp_str))
+            valid[i] = True
+        except (ValueError, TypeError, AttributeError):
+            continue
+    return epochs, valid
+
+class ParserSpec:
+    """
+    Declarative description of one export file, executed by parse_file.
+
+    column           CSV column with the value, or with a stringified list of dicts (payload)
+    metric           metric name; {key} is replaced by the key when the value is a dict
+    payload          False for plain dateTime,value files
+    path             keys leading from each payload item to its data points; lists found
+                     along the way are flattened (heart rate: ['dataset'])
+    value            key of the value in each data point. A dict there is expanded into one
+                     metric per key, taking `field` from entries that are dicts themselves
+    timestamp        'row' (timestamp_column), 'item' (dateTime of the first payload item),
+                     'point' (ISO string under point_timestamp) or 'time_of_day' (the row's
+                     date plus an 'HH:MM:SS' string under point_timestamp)
+    optional         a missing file is skipped instead of reported as an error
+    """
+
+    def __init__(self, filename, column, metric, payload=True, path=(), value='value', field=None,
+                 timestamp='row', timestamp_column='dateTime', point_timestamp=None, optional=False):
+        self.filename = filename
+        self.column = column
+        self.metric = metric
+        self.payload = payload
+        self.path = list(path)
+        self.value = value
+        self.field = field
+        self.timestamp = timestamp
+        self.timestamp_column = timestamp_column
+        self.point_timestamp = point_timestamp
+        self.optional = optional
+
+# Export files in ingestion order. A new Fitbit export is a new entry here.
+PARSER_SPECS = [
+    ParserSpec('activity.csv', 'value', 'activity', payload=False),
+    ParserSpec('breathing_rate.csv', 'br', 'breathing_rate_{key}', field='breathingRate', timestamp='item'),
+    ParserSpec('spo2.csv', 'minutes', 'spo2', timestamp='point', point_timestamp='minute'),
+    ParserSpec('heart_rate.csv', 'activities-heart-intraday', 'heart_rate', path=['dataset'],
+               timestamp='time_of_day', point_timestamp='time'),
+    ParserSpec('hrv.csv', 'hrv', 'hrv'),
+    ParserSpec('active_zone_minutes.csv', 'activities-active-zone-minutes', 'active_zone_minutes_{key}'),
+    ParserSpec('steps.csv', 'activities-steps-intraday', 'steps', path=['dataset'],
+               timestamp='time_of_day', point_timestamp='time', optional=True),
+    ParserSpec('calories.csv', 'activities-calories-intraday', 'calories', path=['dataset'],
+               timestamp='time_of_day', point_timestamp='time', optional=True),
+    ParserSpec('temperature.csv', 'tempSkin', 'skin_temperature_{key}', optional=True),
+]
+
+class PointCollector:
+    """Accumulates per-metric epoch/value chunks for one participant and file"""
+
+    def __init__(self, user_id):
+        self.user_id = user_id
+        self.chunks = {}
+
+    def add(self, names, epochs, values):
+        if len(set(names)) == 1:
+            groups = [(names[0], epochs, values)]
+        else:
+            names = np.asarray(names)
+            groups = [(name, epochs[names == name], values[names == name]) for name in dict.fromkeys(names.tolist())]
+        for name, group_epochs, group_values in groups:
+            epoch_chunks, value_chunks = self.chunks.setdefault(name, ([], []))
+            epoch_chunks.append(group_epochs)
+            value_chunks.append(group_values)
+
+    def batches(self):
+        return [point_batch(self.user_id, name, epoch_chunks, value_chunks)
+                for name, (epoch_chunks, value_chunks) in self.chunks.items()]
+
+def walk_payload(items, path):
+    """Follow path from each payload item down to its data points, flattening lists"""
+    for key in path:
+        nested = []
+        for item in items:
+            child = item.get(key) if isinstance(item, dict) else None
+            if isinstance(child, list):
+                nested.extend(child)
+            elif isinstance(child, dict):
+                nested.append(child)
+        items = nested
+    return [item for item in items if isinstance(item, dict)]
+
+def extract_points(spec, points, stats):
+    """Return (metric names, values, point timestamp strings) for the numeric values in points"""
+    names, values, stamps = [], [], []
+    for point in points:
+        if spec.value not in point:
+            continue
+        stamp = None
+        if spec.point_timestamp:
+            if spec.point_timestamp not in point:
+                continue
+            stamp = point[spec.point_timestamp]
+            stamp = stamp if isinstance(stamp, str) else ''
+        raw = point[spec.value]
+        entries = raw.items() if isinstance(raw, dict) else [(None, raw)]
+        for key, entry in entries:
+            if isinstance(entry, dict):
+                if spec.field not in entry:
                     continue
-    except Exception as e:
-        print(f"Error processing heart_rate.csv: {e}")
-    return rows
+                entry = entry[spec.field]
+            value = convert_np_float64(entry)
+            if not isinstance(value, (int, float)):
+                stats.reject('non_numeric_value')
+                continue
+            names.append(spec.metric if key is None else spec.metric.format(key=key))
+            values.append(value)
+            stamps.append(stamp)
+    return names, values, stamps
+
+def parse_row(spec, row, collector, stats):
+    """Parse one CSV row of a spec'd file into the collector"""
+    if not spec.payload:
+        try:
+            epoch = wall_clock_epoch(parse_timestamp(row[spec.timestamp_column], stats))
+        except (KeyError, ValueError, AttributeError, TypeError) as e:
+            stats.reject('bad_timestamp', e)
+            return
+        try:
+            value = float(row[spec.column])
+        except (KeyError, ValueError, TypeError) as e:
+            stats.reject('non_numeric_value', e)
+            return
+        collector.add([spec.metric], np.array([epoch], dtype=np.int64), np.array([value], dtype=np.float64))
+        stats.rows_parsed += 1
+        return
+
+    items = parse_payload(row.get(spec.column, '[]'), stats)
+    if not items:
+        return
+    base_epoch = None
+    if spec.timestamp != 'point':
+        if spec.timestamp == 'item':
+            timestamp_str = items[0].get('dateTime', '') if isinstance(items[0], dict) else ''
+        else:
+            timestamp_str = row.get(spec.timestamp_column, '')
+        if not timestamp_str:
+            stats.reject('missing_timestamp')
+            return
+        base_timestamp = parse_timestamp(timestamp_str, stats)
+        if spec.timestamp == 'time_of_day':
+            base_timestamp = base_timestamp.replace(hour=0, minute=0, second=0, microsecond=0)
+        base_epoch = wall_clock_epoch(base_timestamp)
+
+    names, values, stamps = extract_points(spec, walk_payload(items, spec.path), stats)
+    if not values:
+        return
 
-def process_hrv():
-    """Process hrv.csv file"""
-    rows = []
+    # Timestamps for all of the row's points at once
+    ts_start = time.perf_counter()
+    if spec.timestamp == 'time_of_day':
+        seconds, valid = seconds_of_day(stamps)
+        epochs = base_epoch + seconds
+    elif spec.timestamp == 'point':
+        epochs, valid = iso_epochs(stamps)
+    else:
+        epochs = np.full(len(values), base_epoch, dtype=np.int64)
+        valid = np.ones(len(values), dtype=bool)
+    stats.timestamp_seconds += time.perf_counter() - ts_start
+
+    values = np.asarray(values, dtype=np.float64)
+    if not valid.all():
+        stats.reject('bad_timestamp', count=int((~valid).sum()))
+        names = [name for name, ok in zip(names, valid.tolist()) if ok]
+        epochs, values = epochs[valid], values[valid]
+    if names:
+        collector.add(names, epochs, values)
+        stats.rows_parsed += len(names)
+
+def parse_file(spec, data_dir=DATA_DIR, user_id=1, stats=None, byte_range=None):
+    """Parse one export file (or a row-aligned byte range of it) according to its spec; returns a PointBatch per metric"""
+    stats = stats or FileStats(spec.filename)
+    collector = PointCollector(user_id)
+    if spec.optional and not os.path.exists(os.path.join(data_dir, spec.filename)):
+        return []
+    start_time = time.perf_counter()
     try:
-        with open('ingest/data/hrv.csv', 'r') as file:
-            reader = csv.DictReader(file)
-            for row in reader:
+        with open_export(data_dir, spec.filename, stats, byte_range) as reader:
+            for row in reader.rows([spec.column, spec.timestamp_column], byte_range):
+                stats.rows_read += 1
                 try:
-                    # Parse the stringified list of dictionaries
-                    hrv_data = safe_eval_list(row.get('hrv', '[]'))
-                    if not hrv_data:
-                        continue
-                    
-                    # Extract timestamp from dateTime column
-                    timestamp_str = row.get('dateTime', '')
-                    if not timestamp_str:
-                        continue
-                    
-                    timestamp = datetime.fromisoformat(timestamp_str.replace('Z', '+00:00'))
-                    
-                    # Process HRV data
-                    for item in hrv_data:
-                        if 'value' in item:
-                            value = convert_np_float64(item['value'])
-                            if isinstance(value, (int, float)):
-                                rows.append({
-                                    'user_id': 1,
-                                    'timestamp': timestamp,
-                                    'metric_name': 'hrv',
-                                    'value': float(value)
-                                })
+                    parse_row(spec, row, collector, stats)
+                    stats.capture_dead_letter(user_id, row)
                 except Exception as e:
-                    print(f"Error processing HRV row: {e}")
-                    continue
+                    stats.reject(type(e).__name__, e)
+                    stats.capture_dead_letter(user_id, row, e)
     except Exception as e:
-        print(f"Error processing hrv.csv: {e}")
-    return rows
+        stats.errors.append(str(e))
+        print(f"Error processing {spec.filename}: {e}")
+    stats.parse_seconds += time.perf_counter() - start_time
+    return collector.batches()
+
+def parse_file_task(task):
+    """parse_file for a (spec, directory, user_id[, byte_range]) task; returns (FileStats, batches) so it can run in a worker process"""
+    spec, data_dir, user_id = task[:3]
+    stats = FileStats(spec.filename)
+    return stats, parse_file(spec, data_dir, user_id, stats, task[3] if len(task) > 3 else None)
 
-def process_active_zone_minutes():
-    """Process active_zone_minutes.csv file"""
-    rows = []
+def make_sleep_summary(user_id, log, stats):
+    """Summarize one Fitbit sleep log as a night: start, end, minutes per stage and efficiency"""
     try:
-        with open('ingest/data/active_zone_minutes.csv', 'r') as file:
-            reader = csv.DictReader(file)
-            for row in reader:
-                try:
-                    # Parse the stringified list of dictionaries
-                    activities_data = safe_eval_list(row.get('activities-active-zone-minutes', '[]'))
-                    if not activities_data:
-                        continue
-                    
-                    # Extract timestamp from dateTime column
-                    timestamp_str = row.get('dateTime', '')
-                    if not timestamp_str:
-                        continue
-                    
-                    timestamp = datetime.fromisoformat(timestamp_str.replace('Z', '+00:00'))
-                    
-                    # Process active zone minutes data
-                    for activity in activities_data:
-                        if 'value' in activity and isinstance(activity['value'], dict):
-                            for zone, minutes in activity['value'].items():
-                                if isinstance(minutes, (int, float)):
-                                    rows.append({
-                                        'user_id': 1,
-                                        'timestamp': timestamp,
-                                        'metric_name': f'active_zone_minutes_{zone}',
-                                        'value': float(minutes)
-                                    })
-                except Exception as e:
-                    print(f"Error processing active zone minutes row: {e}")
-                    continue
-    except Exception as e:
-        print(f"Error processing active_zone_minutes.csv: {e}")
-    return rows
+        date_of_sleep = datetime.strptime(log['dateOfSleep'], '%Y-%m-%d').date()
+        start = parse_timestamp(log['startTime'], stats)
+        end = parse_timestamp(log['endTime'], stats)
+    except (KeyError, ValueError, TypeError, AttributeError) as e:
+        stats.reject('bad_timestamp', e)
+        return None
+    levels = (log.get('levels') or {}).get('summary') or {}
+
+    def stage_minutes(*names):
+        # 'stages' logs report deep/light/rem/wake, 'classic' logs asleep/restless/awake
+        for name in names:
+            if isinstance(levels.get(name), dict):
+                return int(convert_np_float64(levels[name].get('minutes', 0)))
+        return None
+
+    def minutes(key):
+        value = convert_np_float64(log.get(key))
+        return int(value) if isinstance(value, (int, float)) else None
+
+    stats.rows_parsed += 1
+    return {
+        'user_id': user_id,
+        'date_of_sleep': date_of_sleep,
+        'log_id': log.get('logId'),
+        'is_main_sleep': bool(log.get('isMainSleep', True)),
+        'start_time': start,
+        'end_time': end,
+        'minutes_in_bed': minutes('timeInBed'),
+        'minutes_asleep': minutes('minutesAsleep'),
+        'minutes_awake': minutes('minutesAwake'),
+        'minutes_deep': stage_minutes('deep'),
+        'minutes_light': stage_minutes('light'),
+        'minutes_rem': stage_minutes('rem'),
+        'minutes_wake': stage_minutes('wake', 'awake'),
+        'efficiency': minutes('efficiency'),
+    }
 
-def process_generic_csv(filename, metric_name):
-    """Process generic CSV files with dateTime and value columns"""
-    rows = []
+def parse_sleep_row(row, user_id, nights, stats):
+    """Summarize the sleep logs of one sleep.csv row into nights ({date_of_sleep: summary})"""
+    logs = parse_payload(row.get('sleep', '[]'), stats)
+    for log in logs or []:
+        summary = make_sleep_summary(user_id, log, stats)
+        if summary is None:
+            continue
+        # One summary per night: the main sleep wins over naps, then the longest log
+        current = nights.get(summary['date_of_sleep'])
+        rank = lambda night: (night['is_main_sleep'], night['minutes_asleep'] or 0)
+        if current is None or rank(summary) > rank(current):
+            nights[summary['date_of_sleep']] = summary
+
+def process_sleep(data_dir=DATA_DIR, user_id=1, stats=None):
+    """Process sleep.csv (Fitbit sleep logs) into one summary per night"""
+    stats = stats or FileStats('sleep.csv')
+    nights = {}
+    start_time = time.perf_counter()
     try:
-        with open(f'ingest/data/{filename}', 'r') as file:
-            reader = csv.DictReader(file)
-            for row in reader:
+        with open_export(data_dir, 'sleep.csv', stats) as reader:
+            for row in reader.rows(['sleep']):
+                stats.rows_read += 1
                 try:
-                    timestamp = datetime.fromisoformat(row['dateTime'].replace('Z', '+00:00'))
-                    value = float(row['value'])
-                    rows.append({
-                        'user_id': 1,
-                        'timestamp': timestamp,
-                        'metric_name': metric_name,
-                        'value': value
-                    })
+                    parse_sleep_row(row, user_id, nights, stats)
+                    stats.capture_dead_letter(user_id, row)
                 except Exception as e:
-                    print(f"Error processing {filename} row: {e}")
-                    continue
+                    stats.reject(type(e).__name__, e)
+                    stats.capture_dead_letter(user_id, row, e)
     except Exception as e:
-        print(f"Error processing {filename}: {e}")
-    return rows
+        stats.errors.append(str(e))
+        print(f"Error processing sleep.csv: {e}")
+    stats.parse_seconds += time.perf_counter() - start_time
+    return list(nights.values())
+
+def create_raw_data_indexes(cursor):
+    """Replace the single-column raw_data indexes with the composite access-path index"""
+    # Every read path filters on (user_id, metric_id, timestamp range), so a single
+    # composite index serves them all; the single-column ones only cost write time.
+    for index_name in RAW_DATA_LEGACY_INDEXES:
+        cursor.execute(f"DROP INDEX IF EXISTS {index_name};")
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS ix_raw_data_user_metric_ts
+        ON raw_data (user_id, metric_id, timestamp DESC);
+    """)
 
 def start_metrics_server():
     # Start Prometheus metrics server on port 8000
@@ -319,71 +772,1016 @@ def metrics():
     return PlainTextResponse(generate_latest(), media_type=CONTENT_TYPE_LATEST)
 
 @ingestion_app.post("/run_ingestion")
-def run_ingestion():
+def run_ingestion(x_profile: Optional[str] = Header(None)):
+    if PROFILING_ENABLED and x_profile in ('cprofile', 'sample'):
+        result, profile_id = profile_ingestion_run(x_profile)
+        return {"result": result, "profile_id": profile_id}
     result = run_ingestion_job()
     return {"result": result}
 
-def run_ingestion_job():
-    start_time = time.time()
-    error_occurred = False
-    all_rows = []
+@ingestion_app.get("/dead_letters")
+def list_dead_letters(
+    status: str = Query('pending', description="pending, replayed or all"),
+    filename: Optional[str] = None,
+    limit: int = Query(100, ge=1, le=1000)
+):
+    """Rejected rows with their reasons, newest first, plus counts per file and reason"""
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    create_dead_letter_table(cursor)
     try:
-        # Process each file type
-        all_rows.extend(process_activity())
-        all_rows.extend(process_breathing_rate())
-        all_rows.extend(process_spo2())
-        all_rows.extend(process_heart_rate())
-        all_rows.extend(process_hrv())
-        all_rows.extend(process_active_zone_minutes())
+        conditions, params = [], []
+        if status != 'all':
+            conditions.append("status = %s")
+            params.append(status)
+        if filename:
+            conditions.append("filename = %s")
+            params.append(filename)
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        cursor.execute(f"""
+            SELECT id, user_id, filename, reason, error, status, attempts, first_seen_at, last_seen_at, replayed_at
+            FROM ingest_dead_letters {where} ORDER BY last_seen_at DESC, id DESC LIMIT %s
+        """, params + [limit])
+        columns = [column[0] for column in cursor.description]
+        rows = [dict(zip(columns, row)) for row in cursor.fetchall()]
+        cursor.execute(f"SELECT filename, reason, COUNT(*) FROM ingest_dead_letters {where} GROUP BY filename, reason", params)
+        summary = [{'filename': f, 'reason': r, 'count': c} for f, r, c in cursor.fetchall()]
+        conn.commit()
+        return {'summary': summary, 'dead_letters': rows}
+    finally:
+        cursor.close()
+        conn.close()
 
-        # Connect to database and insert data
-        conn = psycopg2.connect(
-            host=os.environ.get('DB_HOST', 'timescaledb'),
-            port=os.environ.get('DB_PORT', '5432'),
-            database=os.environ.get('DB_NAME', 'fitbit_data'),
-            user=os.environ.get('DB_USER', 'postgres'),
-            password=os.environ.get('DB_PASS', 'password')
-        )
-        cursor = conn.cursor()
+@ingestion_app.post("/dead_letters/replay")
+def replay_dead_letters_endpoint(
+    ids: Optional[List[int]] = Query(None),
+    filename: Optional[str] = None,
+    limit: int = Query(1000, ge=1, le=100000)
+):
+    """Replay pending rejected rows (optionally only some ids or one file) through the current parsers"""
+    return replay_dead_letters(ids, filename, limit)
+
+@ingestion_app.get("/profiles")
+def list_profiles():
+    if not PROFILING_ENABLED:
+        raise HTTPException(status_code=404, detail="Profiling is disabled")
+    return [{k: v for k, v in p.items() if k != 'data'} for p in reversed(profiles.values())]
+
+@ingestion_app.get("/profiles/{profile_id}")
+def get_profile(profile_id: str, format: str = Query('text', description="text, pstats or collapsed")):
+    """Serve a stored profile: pstats text summary, raw pstats file, or collapsed stacks"""
+    profile = profiles.get(profile_id) if PROFILING_ENABLED else None
+    if not profile:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    if profile['mode'] == 'sample':
+        if format not in ('collapsed', 'text'):
+            raise HTTPException(status_code=400, detail="Sampled profiles are only available as collapsed stacks")
+        return PlainTextResponse(profile['data'])
+    if format == 'pstats':
+        return Response(profile['data'], media_type='application/octet-stream',
+                        headers={'Content-Disposition': f'attachment; filename="{profile_id}.pstats"'})
+    if format != 'text':
+        raise HTTPException(status_code=400, detail="cProfile profiles are available as text or pstats")
+    stats = pstats.Stats(_StatsSource(marshal.loads(profile['data'])), stream=io.StringIO())
+    stats.sort_stats('cumulative').print_stats(60)
+    return PlainTextResponse(stats.stream.getvalue())
+
+# Retained profiles, oldest first; bounded by PROFILE_RETENTION
+profiles = OrderedDict()
+profiles_lock = threading.Lock()
+
+class _StatsSource:
+    """Adapter letting pstats.Stats load a stats dict that was stored with marshal"""
 
-        # Create raw_data table if it doesn't exist
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS raw_data (
-                id SERIAL PRIMARY KEY,
-                user_id INTEGER NOT NULL,
-                timestamp TIMESTAMPTZ NOT NULL,
-                metric_name TEXT NOT NULL,
-                value DOUBLE PRECISION,
-                is_imputed BOOLEAN DEFAULT FALSE,
-                UNIQUE(user_id, timestamp, metric_name)
-            );
-        """)
-
-        # Create TimescaleDB hypertable if not already created
+    def __init__(self, stats):
+        self.stats = stats
+
+    def create_stats(self):
+        pass
+
+def sample_stacks(thread_id, interval, stop, stacks):
+    """Collect collapsed stacks of one thread until stop is set"""
+    while not stop.wait(interval):
+        frame = sys._current_frames().get(thread_id)
+        names = []
+        while frame is not None:
+            names.append(f"{frame.f_code.co_name} ({frame.f_code.co_filename}:{frame.f_code.co_firstlineno})")
+            frame = frame.f_back
+        if names:
+            stacks[';'.join(reversed(names))] += 1
+
+def profile_ingestion_run(mode):
+    """Run one ingestion job under cProfile or the sampler and store the result"""
+    start_time = time.perf_counter()
+    if mode == 'cprofile':
+        profiler = cProfile.Profile()
+        profiler.enable()
         try:
-            cursor.execute("SELECT create_hypertable('raw_data', 'timestamp');")
-        except psycopg2.Error as e:
-            if e.pgcode == '42710': # duplicate_table, for hypertable
-                conn.rollback()
-                cursor = conn.cursor()
-                print("Hypertable 'raw_data' already exists.")
+            result = run_ingestion_job()
+        finally:
+            profiler.disable()
+        profiler.create_stats()
+        data = marshal.dumps(profiler.stats)
+    else:
+        stacks = StackCounter()
+        stop = threading.Event()
+        sampler = threading.Thread(
+            target=sample_stacks, args=(threading.get_ident(), PROFILE_SAMPLE_INTERVAL, stop, stacks), daemon=True)
+        sampler.start()
+        try:
+            result = run_ingestion_job()
+        finally:
+            stop.set()
+            sampler.join()
+        data = '\n'.join(f"{stack} {count}" for stack, count in stacks.most_common())
+
+    profile_id = uuid.uuid4().hex[:12]
+    with profiles_lock:
+        profiles[profile_id] = {
+            'id': profile_id,
+            'target': 'run_ingestion_job',
+            'mode': mode,
+            'created_at': datetime.now().isoformat(),
+            'duration_seconds': round(time.perf_counter() - start_time, 4),
+            'data': data,
+        }
+        while len(profiles) > PROFILE_RETENTION:
+            profiles.popitem(last=False)
+    return result, profile_id
+
+def discover_participants(data_dir=DATA_DIR):
+    """Return (user_id, directory) pairs for the exports under data_dir"""
+    participants = []
+    for entry in sorted(os.listdir(data_dir)):
+        match = re.fullmatch(r'user_(\d+)', entry)
+        if match and os.path.isdir(os.path.join(data_dir, entry)):
+            participants.append((int(match.group(1)), os.path.join(data_dir, entry)))
+    # A flat directory holds a single participant's export
+    return participants or [(1, data_dir)]
+
+def split_task(task, workers):
+    """Split a parse task over a large file into row-aligned byte-range tasks"""
+    spec, data_dir, user_id = task
+    path = os.path.join(data_dir, spec.filename)
+    if not os.path.exists(path) or os.path.getsize(path) <= INGEST_SPLIT_BYTES:
+        return [task]
+    with MappedCSV(path) as reader:
+        return [(spec, data_dir, user_id, byte_range) for byte_range in reader.split(workers)]
+
+def run_parse_tasks(tasks, workers=None):
+    """parse_file_task over (spec, directory, user_id) tasks, in worker processes when workers > 1"""
+    workers = workers or INGEST_WORKERS
+    if workers <= 1:
+        return [parse_file_task(task) for task in tasks]
+    # Parsing is CPU-bound, so files are spread over processes rather than threads,
+    # and large files are split so one export does not keep a single worker busy
+    subtasks = [(index, subtask) for index, task in enumerate(tasks) for subtask in split_task(task, workers)]
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        results = list(pool.map(parse_file_task, [subtask for _, subtask in subtasks],
+                                 chunksize=max(1, len(subtasks) // (workers * 4))))
+    merged = [(FileStats(spec.filename), PointCollector(user_id)) for spec, _, user_id in tasks]
+    for (index, _), (stats, point_batches) in zip(subtasks, results):
+        merged[index][0].merge(stats)
+        for batch in point_batches:
+            merged[index][1].add([batch.metric_name], batch.epochs, batch.values)
+    return [(stats, collector.batches()) for stats, collector in merged]
+
+def parse_batches(data_dir=DATA_DIR, report=None, workers=None):
+    """Parse every supported file for every participant; returns (FileStats, PointBatch) batches"""
+    report = report or RunReport(data_dir)
+    tasks = [(spec, user_dir, user_id) for user_id, user_dir in discover_participants(data_dir) for spec in PARSER_SPECS]
+    results = run_parse_tasks(tasks, workers)
+    batches = []
+    for (spec, _, _), (stats, point_batches) in zip(tasks, results):
+        if stats.files_read or stats.errors:
+            report.file_stats(spec.filename).merge(stats)
+        batches.extend((report.file_stats(spec.filename), batch) for batch in point_batches)
+    return batches
+
+def parse_sleep(data_dir=DATA_DIR, report=None):
+    """Parse sleep.csv for every participant; returns (FileStats, nightly summaries) batches"""
+    report = report or RunReport(data_dir)
+    stats = report.file_stats('sleep.csv')
+    return [(stats, process_sleep(user_dir, user_id, stats)) for user_id, user_dir in discover_participants(data_dir)]
+
+def parse_all(data_dir=DATA_DIR, report=None):
+    """Parse every supported file for every participant under data_dir"""
+    all_rows = []
+    for _, rows in parse_batches(data_dir, report):
+        all_rows.extend(rows)
+    return all_rows
+
+def staging_path(staging_dir, user_id, metric_name=None, day=None):
+    """user_id=<id>/metric=<name>/day=<YYYY-MM-DD>.arrow under staging_dir"""
+    path = os.path.join(staging_dir, f"user_id={user_id}")
+    if metric_name is not None:
+        path = os.path.join(path, f"metric={metric_name}")
+    if day is not None:
+        path = os.path.join(path, f"day={day}.arrow")
+    return path
+
+def load_manifest(staging_dir, user_id):
+    """{export filename: {'source': [size, mtime_ns], 'metrics': [...]}} of a participant's staged files"""
+    path = os.path.join(staging_path(staging_dir, user_id), '_manifest.json')
+    if not os.path.exists(path):
+        return {}
+    with open(path) as file:
+        return json.load(file)
+
+def save_manifest(staging_dir, user_id, manifest):
+    path = os.path.join(staging_path(staging_dir, user_id), '_manifest.json')
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path + '.tmp', 'w') as file:
+        json.dump(manifest, file, indent=2)
+    os.replace(path + '.tmp', path)
+
+def source_fingerprint(path):
+    stat = os.stat(path)
+    return [stat.st_size, stat.st_mtime_ns]
+
+def write_staged_batch(staging_dir, batch):
+    """Write a PointBatch as one uncompressed Arrow IPC file per day, replacing the metric's previous files"""
+    directory = staging_path(staging_dir, batch.user_id, batch.metric_name)
+    shutil.rmtree(directory, ignore_errors=True)
+    os.makedirs(directory)
+    days = batch.epochs // 86400
+    order = np.argsort(days, kind='stable')
+    for indices in np.split(order, np.flatnonzero(np.diff(days[order])) + 1):
+        if not len(indices):
+            continue
+        day = (UNIX_EPOCH + timedelta(days=int(days[indices[0]]))).date().isoformat()
+        table = pa.table({'epoch': batch.epochs[indices], 'value': batch.values[indices]}, schema=STAGING_SCHEMA)
+        path = staging_path(staging_dir, batch.user_id, batch.metric_name, day)
+        with pa.OSFile(path + '.tmp', 'wb') as sink:
+            with pa.ipc.new_file(sink, STAGING_SCHEMA) as writer:
+                writer.write_table(table)
+        os.replace(path + '.tmp', path)
+
+def stage_exports(data_dir=DATA_DIR, staging_dir=None, report=None, workers=None):
+    """Convert every export that changed since it was last staged; returns the number of files converted"""
+    staging_dir = staging_dir or STAGING_DIR
+    report = report or RunReport(data_dir)
+    manifests = {}
+    tasks = []
+    for user_id, user_dir in discover_participants(data_dir):
+        manifests[user_id] = manifest = load_manifest(staging_dir, user_id)
+        for spec in PARSER_SPECS:
+            source = os.path.join(user_dir, spec.filename)
+            if os.path.exists(source) and manifest.get(spec.filename, {}).get('source') == source_fingerprint(source):
+                continue
+            tasks.append((spec, user_dir, user_id))
+
+    converted = 0
+    for (spec, user_dir, user_id), (stats, point_batches) in zip(tasks, run_parse_tasks(tasks, workers)):
+        if stats.files_read or stats.errors:
+            report.file_stats(spec.filename).merge(stats)
+        if stats.errors or not stats.files_read:
+            continue
+        manifest = manifests[user_id]
+        for metric_name in manifest.get(spec.filename, {}).get('metrics', []):
+            shutil.rmtree(staging_path(staging_dir, user_id, metric_name), ignore_errors=True)
+        for batch in point_batches:
+            write_staged_batch(staging_dir, batch)
+        manifest[spec.filename] = {
+            'source': source_fingerprint(os.path.join(user_dir, spec.filename)),
+            'metrics': [batch.metric_name for batch in point_batches],
+        }
+        save_manifest(staging_dir, user_id, manifest)
+        converted += 1
+    print(f"Staged {converted} changed export files in {staging_dir}")
+    return converted
+
+def staged_column(table, name):
+    """numpy view of a staged column; zero-copy for the single-chunk files write_staged_batch produces"""
+    column = table.column(name)
+    if column.num_chunks == 1:
+        return column.chunk(0).to_numpy(zero_copy_only=True)
+    return column.to_numpy()
+
+def load_staged_metric(staging_dir, user_id, metric_name, start=None, end=None, stats=None):
+    """Memory-map one participant's staged day files for a metric into a PointBatch; start/end are inclusive dates"""
+    directory = staging_path(staging_dir, user_id, metric_name)
+    epoch_chunks, value_chunks = [], []
+    if os.path.isdir(directory):
+        for entry in sorted(os.listdir(directory)):
+            match = re.fullmatch(r'day=(\d{4}-\d{2}-\d{2})\.arrow', entry)
+            if not match:
+                continue
+            day = match.group(1)
+            if (start and day < start.isoformat()) or (end and day > end.isoformat()):
+                continue
+            # The arrays keep the mapping alive; nothing is read until they are used
+            table = pa.ipc.open_file(pa.memory_map(os.path.join(directory, entry), 'r')).read_all()
+            epoch_chunks.append(staged_column(table, 'epoch'))
+            value_chunks.append(staged_column(table, 'value'))
+    if len(epoch_chunks) == 1:
+        batch = PointBatch(user_id, metric_name, epoch_chunks[0], value_chunks[0])
+    else:
+        batch = point_batch(user_id, metric_name, epoch_chunks, value_chunks)
+    if stats is not None:
+        stats.staged_rows += len(batch)
+    return batch
+
+def load_staged(staging_dir=None, user_ids=None, metrics=None, start=None, end=None, report=None):
+    """
+    Staged data as (FileStats, PointBatch) batches, for re-ingestion, backfills and
+    experiments. Filters by participant, metric name and inclusive date range.
+    """
+    staging_dir = staging_dir or STAGING_DIR
+    report = report or RunReport(staging_dir)
+    batches = []
+    if not os.path.isdir(staging_dir):
+        return batches
+    for entry in sorted(os.listdir(staging_dir)):
+        match = re.fullmatch(r'user_id=(\d+)', entry)
+        if not match or (user_ids and int(match.group(1)) not in user_ids):
+            continue
+        user_id = int(match.group(1))
+        for filename, staged in load_manifest(staging_dir, user_id).items():
+            stats = report.file_stats(filename)
+            for metric_name in staged['metrics']:
+                if metrics and metric_name not in metrics:
+                    continue
+                batch = load_staged_metric(staging_dir, user_id, metric_name, start, end, stats)
+                if len(batch):
+                    batches.append((stats, batch))
+    return batches
+
+def get_db_connection():
+    return psycopg2.connect(
+        host=os.environ.get('DB_HOST', 'timescaledb'),
+        port=os.environ.get('DB_PORT', '5432'),
+        database=os.environ.get('DB_NAME', 'fitbit_data'),
+        user=os.environ.get('DB_USER', 'postgres'),
+        password=os.environ.get('DB_PASS', 'password'),
+        # Epochs are wall-clock seconds and become timestamptz as TIMESTAMP 'epoch' + n seconds,
+        # which is read in the session time zone; pinning UTC keeps the stored instants (and
+        # ::date day boundaries) the same whatever the server's default is
+        options='-c TimeZone=UTC'
+    )
+
+def ensure_schema(conn):
+    """Create the metrics dictionary and raw_data hypertable and their indexes if needed; returns a usable cursor"""
+    cursor = conn.cursor()
+
+    # Dictionary of metric names; raw_data stores the small integer id instead of the name
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS metrics (
+            id SMALLSERIAL PRIMARY KEY,
+            name TEXT NOT NULL UNIQUE
+        );
+    """)
+
+    # Create raw_data table if it doesn't exist. Unique constraints on a hypertable
+    # must include the time column, so id is not a primary key.
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS raw_data (
+            id SERIAL,
+            user_id INTEGER NOT NULL,
+            timestamp TIMESTAMPTZ NOT NULL,
+            metric_id SMALLINT NOT NULL REFERENCES metrics(id),
+            value DOUBLE PRECISION,
+            is_imputed BOOLEAN DEFAULT FALSE,
+            UNIQUE(user_id, timestamp, metric_id)
+        );
+    """)
+    migrate_metric_names(cursor)
+
+    # Create TimescaleDB hypertable if not already created
+    cursor.execute("SELECT create_hypertable('raw_data', 'timestamp', create_default_indexes => FALSE, if_not_exists => TRUE);")
+
+    create_raw_data_indexes(cursor)
+    create_sleep_summary_table(cursor)
+    create_dead_letter_table(cursor)
+    create_freshness_table(cursor)
+    if INGEST_LAYOUT != 'narrow':
+        create_minute_table(cursor)
+    return cursor
+
+def create_sleep_summary_table(cursor):
+    """Create sleep_summary, one compact row per participant and night"""
+    # A few hundred rows per participant, so a plain table keyed for (user_id, date range) lookups
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS sleep_summary (
+            user_id INTEGER NOT NULL,
+            date_of_sleep DATE NOT NULL,
+            log_id BIGINT,
+            is_main_sleep BOOLEAN DEFAULT TRUE,
+            start_time TIMESTAMPTZ NOT NULL,
+            end_time TIMESTAMPTZ NOT NULL,
+            minutes_in_bed INTEGER,
+            minutes_asleep INTEGER,
+            minutes_awake INTEGER,
+            minutes_deep INTEGER,
+            minutes_light INTEGER,
+            minutes_rem INTEGER,
+            minutes_wake INTEGER,
+            efficiency SMALLINT,
+            PRIMARY KEY (user_id, date_of_sleep)
+        );
+    """)
+
+def create_dead_letter_table(cursor):
+    """Create ingest_dead_letters, the rejected CSV rows kept for replay"""
+    # row_data is the row's parsed columns as zlib-compressed JSON; row_digest
+    # keeps a row that is rejected again on every run to a single entry
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS ingest_dead_letters (
+            id BIGSERIAL PRIMARY KEY,
+            user_id INTEGER NOT NULL,
+            filename TEXT NOT NULL,
+            row_digest TEXT NOT NULL,
+            reason TEXT NOT NULL,
+            error TEXT,
+            row_data BYTEA NOT NULL,
+            status TEXT NOT NULL DEFAULT 'pending',
+            attempts INTEGER NOT NULL DEFAULT 0,
+            first_seen_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+            last_seen_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+            replayed_at TIMESTAMPTZ,
+            UNIQUE (user_id, filename, row_digest)
+        );
+    """)
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS ix_ingest_dead_letters_status
+        ON ingest_dead_letters (status, filename);
+    """)
+
+def create_freshness_table(cursor):
+    """Create data_freshness, the latest data point per participant and metric"""
+    # Kept up to date by ingestion so freshness checks never scan raw_data
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS data_freshness (
+            user_id INTEGER NOT NULL,
+            metric_id SMALLINT NOT NULL REFERENCES metrics(id),
+            last_seen_at TIMESTAMPTZ NOT NULL,
+            updated_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+            PRIMARY KEY (user_id, metric_id)
+        );
+    """)
+    # Serves the cohort-wide "who uploaded since X" read
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS ix_data_freshness_last_seen
+        ON data_freshness (last_seen_at);
+    """)
+
+def create_minute_table(cursor):
+    """Create the wide raw_data_minute hypertable, one row per (user, minute) and a column per intraday metric"""
+    columns = "".join(f"{name} DOUBLE PRECISION,\n" for name in MINUTE_METRICS)
+    cursor.execute(f"""
+        CREATE TABLE IF NOT EXISTS raw_data_minute (
+            user_id INTEGER NOT NULL,
+            timestamp TIMESTAMPTZ NOT NULL,
+            {columns}
+            PRIMARY KEY (user_id, timestamp)
+        );
+    """)
+    # Metrics added to MINUTE_METRICS after the table was created become new nullable columns
+    for name in MINUTE_METRICS:
+        cursor.execute(f"ALTER TABLE raw_data_minute ADD COLUMN IF NOT EXISTS {name} DOUBLE PRECISION;")
+    # The primary key index serves the (user_id, timestamp range) reads
+    cursor.execute("SELECT create_hypertable('raw_data_minute', 'timestamp', create_default_indexes => FALSE, if_not_exists => TRUE);")
+
+def migrate_metric_names(cursor):
+    """Move a raw_data table that still stores metric_name TEXT over to metric_id"""
+    cursor.execute("""
+        SELECT 1 FROM information_schema.columns
+        WHERE table_name = 'raw_data' AND column_name = 'metric_name'
+    """)
+    if not cursor.fetchone():
+        return
+    print("Migrating raw_data.metric_name to the metrics dictionary...")
+    cursor.execute("INSERT INTO metrics (name) SELECT DISTINCT metric_name FROM raw_data ON CONFLICT (name) DO NOTHING;")
+    cursor.execute("ALTER TABLE raw_data ADD COLUMN IF NOT EXISTS metric_id SMALLINT REFERENCES metrics(id);")
+    cursor.execute("UPDATE raw_data r SET metric_id = m.id FROM metrics m WHERE m.name = r.metric_name;")
+    cursor.execute("ALTER TABLE raw_data ALTER COLUMN metric_id SET NOT NULL;")
+    # The continuous aggregates group by metric_name; the backend recreates them on startup
+    for view_name in ['data_1m', 'data_1h', 'data_1d']:
+        cursor.execute(f"DROP MATERIALIZED VIEW IF EXISTS {view_name} CASCADE;")
+    cursor.execute("ALTER TABLE raw_data DROP COLUMN metric_name CASCADE;")
+    cursor.execute("ALTER TABLE raw_data ADD CONSTRAINT raw_data_user_id_timestamp_metric_id_key UNIQUE (user_id, timestamp, metric_id);")
+
+def resolve_metric_ids(cursor, names):
+    """Return {name: id} for the given metric names, registering any that are new"""
+    names = sorted(set(names))
+    if not names:
+        return {}
+    cursor.execute("""
+        INSERT INTO metrics (name) SELECT unnest(%s::text[])
+        ON CONFLICT (name) DO NOTHING
+    """, (names,))
+    cursor.execute("SELECT id, name FROM metrics WHERE name = ANY(%s)", (names,))
+    return {name: metric_id for metric_id, name in cursor.fetchall()}
+
+def stage_points(cursor, epochs, values):
+    """COPY epoch/value arrays into the session's raw_data_staging temp table, replacing its contents"""
+    cursor.execute("""
+        CREATE TEMP TABLE IF NOT EXISTS raw_data_staging (
+            epoch BIGINT NOT NULL,
+            value DOUBLE PRECISION
+        ) ON COMMIT DELETE ROWS;
+    """)
+    cursor.execute("TRUNCATE raw_data_staging;")
+    buffer = io.StringIO()
+    # repr round-trips floats exactly
+    buffer.writelines(f"{epoch}\t{value!r}\n" for epoch, value in zip(epochs.tolist(), values.tolist()))
+    buffer.seek(0)
+    cursor.copy_from(buffer, 'raw_data_staging', columns=('epoch', 'value'))
+
+class InsertedPoints:
+    """
+    What a run actually changed, as filled in by write_batch: per (user_id, metric_name),
+    {day number: [count, first epoch, last epoch]} of the points the database accepted,
+    and the (user_id, date) nights whose sleep summary write_sleep_summaries added or changed.
+    Freshness, live notifications, alerts and the cohort refresh are driven from this
+    rather than from everything parsed, so re-ingesting stored history touches nothing.
+    """
+
+    def __init__(self):
+        self.days = {}
+        self.nights = set()
+
+    def add(self, user_id, metric_name, day_rows):
+        """Merge (day, count, first epoch, last epoch) rows returned by a write"""
+        days = self.days.setdefault((user_id, metric_name), {})
+        for day, count, first, last in day_rows:
+            if day in days:
+                entry = days[day]
+                days[day] = [entry[0] + count, min(entry[1], first), max(entry[2], last)]
+            else:
+                days[day] = [count, first, last]
+
+    def __len__(self):
+        return sum(count for days in self.days.values() for count, _, _ in days.values())
+
+    def ranges(self):
+        """{(user_id, metric_name): (first epoch, last epoch)} of the inserted points"""
+        return {
+            key: (min(first for _, first, _ in days.values()), max(last for _, _, last in days.values()))
+            for key, days in self.days.items() if days
+        }
+
+# Wraps an INSERT ... RETURNING timestamp so only one row per day comes back
+INSERTED_DAYS = """
+    WITH inserted AS ({insert})
+    SELECT floor(extract(epoch FROM timestamp) / 86400)::bigint,
+           count(*), min(extract(epoch FROM timestamp))::bigint, max(extract(epoch FROM timestamp))::bigint
+    FROM inserted GROUP BY 1
+"""
+
+def write_points(cursor, batch, stats=None, inserted_points=None):
+    """
+    Bulk-load a PointBatch into raw_data through COPY, skipping points already stored;
+    records the inserted ones in inserted_points and returns how many there were
+    """
+    start_time = time.perf_counter()
+    inserted = 0
+    if len(batch):
+        metric_id = resolve_metric_ids(cursor, [batch.metric_name])[batch.metric_name]
+        stage_points(cursor, batch.epochs, batch.values)
+        # Epochs become timestamps in SQL, so no datetime is built per point
+        cursor.execute(INSERTED_DAYS.format(insert="""
+            INSERT INTO raw_data (user_id, timestamp, metric_id, value)
+            SELECT %s, TIMESTAMP 'epoch' + epoch * INTERVAL '1 second', %s, value
+            FROM raw_data_staging
+            ON CONFLICT (user_id, timestamp, metric_id) DO NOTHING
+            RETURNING timestamp
+        """), (batch.user_id, metric_id))
+        day_rows = cursor.fetchall()
+        inserted = sum(count for _, count, _, _ in day_rows)
+        if inserted_points is not None:
+            inserted_points.add(batch.user_id, batch.metric_name, day_rows)
+    if stats is not None:
+        stats.write_seconds += time.perf_counter() - start_time
+        stats.rows_inserted += inserted
+        stats.rows_duplicate += len(batch) - inserted
+    return inserted
+
+def write_minute_points(cursor, batch, stats=None, inserted_points=None):
+    """
+    Upsert a PointBatch into its raw_data_minute column, one value per minute; minutes
+    whose value changed are recorded in inserted_points. Returns minute rows written
+    """
+    start_time = time.perf_counter()
+    # Truncate to the minute; the last point of a minute wins
+    minutes = batch.epochs // 60 * 60
+    unique_minutes, last = np.unique(minutes[::-1], return_index=True)
+    written = 0
+    if len(unique_minutes):
+        stage_points(cursor, unique_minutes, batch.values[::-1][last])
+        # Only this metric's column is set, so heart_rate and spo2 written from
+        # separate files end up on the same row; unchanged minutes are left alone
+        cursor.execute(INSERTED_DAYS.format(insert=f"""
+            INSERT INTO raw_data_minute (user_id, timestamp, {batch.metric_name})
+            SELECT %s, TIMESTAMP 'epoch' + epoch * INTERVAL '1 second', value
+            FROM raw_data_staging
+            ON CONFLICT (user_id, timestamp) DO UPDATE SET {batch.metric_name} = EXCLUDED.{batch.metric_name}
+            WHERE raw_data_minute.{batch.metric_name} IS DISTINCT FROM EXCLUDED.{batch.metric_name}
+            RETURNING timestamp
+        """), (batch.user_id,))
+        day_rows = cursor.fetchall()
+        written = sum(count for _, count, _, _ in day_rows)
+        if inserted_points is not None:
+            inserted_points.add(batch.user_id, batch.metric_name, day_rows)
+    if stats is not None:
+        stats.write_seconds += time.perf_counter() - start_time
+        stats.minute_rows_written += written
+    return written
+
+SLEEP_SUMMARY_COLUMNS = [
+    'user_id', 'date_of_sleep', 'log_id', 'is_main_sleep', 'start_time', 'end_time', 'minutes_in_bed',
+    'minutes_asleep', 'minutes_awake', 'minutes_deep', 'minutes_light', 'minutes_rem', 'minutes_wake', 'efficiency',
+]
+
+def write_sleep_summaries(cursor, summaries, stats=None, inserted_points=None):
+    """
+    Upsert nightly sleep summaries; a re-exported night replaces the stored one if it differs.
+    Nights added or changed are recorded in inserted_points. Returns rows written
+    """
+    start_time = time.perf_counter()
+    written = []
+    if summaries:
+        columns = SLEEP_SUMMARY_COLUMNS[2:]
+        updates = ", ".join(f"{column} = EXCLUDED.{column}" for column in columns)
+        written = execute_values(cursor, f"""
+            INSERT INTO sleep_summary ({", ".join(SLEEP_SUMMARY_COLUMNS)})
+            VALUES %s
+            ON CONFLICT (user_id, date_of_sleep) DO UPDATE SET {updates}
+            WHERE ({", ".join(f"sleep_summary.{column}" for column in columns)})
+                IS DISTINCT FROM ({", ".join(f"EXCLUDED.{column}" for column in columns)})
+            RETURNING user_id, date_of_sleep
+        """, [tuple(summary[column] for column in SLEEP_SUMMARY_COLUMNS) for summary in summaries], fetch=True)
+        if inserted_points is not None:
+            inserted_points.nights.update(written)
+    if stats is not None:
+        stats.write_seconds += time.perf_counter() - start_time
+        stats.rows_inserted += len(written)
+        stats.rows_duplicate += len(summaries) - len(written)
+    return len(written)
+
+def write_batch(cursor, batch, stats=None, inserted_points=None):
+    """
+    Write one PointBatch to raw_data and/or raw_data_minute according to INGEST_LAYOUT,
+    recording what was new in inserted_points (an InsertedPoints). Returns raw_data rows inserted
+    """
+    if INGEST_LAYOUT != 'narrow' and batch.metric_name in MINUTE_METRICS:
+        # In 'both' the raw_data insert below already records the new points
+        write_minute_points(cursor, batch, stats, inserted_points if INGEST_LAYOUT == 'wide' else None)
+        if INGEST_LAYOUT == 'wide':
+            return 0
+    return write_points(cursor, batch, stats, inserted_points)
+
+def write_freshness(cursor, inserted_points):
+    """
+    Advance data_freshness and participants.last_upload_date to the newest inserted point,
+    in one statement each. Pairs that received no new rows keep their updated_at, so
+    re-ingesting stored data does not change the backend's ETags. Returns the number of
+    (user, metric) pairs.
+    """
+    latest = {key: last for key, (_, last) in inserted_points.ranges().items()}
+    if not latest:
+        return 0
+    metric_ids = resolve_metric_ids(cursor, [metric_name for _, metric_name in latest])
+    # Only ever moves forward, so re-ingesting an old export does not make a participant look stale
+    execute_values(cursor, """
+        INSERT INTO data_freshness (user_id, metric_id, last_seen_at)
+        SELECT v.user_id, v.metric_id, TIMESTAMP 'epoch' + v.epoch * INTERVAL '1 second'
+        FROM (VALUES %s) AS v (user_id, metric_id, epoch)
+        ON CONFLICT (user_id, metric_id) DO UPDATE SET
+            last_seen_at = GREATEST(data_freshness.last_seen_at, EXCLUDED.last_seen_at),
+            updated_at = NOW()
+    """, [(user_id, metric_ids[metric_name], epoch) for (user_id, metric_name), epoch in latest.items()])
+
+    # participants belongs to the backend; it may not exist yet on a fresh database
+    cursor.execute("SELECT to_regclass('participants') IS NOT NULL")
+    if cursor.fetchone()[0]:
+        last_upload = {}
+        for (user_id, _), epoch in latest.items():
+            last_upload[user_id] = max(last_upload.get(user_id, 0), epoch)
+        execute_values(cursor, """
+            UPDATE participants p
+            SET last_upload_date = GREATEST(p.last_upload_date, TIMESTAMP 'epoch' + v.epoch * INTERVAL '1 second')
+            FROM (VALUES %s) AS v (user_id, epoch)
+            WHERE p.id = v.user_id
+        """, list(last_upload.items()))
+    return len(latest)
+
+def notify_appended(cursor, inserted_points):
+    """
+    NOTIFY APPEND_CHANNEL with [user_id, metric_id, first epoch, last epoch] for each run of
+    consecutive days that received new points, per (user, metric). Points that were already
+    stored are not announced again. Postgres delivers the notifications when the transaction
+    commits, and drops them if it rolls back. Returns the number of notifications.
+    """
+    if not inserted_points.days:
+        return 0
+    metric_ids = resolve_metric_ids(cursor, [metric_name for _, metric_name in inserted_points.days])
+    entries = []
+    for (user_id, metric_name), point_days in inserted_points.days.items():
+        # A gap-filled old day becomes its own range, so subscribers are not sent the history around it
+        for day in sorted(point_days):
+            _, first, last = point_days[day]
+            if entries and entries[-1][:2] == [user_id, metric_ids[metric_name]] and day - 1 in point_days:
+                entries[-1][3] = last
             else:
-                raise
+                entries.append([user_id, metric_ids[metric_name], first, last])
+    # Payloads are limited to 8000 bytes, so large runs are split across notifications
+    payloads, chunk = [], []
+    for entry in entries:
+        chunk.append(entry)
+        if len(chunk) >= 150:
+            payloads.append(json.dumps(chunk, separators=(',', ':')))
+            chunk = []
+    if chunk:
+        payloads.append(json.dumps(chunk, separators=(',', ':')))
+    for payload in payloads:
+        cursor.execute("SELECT pg_notify(%s, %s)", (APPEND_CHANNEL, payload))
+    return len(payloads)
+
+# Adherence alert rules, evaluated per participant and complete day over alert_facts
+# (wear_minutes, minutes_in_bed and the participant's thresholds). Each entry is
+# (rule name, SQL condition, SQL message expression).
+ALERT_RULES = [
+    ('low_wear',
+     "wear_minutes < 1440 * COALESCE(overall_threshold, 70) / 100.0",
+     "'Heart rate was recorded for ' || wear_minutes || ' of 1440 minutes on ' || day"
+     " || ', below the wear target of ' || COALESCE(overall_threshold, 70) || ' percent.'"),
+    ('short_sleep',
+     "COALESCE(minutes_in_bed, 0) < COALESCE(sleep_threshold, 7) * 60",
+     "COALESCE(minutes_in_bed, 0) || ' minutes in bed were tracked for the night of ' || day"
+     " || ', below the sleep target of ' || COALESCE(sleep_threshold, 7) || ' hours.'"),
+]
 
-        # Insert data
-        for row in all_rows:
+def touched_days(inserted_points):
+    """(user_id, date) pairs that received new points or a new or changed sleep summary"""
+    days = set(inserted_points.nights)
+    for (user_id, _), point_days in inserted_points.days.items():
+        days.update((user_id, (UNIX_EPOCH + timedelta(days=day)).date()) for day in point_days)
+    return days
+
+def last_upload_days(cursor, user_ids):
+    """{(user_id, date)} of each participant's newest data before this run's freshness update"""
+    if not user_ids:
+        return set()
+    cursor.execute("""
+        SELECT user_id, max(last_seen_at)::date FROM data_freshness
+        WHERE user_id = ANY(%s) GROUP BY user_id
+    """, (sorted(user_ids),))
+    return set(cursor.fetchall())
+
+def queue_alerts(cursor, days):
+    """
+    Evaluate ALERT_RULES for the given (user_id, date) pairs and queue one 'alert' row in
+    communication_logs per new breach. Returns the number of alerts queued.
+
+    Only complete days are evaluated: a day counts once the participant has data from a
+    later day. A breach already logged for the same rule and day is not queued again.
+    """
+    cursor.execute("SELECT to_regclass('participants') IS NOT NULL AND to_regclass('communication_logs') IS NOT NULL")
+    if not days or not cursor.fetchone()[0]:
+        return 0
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS ix_communication_logs_alerts
+        ON communication_logs (participant_id, threshold_triggered) WHERE email_type = 'alert';
+    """)
+    if INGEST_LAYOUT == 'wide':
+        # heart_rate only reaches raw_data_minute, one row per minute
+        wear_count = """
+            SELECT count(heart_rate) AS wear_minutes FROM raw_data_minute r
+            WHERE r.user_id = d.user_id AND r.timestamp >= d.day AND r.timestamp < d.day + 1
+        """
+    else:
+        heart_rate_id = resolve_metric_ids(cursor, ['heart_rate'])['heart_rate']
+        wear_count = f"""
+            SELECT count(*) AS wear_minutes FROM raw_data r
+            WHERE r.user_id = d.user_id AND r.metric_id = {heart_rate_id}
+              AND r.timestamp >= d.day AND r.timestamp < d.day + 1
+        """
+    # The facts for the touched days only; each wear count is one index range scan.
+    # A single page, since execute_values would repeat the CREATE for every page.
+    cursor.execute("DROP TABLE IF EXISTS alert_facts;")
+    execute_values(cursor, f"""
+        CREATE TEMP TABLE alert_facts ON COMMIT DROP AS
+        SELECT d.user_id, d.day, p.email, p.overall_threshold, p.sleep_threshold,
+               w.wear_minutes, s.minutes_in_bed
+        FROM (VALUES %s) AS d (user_id, day)
+        JOIN participants p ON p.id = d.user_id
+        JOIN LATERAL (
+            SELECT max(last_seen_at)::date AS last_day FROM data_freshness f WHERE f.user_id = d.user_id
+        ) f ON d.day < f.last_day
+        CROSS JOIN LATERAL ({wear_count}) w
+        LEFT JOIN sleep_summary s ON s.user_id = d.user_id AND s.date_of_sleep = d.day
+    """, [(user_id, day) for user_id, day in sorted(days)], template="(%s, %s::date)", page_size=len(days))
+    queued = 0
+    for name, condition, message in ALERT_RULES:
+        cursor.execute(f"""
+            INSERT INTO communication_logs (participant_id, email_type, message_content,
+                threshold_triggered, email_status, recipient_email)
+            SELECT user_id, 'alert', {message}, %(rule)s || ':' || day, 'queued', email
+            FROM alert_facts a
+            WHERE {condition}
+              AND NOT EXISTS (
+                  SELECT 1 FROM communication_logs c
+                  WHERE c.participant_id = a.user_id AND c.email_type = 'alert'
+                    AND c.threshold_triggered = %(rule)s || ':' || a.day
+              )
+        """, {'rule': name})
+        queued += cursor.rowcount
+    return queued
+
+def metric_days(inserted_points):
+    """{metric_name: set of dates} that received new points"""
+    days = {}
+    for (_, metric_name), point_days in inserted_points.days.items():
+        days.setdefault(metric_name, set()).update((UNIX_EPOCH + timedelta(days=day)).date() for day in point_days)
+    return days
+
+def refresh_cohort_rollup(conn, days_by_metric):
+    """
+    Bring data_1d and the backend's cohort_1d rollup up to date for the metric-days a run
+    touched: materialize data_1d over that date range, then recompute only the touched
+    cohort buckets. Runs in autocommit, as refresh_continuous_aggregate requires.
+    Returns the number of cohort buckets written.
+    """
+    if not days_by_metric:
+        return 0
+    conn.autocommit = True
+    try:
+        cursor = conn.cursor()
+        # Both are created by the backend on startup
+        cursor.execute("SELECT to_regclass('data_1d') IS NOT NULL AND to_regclass('cohort_1d') IS NOT NULL")
+        if not cursor.fetchone()[0]:
+            return 0
+        all_days = set().union(*days_by_metric.values())
+        cursor.execute("CALL refresh_continuous_aggregate('data_1d', %s::date, %s::date + 1)", (min(all_days), max(all_days)))
+        metric_ids = resolve_metric_ids(cursor, list(days_by_metric))
+        pairs = [(metric_ids[name], day) for name, days in days_by_metric.items() for day in sorted(days)]
+        execute_values(cursor, """
+            INSERT INTO cohort_1d (metric_id, bucket, participants, mean_value, stddev_value, min_value,
+                p25_value, median_value, p75_value, max_value, data_points, refreshed_at)
+            SELECT d.metric_id, d.bucket, count(*), avg(d.avg_value), stddev(d.avg_value), min(d.avg_value),
+                   percentile_cont(0.25) WITHIN GROUP (ORDER BY d.avg_value),
+                   percentile_cont(0.5) WITHIN GROUP (ORDER BY d.avg_value),
+                   percentile_cont(0.75) WITHIN GROUP (ORDER BY d.avg_value),
+                   max(d.avg_value), sum(d.data_points), NOW()
+            FROM (VALUES %s) AS v (metric_id, day)
+            JOIN data_1d d ON d.metric_id = v.metric_id AND d.bucket >= v.day AND d.bucket < v.day + 1
+            GROUP BY d.metric_id, d.bucket
+            ON CONFLICT (metric_id, bucket) DO UPDATE SET
+                participants = EXCLUDED.participants, mean_value = EXCLUDED.mean_value,
+                stddev_value = EXCLUDED.stddev_value, min_value = EXCLUDED.min_value,
+                p25_value = EXCLUDED.p25_value, median_value = EXCLUDED.median_value,
+                p75_value = EXCLUDED.p75_value, max_value = EXCLUDED.max_value,
+                data_points = EXCLUDED.data_points, refreshed_at = EXCLUDED.refreshed_at
+        """, pairs, template="(%s::smallint, %s::date)", page_size=1000)
+        cursor.close()
+        return len(pairs)
+    finally:
+        conn.autocommit = False
+
+def write_dead_letters(cursor, report):
+    """Store this run's rejected rows; a row seen before is updated and marked pending again. Returns rows stored"""
+    entries = []
+    for stats in report.files.values():
+        for letter in stats.dead_letters:
+            row_json = json.dumps(letter['row'], sort_keys=True).encode('utf-8')
+            entries.append((
+                letter['user_id'], stats.filename, hashlib.sha1(row_json).hexdigest(),
+                letter['reason'], letter['error'], zlib.compress(row_json),
+            ))
+    if entries:
+        execute_values(cursor, """
+            INSERT INTO ingest_dead_letters (user_id, filename, row_digest, reason, error, row_data)
+            VALUES %s
+            ON CONFLICT (user_id, filename, row_digest) DO UPDATE SET
+                reason = EXCLUDED.reason, error = EXCLUDED.error,
+                status = 'pending', last_seen_at = NOW()
+        """, entries)
+    return len(entries)
+
+def replay_dead_letters(ids=None, filename=None, limit=1000):
+    """
+    Re-parse pending dead-letter rows with the current parsers. Rows that now parse
+    cleanly are written and marked replayed; the rest stay pending with updated reasons.
+    """
+    specs = {spec.filename: spec for spec in PARSER_SPECS}
+    conn = get_db_connection()
+    cursor = ensure_schema(conn)
+    try:
+        conditions, params = ["status = 'pending'"], []
+        if ids:
+            conditions.append("id = ANY(%s)")
+            params.append(list(ids))
+        if filename:
+            conditions.append("filename = %s")
+            params.append(filename)
+        cursor.execute(f"""
+            SELECT id, user_id, filename, row_data FROM ingest_dead_letters
+            WHERE {' AND '.join(conditions)} ORDER BY id LIMIT %s
+        """, params + [limit])
+
+        report = RunReport('dead_letters')
+        collectors, nights, replayed, failed = {}, {}, [], []
+        for letter_id, user_id, letter_file, row_data in cursor.fetchall():
+            row = json.loads(zlib.decompress(bytes(row_data)))
+            stats = FileStats(letter_file)
+            # Parse into scratch containers so a row that still fails writes nothing
+            collector, row_nights = PointCollector(user_id), {}
+            try:
+                if letter_file == 'sleep.csv':
+                    parse_sleep_row(row, user_id, row_nights, stats)
+                elif letter_file in specs:
+                    parse_row(specs[letter_file], row, collector, stats)
+                else:
+                    stats.reject('unknown_file')
+            except Exception as e:
+                stats.reject(type(e).__name__, e)
+            reasons = stats.row_reasons - DEAD_LETTER_IGNORED_REASONS
+            if reasons:
+                failed.append((letter_id, ','.join(sorted(reasons))))
+                continue
+            replayed.append(letter_id)
+            merged = collectors.setdefault((letter_file, user_id), PointCollector(user_id))
+            for batch in collector.batches():
+                merged.add([batch.metric_name], batch.epochs, batch.values)
+            nights.update({(user_id, night): summary for night, summary in row_nights.items()})
+
+        inserted, inserted_points = 0, InsertedPoints()
+        for (letter_file, _), collector in collectors.items():
+            for batch in collector.batches():
+                inserted += write_batch(cursor, batch, report.file_stats(letter_file), inserted_points)
+        write_sleep_summaries(cursor, list(nights.values()), report.file_stats('sleep.csv'), inserted_points)
+        write_freshness(cursor, inserted_points)
+        notify_appended(cursor, inserted_points)
+
+        if replayed:
             cursor.execute("""
-                INSERT INTO raw_data (user_id, timestamp, metric_name, value)
-                VALUES (%s, %s, %s, %s)
-                ON CONFLICT (user_id, timestamp, metric_name) DO NOTHING
-            """, (row['user_id'], row['timestamp'], row['metric_name'], row['value']))
+                UPDATE ingest_dead_letters SET status = 'replayed', replayed_at = NOW(), attempts = attempts + 1
+                WHERE id = ANY(%s)
+            """, (replayed,))
+        if failed:
+            execute_values(cursor, """
+                UPDATE ingest_dead_letters d SET reason = v.reason, attempts = d.attempts + 1
+                FROM (VALUES %s) AS v (id, reason) WHERE d.id = v.id
+            """, failed)
+        conn.commit()
+        return {'replayed': len(replayed), 'failed': len(failed), 'rows_inserted': inserted,
+                'nights_written': len(nights)}
+    finally:
+        cursor.close()
+        conn.close()
+
+def run_ingestion_job(data_dir=DATA_DIR):
+    start_time = time.time()
+    error_occurred = False
+    report = RunReport(data_dir)
+    try:
+        # Process each file type
+        if USE_STAGING:
+            # Only exports that changed since the last run are parsed
+            stage_exports(data_dir, STAGING_DIR, report)
+            batches = load_staged(STAGING_DIR, report=report)
+        else:
+            batches = parse_batches(data_dir, report)
+        sleep_batches = parse_sleep(data_dir, report)
+
+        # Connect to database and insert data
+        conn = get_db_connection()
+        cursor = ensure_schema(conn)
+        inserted_points = InsertedPoints()
+        for stats, rows in batches:
+            write_batch(cursor, rows, stats, inserted_points)
+        for stats, summaries in sleep_batches:
+            write_sleep_summaries(cursor, summaries, stats, inserted_points)
+        # Only days that actually changed; re-ingested history queues nothing
+        alert_days = touched_days(inserted_points)
+        # A participant's last day before this run may only now be complete
+        alert_days |= last_upload_days(cursor, {user_id for user_id, _ in alert_days})
+        # Once per run rather than per batch, so each participant is updated once
+        write_freshness(cursor, inserted_points)
+        notify_appended(cursor, inserted_points)
+        if ALERTS_ENABLED:
+            alerts = queue_alerts(cursor, alert_days)
+            if alerts:
+                print(f"Queued {alerts} adherence alerts")
+        dead_letters = write_dead_letters(cursor, report)
+        if dead_letters:
+            print(f"Kept {dead_letters} rejected rows in ingest_dead_letters")
 
         conn.commit()
         cursor.close()
+        try:
+            refreshed = refresh_cohort_rollup(conn, metric_days(inserted_points))
+            if refreshed:
+                print(f"Refreshed cohort_1d for {refreshed} metric-days")
+        except psycopg2.Error as e:
+            # The data is committed; the rollup catches up on the next run or a manual refresh
+            print(f"Could not refresh cohort_1d: {e}")
         conn.close()
 
-        total_rows = len(all_rows)
+        total_rows = sum(len(rows) for _, rows in batches)
         ingestion_rows_total.set(total_rows)
+        report.finish('success')
         print(f"Found {total_rows} new data points")
         print("Data ingestion completed")
         return f"Ingested {total_rows} rows"
@@ -391,11 +1789,16 @@ def run_ingestion_job():
     except Exception as e:
         ingestion_error_count.inc()
         error_occurred = True
+        report.finish('failed', str(e))
         print(f"Database error: {e}")
         return f"Database error: {e}"
     finally:
         elapsed = time.time() - start_time
         ingestion_latency_seconds.observe(elapsed)
+        try:
+            print(f"Run report saved to {report.save()}")
+        except OSError as e:
+            print(f"Could not save run report: {e}")
 
 if __name__ == "__main__":
     # Start FastAPI server for metrics and ingestion trigger
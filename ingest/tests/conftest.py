@@ -0,0 +1,5 @@
+import os
+import sys
+
+# ingest is imported as a package from the repository root, as the cron job and benchmarks do
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", ".."))
@@ -0,0 +1,69 @@
+import itertools
+import time
+from types import SimpleNamespace
+
+from ingest import ingest
+
+SPO2 = next(spec for spec in ingest.PARSER_SPECS if spec.filename == 'spo2.csv')
+
+
+def spo2_row(*stamps):
+    return {'minutes': repr([{'minute': stamp, 'value': 95.0} for stamp in stamps])}
+
+
+def test_fallback_parse_is_timed_once(monkeypatch):
+    # Each perf_counter() call advances one second, so timestamp_seconds counts timed spans
+    ticks = itertools.count()
+    monkeypatch.setattr(ingest, 'time', SimpleNamespace(perf_counter=lambda: float(next(ticks)), time=time.time))
+    stats = ingest.FileStats('spo2.csv')
+    collector = ingest.PointCollector(1)
+    # A UTC offset makes the vectorized parse bail out to the per-point path
+    ingest.parse_row(SPO2, spo2_row('2024-01-01T00:00:00+01:00', '2024-01-01T00:01:00+01:00'), collector, stats)
+
+    assert stats.rows_parsed == 2
+    assert stats.timestamp_seconds == 1.0
+
+
+def test_iso_epochs_rejects_empty_and_nat():
+    epochs, valid = ingest.iso_epochs(['2024-01-01T00:00:00', '', 'NaT', '2024-01-01T00:01:00'])
+
+    assert valid.tolist() == [True, False, False, True]
+    assert epochs[valid].tolist() == [1704067200, 1704067260]
+    assert epochs.min() >= 0
+
+
+def test_iso_epochs_floors_fractional_seconds():
+    epochs, valid = ingest.iso_epochs(['2024-01-01T00:00:59.999', '1969-12-31T23:59:59.5'])
+
+    assert valid.all()
+    assert epochs.tolist() == [1704067259, -1]
+
+
+def test_null_point_time_is_rejected_not_written():
+    # extract_points turns a null time into '' and skips a point with no time at all
+    row = {'minutes': repr([{'minute': '2024-01-01T00:00:00', 'value': 95.0},
+                            {'minute': None, 'value': 96.0},
+                            {'value': 97.0}])}
+    stats = ingest.FileStats('spo2.csv')
+    collector = ingest.PointCollector(1)
+    ingest.parse_row(SPO2, row, collector, stats)
+    [batch] = collector.batches()
+
+    assert batch.epochs.tolist() == [1704067200]
+    assert batch.values.tolist() == [95.0]
+    assert stats.rejected == {'bad_timestamp': 1}
+
+
+def test_seconds_of_day_validates_every_field():
+    seconds, valid = ingest.seconds_of_day(['00:00:00', '23:59:59', '24:00:00', '12:60:00', '1:00:00', '12:00:00Z', ''])
+
+    assert valid.tolist() == [True, True, False, False, False, False, False]
+    assert seconds[valid].tolist() == [0, 86399]
+
+
+def test_vectorized_epochs_match_the_exact_parser():
+    stamps = ['2024-02-29T23:59:59', '2024-03-10T02:30:00', '1999-12-31T00:00:00.250']
+    epochs, valid = ingest.iso_epochs(stamps)
+
+    assert valid.all()
+    assert epochs.tolist() == [ingest.wall_clock_epoch(ingest.fromisoformat(stamp)) for stamp in stamps]